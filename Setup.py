@@ -6,4 +6,6 @@ Run :
 pip3 install itsdangerous
 pip3 install requests
 pip3 install dateparser
+pip3 install numpy
+pip3 install orjson (optional, faster JSON)
 """)
\ No newline at end of file
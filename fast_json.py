@@ -0,0 +1,64 @@
+# coding=utf-8
+
+import json
+
+# orjson est optionnel (pip3 install orjson) : 3 a 10 fois plus rapide que
+# le module json, qui reste utilise quand orjson n'est pas installe.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fast JSON
+# Decoding layer shared by the REST client, the WebSocket stream and the
+# Telegram code : each payload is parsed once, by the fastest backend available.
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data):
+    """Parse a JSON document (str or bytes)
+    :raises: ValueError if the document is invalid
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data):
+    """Compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def response_json(response):
+    """Body of a requests response, parsed on the first call only.
+    Use instead of response.json(), which parses again on every call.
+    :raises: ValueError if the body is not JSON
+    """
+    parsed = getattr(response, '_parsed_json', None)
+    if parsed is None:
+        parsed = loads(response.content)
+        response._parsed_json = parsed
+    return parsed
+
+
+def to_floats(rows):
+    """Rows of number strings as rows of floats, e.g. Kucoin klines
+    [time, open, close, high, low, volume, turnover]
+    """
+    return [list(map(float, row)) for row in rows]
+
+
+def fields_to_floats(items, fields):
+    """Convert `fields` of each dict of `items` to float in place, e.g. the
+    price, bestBid and bestAsk of tickers. Missing or empty fields are left as is.
+    :returns: items
+    """
+    for item in items:
+        for field in fields:
+            value = item.get(field)
+            if value:
+                item[field] = float(value)
+    return items
@@ -0,0 +1,175 @@
+# coding=utf-8
+
+import bisect
+import mmap
+import os
+import sys
+from array import array
+from threading import RLock
+
+from fast_json import to_floats
+
+# Kline Store
+# Persistent local candle history, one directory per symbol/interval and one
+# append-only file per column. Every value is a little-endian float64, so a
+# column file can be memory-mapped as is (mmap_column, or numpy.memmap with
+# dtype='<f8').
+#
+# klines/
+#     BTC-USDT/
+#         2hour/
+#             time.f64  open.f64  close.f64  high.f64  low.f64  volume.f64  turnover.f64
+
+# Same order as a Kucoin kline : [time, open, close, high, low, volume, turnover]
+COLUMNS = ('time', 'open', 'close', 'high', 'low', 'volume', 'turnover')
+ITEM_SIZE = 8
+
+
+def _to_disk(values):
+    """array of doubles in on-disk byte order"""
+    a = array('d', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a
+
+
+class KlineSeries(object):
+    """Candles of one symbol/interval, stored oldest first"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = RLock()
+        os.makedirs(self.path, exist_ok=True)
+        self.files = {}
+        for name in COLUMNS:
+            self.files[name] = open(self._column_path(name), 'ab+')
+        self._align()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, '{}.f64'.format(name))
+
+    def _align(self):
+        """Drop a partially written last row, e.g. after a crash during append"""
+        sizes = [os.fstat(f.fileno()).st_size for f in self.files.values()]
+        size = min(sizes) - min(sizes) % ITEM_SIZE
+        for f in self.files.values():
+            if os.fstat(f.fileno()).st_size != size:
+                f.truncate(size)
+        self.length = size // ITEM_SIZE
+
+    def __len__(self):
+        return self.length
+
+    def last_time(self):
+        """Open time of the last stored candle, 0 if empty"""
+        with self.lock:
+            if not self.length:
+                return 0
+            return int(self.read('time', self.length-1, self.length)[0])
+
+    def append(self, klines):
+        """Append closed candles newer than the last stored one
+        :param klines: Kucoin klines, in any order
+        :return: number of candles appended
+        """
+        with self.lock:
+            last = self.last_time()
+            rows = {}
+            for k in klines:
+                t = int(k[0])
+                if t > last:
+                    rows[t] = k
+            if not rows:
+                return 0
+            ordered = to_floats([rows[t] for t in sorted(rows)])
+            columns = list(zip(*ordered))
+            # time en dernier : une ligne n'existe qu'une fois toutes ses colonnes ecrites
+            for i in range(len(COLUMNS)-1, -1, -1):
+                f = self.files[COLUMNS[i]]
+                _to_disk(columns[i]).tofile(f)
+                f.flush()
+            self.length += len(ordered)
+            return len(ordered)
+
+    def read(self, name, start=0, end=None):
+        """Values of a column between rows `start` and `end`, as an array('d')"""
+        with self.lock:
+            end = self.length if end is None else min(end, self.length)
+            start = max(0, min(start, end))
+            a = array('d')
+            if end > start:
+                with open(self._column_path(name), 'rb') as f:
+                    f.seek(start*ITEM_SIZE)
+                    a.fromfile(f, end-start)
+                if sys.byteorder != 'little':
+                    a.byteswap()
+            return a
+
+    def mmap_column(self, name):
+        """Read-only memory map of a column, as a memoryview of doubles.
+        Release the view (`view.release()`) before the series is closed.
+        """
+        f = self.files[name]
+        if not self.length:
+            return memoryview(array('d'))
+        m = mmap.mmap(f.fileno(), self.length*ITEM_SIZE, access=mmap.ACCESS_READ)
+        return memoryview(m).cast('d')
+
+    def index_of(self, start_time):
+        """First row whose open time is >= start_time"""
+        with self.lock:
+            if not self.length:
+                return 0
+            # recherche dichotomique dans la colonne mappee, sans la copier
+            m = mmap.mmap(self.files['time'].fileno(), self.length*ITEM_SIZE, access=mmap.ACCESS_READ)
+            try :
+                times = memoryview(m).cast('d')
+                try :
+                    index = bisect.bisect_left(times, start_time)
+                finally:
+                    times.release()
+            finally:
+                m.close()
+            return index
+
+    def candles(self, since=0):
+        """(time, close) of the stored candles opened at or after `since`, oldest first"""
+        with self.lock:
+            start = self.index_of(since) if since else 0
+            times = self.read('time', start)
+            closes = self.read('close', start)
+        return [(int(t), c) for t, c in zip(times, closes)]
+
+    def klines(self, since=0):
+        """Stored candles opened at or after `since`, in Kucoin format (newest first, floats)"""
+        with self.lock:
+            start = self.index_of(since) if since else 0
+            columns = [self.read(name, start) for name in COLUMNS]
+        return [list(row) for row in reversed(list(zip(*columns)))]
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+
+
+class KlineStore(object):
+    """Local on-disk kline store : one KlineSeries per symbol/interval"""
+
+    def __init__(self, root='klines'):
+        self.root = root
+        self.lock = RLock()
+        self.series_by_key = {}
+
+    def series(self, symbol, interval):
+        with self.lock:
+            key = (symbol, interval)
+            if key not in self.series_by_key:
+                self.series_by_key[key] = KlineSeries(os.path.join(self.root, symbol, interval))
+            return self.series_by_key[key]
+
+    def close(self):
+        with self.lock:
+            for series in self.series_by_key.values():
+                series.close()
+            self.series_by_key = {}
@@ -1,27 +1,54 @@
 # coding=utf-8
 
 import base64
+import bisect
 import calendar
+import heapq
+import itertools
+import threading
 import hashlib
 import hmac
 import time
 from datetime import datetime
 import uuid
+import asyncio
 import json
+import random
 import requests
+import fast_json
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import namedtuple
+from threading import RLock, Condition, Event
+from contextlib import contextmanager
+from urllib.parse import urlparse
 
 # Kucoin Client
 # Main functions :
 
 # get_timestamp
+# server_time
+# get_metrics
+# get_ws_token
+# get_currencies
 # get_currency
+# get_symbol_info
+# get_currency_info
 # get_accounts
+# get_account_snapshot
 # create_market_order
 # create_limit_order
 # cancel_all_orders
 # get_orders
+# get_order
+# wait_for_fill
 # get_ticker
+# get_cached_ticker
 # get_kline_data
+# iter_kline_data
+# backfill_klines
+# sync_klines
 
 ### System error codes ###
 # Code	Meaning
@@ -47,7 +74,7 @@ class KucoinAPIException(Exception):
         self.code = ''
         self.message = 'Unknown Error'
         try:
-            json_res = response.json()
+            json_res = fast_json.response_json(response)
         except ValueError:
             self.message = response.content
         else:
@@ -93,6 +120,36 @@ class LimitOrderException(Exception):
     def __str__(self):
         return 'LimitOrderException: {}'.format(self.message)
 
+class CircuitOpenException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return 'CircuitOpenException: {}'.format(self.message)
+
+# Final state of an order, amounts as floats ; price is the average fill price
+OrderFill = namedtuple('OrderFill', ['id', 'symbol', 'side', 'dealSize', 'dealFunds', 'fee', 'feeCurrency', 'price', 'cancelled'])
+
+# Kline types and their duration in seconds
+KLINE_INTERVALS = {
+    '1min': 60,
+    '3min': 180,
+    '5min': 300,
+    '15min': 900,
+    '30min': 1800,
+    '1hour': 3600,
+    '2hour': 7200,
+    '4hour': 14400,
+    '6hour': 21600,
+    '8hour': 28800,
+    '12hour': 43200,
+    '1day': 86400,
+    '1week': 604800
+}
+
+# get_kline_data returns at most 1500 candles per call
+KLINE_PAGE_SIZE = 1500
+
 def flat_uuid():
     """create a flat uuid
     :return: uuid with '-' removed
@@ -105,6 +162,642 @@ def compact_json_dict(data):
     """
     return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
 
+class TickerCache(object):
+    """Tickers of every symbol, fetched in one market/allTickers request
+    and served from memory until they are older than `ttl` seconds, or
+    than the max age given to get().
+    Market data is public, so one cache is shared by all the clients
+    of a same API url (see Client.get_cached_ticker).
+    """
+
+    def __init__(self, client, ttl=5):
+        self.client = client
+        self.ttl = ttl
+        self.lock = RLock()
+        self.tickers = {}
+        self.updated = 0.0
+
+    def refresh(self):
+        res = self.client.get_ticker()
+        # conversion en float une fois pour toutes les paires
+        fast_json.fields_to_floats(res['ticker'], ('last', 'buy', 'sell'))
+        tickers = {}
+        for t in res['ticker']:
+            tickers[t['symbol']] = {
+                'price': t['last'],
+                'bestBid': t['buy'],
+                'bestAsk': t['sell'],
+                'time': res['time']
+            }
+        self.tickers = tickers
+        self.updated = time.time()
+
+    def get(self, symbol, ttl=None):
+        """Ticker of `symbol`, refreshed first if the cache is stale
+        :param ttl: (optional) Max age in seconds for this lookup (default the cache ttl)
+        :returns: dict with price, bestBid, bestAsk and time
+        :raises: KucoinRequestException if the symbol is unknown
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if time.time() - self.updated > ttl:
+            with self.lock:
+                # une seule requete meme si plusieurs bots attendent
+                if time.time() - self.updated > ttl:
+                    self.refresh()
+        try:
+            return self.tickers[symbol]
+        except KeyError:
+            raise KucoinRequestException('Unknown symbol: {}'.format(symbol))
+
+    def price(self, symbol, ttl=None):
+        return float(self.get(symbol, ttl)['price'])
+
+    def best_bid(self, symbol, ttl=None):
+        return float(self.get(symbol, ttl)['bestBid'])
+
+    def best_ask(self, symbol, ttl=None):
+        return float(self.get(symbol, ttl)['bestAsk'])
+
+
+class ReferenceData(object):
+    """Symbols and currencies indexed by name, downloaded once and refreshed
+    when older than `ttl` seconds. Like the tickers, one cache is shared by
+    all the clients of a same API url (see Client.get_symbol_info).
+    """
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self.lock = RLock()
+        self.symbols = {}
+        self.currencies = {}
+        self.updated = 0.0
+
+    def refresh(self):
+        symbols = dict((x['symbol'], x) for x in self.client.get_symbols())
+        currencies = dict((x['currency'], x) for x in self.client.get_currencies())
+        self.symbols, self.currencies = symbols, currencies
+        self.updated = time.time()
+
+    def _check(self):
+        if time.time() - self.updated > self.ttl:
+            with self.lock:
+                if time.time() - self.updated > self.ttl:
+                    self.refresh()
+
+    def symbol(self, symbol):
+        """Symbol detail, see Client.get_symbols
+        :raises: KucoinRequestException if the symbol is unknown
+        """
+        self._check()
+        try:
+            return self.symbols[symbol]
+        except KeyError:
+            raise KucoinRequestException('Unknown symbol: {}'.format(symbol))
+
+    def currency(self, currency):
+        """Currency detail, see Client.get_currency"""
+        self._check()
+        if currency not in self.currencies:
+            # absente de la liste : demandee une fois, puis gardee
+            self.currencies[currency] = self.client.get_currency(currency)
+        return self.currencies[currency]
+
+    def trading_enabled(self, symbol):
+        return bool(self.symbol(symbol)['enableTrading'])
+
+
+class AccountSnapshot(object):
+    """Accounts of one API key at a given time, indexed by (currency, type)"""
+
+    def __init__(self, accounts, generation=0):
+        self.accounts = accounts
+        self.time = time.time()
+        self.generation = generation
+        self.index = {}
+        for account in accounts:
+            self.index.setdefault((account['currency'], account['type']), account)
+
+    def get(self, currency, account_type='margin'):
+        """Account of `currency`, None if there is none"""
+        return self.index.get((currency, account_type))
+
+    def balance(self, currency, account_type='margin'):
+        account = self.get(currency, account_type)
+        return float(account['balance']) if account is not None else 0.0
+
+    def available(self, currency, account_type='margin'):
+        account = self.get(currency, account_type)
+        return float(account['available']) if account is not None else 0.0
+
+    def of_type(self, account_type):
+        return [a for a in self.accounts if a['type'] == account_type]
+
+
+class AccountBook(object):
+    """Account snapshots of one API key, shared by all the bots using it.
+    Concurrent requests are coalesced into a single get_accounts call, and
+    the snapshot is invalidated whenever one of our orders goes through.
+    """
+
+    def __init__(self, client, max_age=2.0):
+        self.client = client
+        self.max_age = max_age
+        self.lock = RLock()
+        self.snapshot = None
+        self.generation = 0
+        self.inflight = None
+        self.error = None
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+
+    def is_fresh(self, snapshot, max_age):
+        return (snapshot is not None and snapshot.generation == self.generation
+                and time.time() - snapshot.time <= max_age)
+
+    def get(self, max_age=None):
+        """Snapshot no older than `max_age` seconds, fetched if needed
+        :returns: AccountSnapshot
+        """
+        if max_age is None:
+            max_age = self.max_age
+        with self.lock:
+            if self.is_fresh(self.snapshot, max_age):
+                return self.snapshot
+            leader = self.inflight is None
+            if leader:
+                self.inflight = Event()
+                generation = self.generation
+            inflight = self.inflight
+        if not leader:
+            # un autre bot est deja en train de demander : on attend sa reponse
+            inflight.wait()
+            with self.lock:
+                if self.error is not None:
+                    raise self.error
+                return self.snapshot
+        snapshot, error = None, None
+        try:
+            snapshot = AccountSnapshot(self.client.get_accounts(), generation)
+        except Exception as e:
+            error = e
+        with self.lock:
+            if snapshot is not None:
+                self.snapshot = snapshot
+            self.error = error
+            self.inflight = None
+        inflight.set()
+        if error is not None:
+            raise error
+        return snapshot
+
+
+class ExchangeClock(object):
+    """Offset between the local clock and the exchange's, estimated from
+    get_timestamp samples : offset = server time - middle of the round trip.
+    The sample with the shortest round trip of each sync is blended into a
+    moving average, so a slow response doesn't shift the estimate.
+    """
+
+    def __init__(self, client, interval=300, samples=3, alpha=0.3, retry_delay=10):
+        """
+        :param interval: seconds between two syncs
+        :param samples: get_timestamp calls per sync
+        :param alpha: weight of a new sync in the moving average
+        :param retry_delay: seconds before a failed sync is tried again
+        """
+        self.client = client
+        self.interval = interval
+        self.samples = samples
+        self.alpha = alpha
+        self.retry_delay = retry_delay
+        self.lock = RLock()
+        self.offset = 0.0
+        self.rtt = None
+        self.synced = 0.0
+        self.next_sync = 0.0
+        self.syncing = False
+
+    def sample(self):
+        """(offset, rtt) of one get_timestamp call, in seconds"""
+        sent = time.time()
+        server = float(self.client.get_timestamp())/1000.0
+        received = time.time()
+        return server - (sent + received)/2.0, received - sent
+
+    def sync(self, reset=False):
+        """Measure the offset now
+        :param reset: forget the previous estimate, e.g. after a 400002 error
+        """
+        offset, rtt = min((self.sample() for _ in range(self.samples)), key=lambda x: x[1])
+        with self.lock:
+            if reset or self.rtt is None:
+                self.offset, self.rtt = offset, rtt
+            else:
+                self.offset += self.alpha*(offset - self.offset)
+                self.rtt += self.alpha*(rtt - self.rtt)
+            self.synced = time.time()
+            self.next_sync = self.synced + self.interval
+            self.syncing = False
+
+    def _failed(self):
+        with self.lock:
+            # l'estimation precedente (ou l'heure locale) sert en attendant
+            self.next_sync = time.time() + self.retry_delay
+            self.syncing = False
+
+    def _background_sync(self):
+        try:
+            self.sync()
+        except Exception:
+            self._failed()
+
+    def now(self):
+        """Exchange time in seconds. The first call syncs, later ones only
+        start a background sync when the estimate is older than `interval`.
+        If the first sync fails, or the first call comes from an event loop
+        (which must not wait for it), the local clock is used (offset 0)
+        until a background sync succeeds.
+        """
+        if not self.next_sync:
+            with self.lock:
+                if not self.next_sync:
+                    if _in_event_loop():
+                        self.next_sync = time.time()
+                    else:
+                        try:
+                            self.sync()
+                        except Exception:
+                            self._failed()
+        if time.time() >= self.next_sync:
+            with self.lock:
+                start = not self.syncing
+                self.syncing = True
+            if start:
+                threading.Thread(target=self._background_sync, daemon=True).start()
+        return time.time() + self.offset
+
+
+def _in_event_loop():
+    """True in the thread of a running asyncio event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# Shared caches, by API url
+_ticker_caches = {}
+_reference_data = {}
+_account_books = {}
+_exchange_clocks = {}
+_caches_lock = RLock()
+
+### Rate limiting ###
+# Kucoin counts requests per IP for the public endpoints and per API key for
+# the private ones, order placement having its own tighter limit. One set of
+# token buckets is shared by every Client of the process, and waiting
+# requests are served by priority : orders, then market data, then queries
+# (e.g. triggered by a Telegram command).
+
+PRIORITY_ORDER = 0
+PRIORITY_MARKET = 1
+PRIORITY_QUERY = 2
+
+_priority_local = threading.local()
+
+@contextmanager
+def request_priority(priority):
+    """Run the requests of the current thread with `priority`
+    .. code:: python
+        with request_priority(PRIORITY_QUERY):
+            client.get_accounts()
+    """
+    previous = getattr(_priority_local, 'priority', None)
+    _priority_local.priority = priority
+    try:
+        yield
+    finally:
+        _priority_local.priority = previous
+
+def current_priority(method, path):
+    """Priority of a request : the one set by request_priority, else
+    PRIORITY_ORDER for order placement and cancellation, else PRIORITY_MARKET
+    """
+    priority = getattr(_priority_local, 'priority', None)
+    if priority is not None:
+        return priority
+    if method in ('post', 'delete') and path.startswith('orders'):
+        return PRIORITY_ORDER
+    return PRIORITY_MARKET
+
+class TokenBucket(object):
+    """Token bucket serving its waiters by priority, then arrival order"""
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: tokens added per second
+        :param capacity: max tokens, i.e. max burst
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last = time.time()
+        self.cond = Condition()
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last)*self.rate)
+        self.last = now
+
+    def acquire(self, priority=PRIORITY_MARKET, cost=1):
+        """Block until `cost` tokens are available and no higher priority request waits"""
+        with self.cond:
+            entry = (priority, next(self.counter))
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self.waiters[0] == entry:
+                        if self.tokens >= cost:
+                            self.tokens -= cost
+                            return
+                        self.cond.wait((cost - self.tokens)/self.rate)
+                    else:
+                        self.cond.wait()
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+
+    def headroom(self):
+        """Tokens currently available"""
+        with self.cond:
+            self._refill()
+            return self.tokens
+
+    def observe(self, remaining):
+        """Align on the remaining quota announced by the exchange"""
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+    def penalize(self, seconds):
+        """Empty the bucket for `seconds`, e.g. after a 429"""
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0) - seconds*self.rate
+
+class RateLimiter(object):
+    """Token buckets by IP (API host), API key and API key orders"""
+
+    # requests per second, burst
+    IP_LIMIT = (30, 30)
+    KEY_LIMIT = (30, 30)
+    ORDER_LIMIT = (15, 45)
+
+    def __init__(self):
+        self.lock = RLock()
+        self.buckets = {}
+
+    def bucket(self, key, limit):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(*limit)
+            return self.buckets[key]
+
+    def buckets_for(self, host, api_key, method, path, signed):
+        buckets = [self.bucket(('ip', host), self.IP_LIMIT)]
+        if signed:
+            buckets.append(self.bucket(('key', api_key), self.KEY_LIMIT))
+            if method == 'post' and path == 'orders':
+                buckets.append(self.bucket(('orders', api_key), self.ORDER_LIMIT))
+        return buckets
+
+    def acquire(self, host, api_key, method, path, signed, priority):
+        for bucket in self.buckets_for(host, api_key, method, path, signed):
+            bucket.acquire(priority)
+
+    def penalize(self, host, api_key, method, path, signed, seconds=1.0):
+        for bucket in self.buckets_for(host, api_key, method, path, signed):
+            bucket.penalize(seconds)
+
+# Shared by every Client
+rate_limiter = RateLimiter()
+
+### Resilience ###
+
+def endpoint_name(method, path):
+    """Endpoint of a request, ids removed : 'GET orders/{id}'"""
+    parts = path.split('/')
+    if parts[0] in ('currencies', 'orders') and len(parts) > 1:
+        parts = [parts[0], '{id}']
+    elif parts[:2] == ['order', 'client-order'] and len(parts) > 2:
+        parts = parts[:2] + ['{id}']
+    return '{} {}'.format(method.upper(), '/'.join(parts))
+
+class CircuitBreaker(object):
+    """Stops calling an endpoint after `threshold` failures in a row.
+    Once open, calls fail at once for `cooldown` seconds, then a single
+    trial call is let through : its success closes the circuit again.
+    """
+
+    def __init__(self, name, threshold=5, cooldown=30):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = RLock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def before(self):
+        """:raises: CircuitOpenException while the circuit is open"""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.time() - self.opened_at < self.cooldown or self.trial:
+                raise CircuitOpenException('{} is failing, retry in {:.0f}s'.format(
+                    self.name, max(0, self.cooldown - (time.time() - self.opened_at))))
+            self.trial = True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.time()
+            self.trial = False
+
+    def is_open(self):
+        return self.opened_at is not None
+
+# Shared by every Client, by (host, endpoint)
+_breakers = {}
+_breakers_lock = RLock()
+
+def circuit_breaker(host, endpoint):
+    with _breakers_lock:
+        if (host, endpoint) not in _breakers:
+            _breakers[(host, endpoint)] = CircuitBreaker(endpoint)
+        return _breakers[(host, endpoint)]
+
+### Metrics ###
+# Chaque requete HTTP est mesuree par endpoint (et par cle API) : nombre
+# d'appels, latence, attente dans le rate limiter, octets, erreurs et marge
+# restante des token buckets. metrics.snapshot() pour lire les chiffres,
+# MetricsReporter pour en ecrire un resume regulierement.
+
+# Latency histogram bounds in seconds : 1ms to ~80s, +25% per bucket
+LATENCY_BOUNDS = [0.001*1.25**i for i in range(51)]
+
+class EndpointStats(object):
+    """Counters of one endpoint"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.wait_sum = 0.0
+        self.histogram = [0]*(len(LATENCY_BOUNDS)+1)
+        self.headroom = None
+
+    def add(self, latency, wait, sent, received, error, headroom):
+        self.calls += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.wait_sum += wait
+        self.histogram[bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+        self.bytes_sent += sent
+        self.bytes_received += received
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        if headroom is not None:
+            self.headroom = headroom if self.headroom is None else min(self.headroom, headroom)
+
+    def percentile(self, q):
+        """Upper bound of the latency bucket holding the `q` quantile, in seconds"""
+        if not self.calls:
+            return 0.0
+        rank = q*self.calls
+        total = 0
+        for i, n in enumerate(self.histogram):
+            total += n
+            if total >= rank:
+                return min(LATENCY_BOUNDS[i], self.latency_max) if i < len(LATENCY_BOUNDS) else self.latency_max
+        return self.latency_max
+
+    def as_dict(self):
+        return {'calls': self.calls,
+                'errors': dict(self.errors),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'latency_avg': self.latency_sum/self.calls if self.calls else 0.0,
+                'latency_max': self.latency_max,
+                'p50': self.percentile(0.50),
+                'p95': self.percentile(0.95),
+                'p99': self.percentile(0.99),
+                'wait_avg': self.wait_sum/self.calls if self.calls else 0.0,
+                'min_headroom': self.headroom}
+
+class Metrics(object):
+    """Per-endpoint and per-API key request statistics of the process"""
+
+    def __init__(self):
+        self.lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.endpoints = {}
+            self.keys = {}
+
+    def record(self, endpoint, api_key, latency, wait=0.0, sent=0, received=0, error=None, headroom=None):
+        """Record one HTTP call
+        :param latency: seconds between sending and the response
+        :param wait: seconds spent waiting for the rate limiter
+        :param error: (optional) error class, e.g. 'HTTP 429' or 'ReadTimeout'
+        :param headroom: (optional) tokens left in the tightest bucket
+        """
+        with self.lock:
+            for stats, key in ((self.endpoints, endpoint), (self.keys, api_key)):
+                if key not in stats:
+                    stats[key] = EndpointStats()
+                stats[key].add(latency, wait, sent, received, error, headroom)
+
+    def snapshot(self):
+        """Statistics since the last reset
+        :returns: dict with seconds, endpoints {endpoint: stats} and keys {api key: stats}
+        """
+        with self.lock:
+            return {'seconds': time.time() - self.started,
+                    'endpoints': dict((k, v.as_dict()) for k, v in self.endpoints.items()),
+                    'keys': dict((k, v.as_dict()) for k, v in self.keys.items())}
+
+    def summary(self):
+        """Human readable summary, busiest endpoints first"""
+        snapshot = self.snapshot()
+        seconds = max(snapshot['seconds'], 1e-9)
+        lines = ['Kucoin API over {:.0f}s'.format(seconds)]
+        endpoints = sorted(snapshot['endpoints'].items(), key=lambda x: -x[1]['calls'])
+        for endpoint, s in endpoints:
+            errors = ', '.join('{} x{}'.format(e, n) for e, n in sorted(s['errors'].items()))
+            lines.append('{} : {} calls ({:.2f}/s), p50 {:.0f}ms p95 {:.0f}ms p99 {:.0f}ms, '
+                         'wait {:.0f}ms, {} kB in, headroom {}{}'.format(
+                             endpoint, s['calls'], s['calls']/seconds, s['p50']*1000, s['p95']*1000,
+                             s['p99']*1000, s['wait_avg']*1000, s['bytes_received']//1024,
+                             'n/a' if s['min_headroom'] is None else '{:.0f}'.format(s['min_headroom']),
+                             ', errors : ' + errors if errors else ''))
+        keys = sorted(snapshot['keys'].items(), key=lambda x: -x[1]['calls'])
+        for api_key, s in keys:
+            lines.append('key {}... : {} calls ({:.2f}/s), {} errors'.format(
+                str(api_key)[:6], s['calls'], s['calls']/seconds, sum(s['errors'].values())))
+        return '\n'.join(lines)
+
+class MetricsReporter(threading.Thread):
+    """Writes metrics.summary() every `interval` seconds"""
+
+    def __init__(self, interval=600, log=print, reset=True):
+        """
+        :param log: function receiving the summary, e.g. log_func2
+        :param reset: start new counters after each summary
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.log = log
+        self.reset = reset
+        self.stop_event = Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.log(metrics.summary())
+            except Exception:
+                pass
+            if self.reset:
+                metrics.reset()
+
+    def stop(self):
+        self.stop_event.set()
+
+# Shared by every Client
+metrics = Metrics()
+
 class Client(object):
 
     # REST_API_URL = 'https://openapi-v2.kucoin.com'
@@ -126,6 +819,16 @@ class Client(object):
     STOP_LOSS = 'loss'
     STOP_ENTRY = 'entry'
 
+    # requests timeouts : connect, read
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 10
+
+    # retries of failed requests, with exponential backoff
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 8
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
     STP_CANCEL_NEWEST = 'CN'
     STP_CANCEL_OLDEST = 'CO'
     STP_DECREASE_AND_CANCEL = 'DC'
@@ -136,7 +839,7 @@ class Client(object):
     TIMEINFORCE_IMMEDIATE_OR_CANCEL = 'IOC'
     TIMEINFORCE_FILL_OR_KILL = 'FOK'
 
-    def __init__(self, api_key, api_secret, passphrase, sandbox=False, requests_params=None):
+    def __init__(self, api_key, api_secret, passphrase, sandbox=False, requests_params=None, api_url=None):
         """Kucoin API Client constructor
         https://docs.kucoin.com/
         :param api_key: Api Token Id
@@ -149,6 +852,9 @@ class Client(object):
         :type sandbox: bool
         :param requests_params: (optional) Dictionary of requests params to use for all calls
         :type requests_params: dict.
+        :param api_url: (optional) Url of another server speaking the Kucoin API,
+            e.g. a kucoin_fake_server.FakeKucoinServer
+        :type api_url: string
         .. code:: python
             client = Client(api_key, api_secret, api_passphrase)
         """
@@ -156,7 +862,9 @@ class Client(object):
         self.API_KEY = api_key
         self.API_SECRET = api_secret
         self.API_PASSPHRASE = passphrase
-        if sandbox:
+        if api_url:
+            self.API_URL = api_url
+        elif sandbox:
             self.API_URL = self.SANDBOX_API_URL
         else:
             self.API_URL = self.REST_API_URL
@@ -209,10 +917,13 @@ class Client(object):
     def _create_uri(self, path):
         return '{}{}'.format(self.API_URL, path)
 
-    def _request(self, method, path, signed, **kwargs):
+    def _prepare_request(self, method, path, signed, **kwargs):
+        """Build the uri and the requests arguments of a call, signed if needed
+        :return: (uri, kwargs)
+        """
 
         # set default requests timeout
-        kwargs['timeout'] = 100
+        kwargs['timeout'] = (self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
 
         # add our global requests params
         if self._requests_params:
@@ -226,7 +937,7 @@ class Client(object):
 
         if signed:
             # generate signature
-            nonce = int(time.time() * 1000)
+            nonce = int(self.server_time() * 1000)
             kwargs['headers']['KC-API-TIMESTAMP'] = str(nonce)
             kwargs['headers']['KC-API-SIGN'] = self._generate_signature(nonce, method, full_path, kwargs['data'])
 
@@ -237,8 +948,102 @@ class Client(object):
         if signed and method != 'get' and kwargs['data']:
             kwargs['data'] = compact_json_dict(kwargs['data'])
 
-        response = getattr(self.session, method)(uri, **kwargs)
-        return self._handle_response(response)
+        return uri, kwargs
+
+    def _send(self, method, path, signed, priority=None, **kwargs):
+        """Wait for the shared rate limiter, then send the request
+        :return: requests response
+        """
+        if priority is None:
+            priority = current_priority(method, path)
+        host = urlparse(self.API_URL.strip()).netloc
+        endpoint = endpoint_name(method, path)
+        start = time.time()
+        rate_limiter.acquire(host, self.API_KEY, method, path, signed, priority)
+        headroom = min(b.headroom() for b in rate_limiter.buckets_for(host, self.API_KEY, method, path, signed))
+        # signed after the wait, so that the timestamp is fresh
+        uri, kwargs = self._prepare_request(method, path, signed, **kwargs)
+        data = kwargs.get('data')
+        sent = len(uri) + (len(data) if isinstance(data, (str, bytes)) else 0)
+        sent_at = time.time()
+        try:
+            response = getattr(self.session, method)(uri, **kwargs)
+        except requests.RequestException as e:
+            metrics.record(endpoint, self.API_KEY, time.time() - sent_at, sent_at - start, sent,
+                           error=type(e).__name__, headroom=headroom)
+            raise
+        error = None
+        if not str(response.status_code).startswith('2'):
+            error = 'HTTP {}'.format(response.status_code)
+        metrics.record(endpoint, self.API_KEY, time.time() - sent_at, sent_at - start, sent,
+                       len(response.content), error, headroom)
+        if response.status_code == 429:
+            rate_limiter.penalize(host, self.API_KEY, method, path, signed)
+        elif 'gw-ratelimit-remaining' in response.headers:
+            rate_limiter.buckets_for(host, self.API_KEY, method, path, signed)[-1].observe(response.headers['gw-ratelimit-remaining'])
+        return response
+
+    def _request(self, method, path, signed, **kwargs):
+        """Send a request, retrying transient failures (network errors, 429 and 5xx)
+        with exponential backoff and jitter, behind the endpoint's circuit breaker.
+        A new order is never sent twice : after an uncertain failure, its
+        clientOid is looked up first, and the order is only sent again if
+        the exchange doesn't know it. A request refused for its timestamp
+        (400002) is sent once more after a clock resync.
+        :raises: KucoinResponseException, KucoinAPIException, CircuitOpenException,
+            requests.RequestException
+        """
+        host = urlparse(self.API_URL.strip()).netloc
+        breaker = circuit_breaker(host, endpoint_name(method, path))
+        is_order = method == 'post' and path == 'orders'
+        # nos ordres changent les soldes : le snapshot des comptes est perime
+        changes_accounts = method in ('post', 'delete') and path.startswith('orders')
+        attempt = 0
+        resynced = False
+        while True:
+            breaker.before()
+            error, response = None, None
+            try:
+                response = self._send(method, path, signed, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if error is None and response.status_code not in self.RETRY_STATUS:
+                breaker.success()
+                try:
+                    res = self._handle_response(response)
+                except KucoinAPIException as e:
+                    if e.code != '400002' or resynced:
+                        raise
+                    # horloge decalee : la requete a ete refusee, on la renvoie une fois
+                    self.exchange_clock().sync(reset=True)
+                    resynced = True
+                    continue
+                if changes_accounts:
+                    self.account_book().invalidate()
+                return res
+            if error is not None or response.status_code != 429:
+                breaker.failure()
+            if attempt >= self.MAX_RETRIES or breaker.is_open():
+                if error is not None:
+                    raise error
+                return self._handle_response(response)
+            if is_order and not isinstance(error, requests.ConnectTimeout):
+                # l'ordre a peut-etre ete passe malgre l'erreur
+                order = self._find_order(kwargs['data']['clientOid'])
+                if order:
+                    self.account_book().invalidate()
+                    return {'orderId': order['id']}
+            delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE*2**attempt)
+            time.sleep(delay*random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def _find_order(self, client_oid):
+        """Order placed with `client_oid`, None if the exchange doesn't know it"""
+        response = self._send('get', 'order/client-order/{}'.format(client_oid), True)
+        try:
+            return self._handle_response(response)
+        except KucoinAPIException:
+            return None
 
     @staticmethod
     def _handle_response(response):
@@ -250,7 +1055,7 @@ class Client(object):
         if not str(response.status_code).startswith('2'):
             raise KucoinAPIException(response)
         try:
-            res = response.json()
+            res = fast_json.response_json(response)
 
             if 'code' in res and res['code'] != "200000":
                 raise KucoinAPIException(response)
@@ -285,6 +1090,61 @@ class Client(object):
         """
         return self._get("timestamp")
 
+    def exchange_clock(self):
+        """ExchangeClock shared by every client of the same API url"""
+        with _caches_lock:
+            if self.API_URL not in _exchange_clocks:
+                _exchange_clocks[self.API_URL] = ExchangeClock(self)
+            return _exchange_clocks[self.API_URL]
+
+    def server_time(self):
+        """Current exchange time in seconds, from the local clock corrected by
+        the offset measured with get_timestamp. Used for the signature
+        timestamps and the candle windows.
+        :return: float
+        """
+        return self.exchange_clock().now()
+
+    def get_metrics(self):
+        """Request statistics of every client of the process since the last reset
+        :returns: dict, see Metrics.snapshot
+        .. code:: python
+            {
+                "seconds": 600.2,
+                "endpoints": {
+                    "GET market/allTickers": {"calls": 120, "p50": 0.09, "p95": 0.21, "p99": 0.33,
+                                              "errors": {"HTTP 429": 1}, "min_headroom": 3.2, ...}
+                },
+                "keys": {...}
+            }
+        """
+        return metrics.snapshot()
+
+    def get_ws_token(self, private=False):
+        """Get a token and the server list to open a WebSocket connection
+        https://docs.kucoin.com/#apply-connect-token
+        :param private: (optional) Token for the private channels (default False)
+        :type private: bool
+        :returns: ApiResponse
+        .. code:: python
+            {
+                "token": "vYNlCtbz4XNJ1QncwWilJnBtmmfe4geLQDUA62kKJsDChc6I4bRDQc73JfIrlFaVYIAE0Gv2",
+                "instanceServers": [
+                    {
+                        "endpoint": "wss://push1-v2.kucoin.com/endpoint",
+                        "protocol": "websocket",
+                        "encrypt": true,
+                        "pingInterval": 50000,
+                        "pingTimeout": 10000
+                    }
+                ]
+            }
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+        if private:
+            return self._post('bullet-private', True)
+        return self._post('bullet-public', False)
+
     # Currency Endpoints
     def get_symbols(self):
         """
@@ -311,6 +1171,28 @@ class Client(object):
 
         return self._get('symbols', False)
 
+    def get_currencies(self):
+        """List known currencies
+        https://docs.kucoin.com/#get-currencies
+        :returns: API Response
+        .. code-block:: python
+            [
+                {
+                    "currency": "CSP",
+                    "name": "CSP",
+                    "fullName": "Caspian",
+                    "precision": 8,
+                    "withdrawalMinSize": "2000",
+                    "withdrawalMinFee": "1000",
+                    "isWithdrawEnabled": true,
+                    "isDepositEnabled": true
+                }
+            ]
+        :raises:  KucoinResponseException, KucoinAPIException
+        """
+
+        return self._get('currencies', False)
+
     def get_currency(self, currency):
         """Get single currency detail
         https://docs.kucoin.com/#get-currency-detail
@@ -334,6 +1216,31 @@ class Client(object):
 
         return self._get('currencies/{}'.format(currency), False)
 
+    def reference_data(self, ttl=3600):
+        """ReferenceData shared by every client of the same API url"""
+        with _caches_lock:
+            if self.API_URL not in _reference_data:
+                _reference_data[self.API_URL] = ReferenceData(self, ttl)
+            return _reference_data[self.API_URL]
+
+    def get_symbol_info(self, symbol):
+        """Get a symbol detail from the shared reference data
+        .. code:: python
+            increment = client.get_symbol_info('KCS-BTC')['baseIncrement']
+        :returns: symbol detail, see get_symbols
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+        return self.reference_data().symbol(symbol)
+
+    def get_currency_info(self, currency):
+        """Get a currency detail from the shared reference data
+        .. code:: python
+            minimum = float(client.get_currency_info('BTC')['withdrawalMinSize'])
+        :returns: currency detail, see get_currency
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+        return self.reference_data().currency(currency)
+
     # User Account Endpoints
 
     def get_accounts(self):
@@ -366,6 +1273,28 @@ class Client(object):
 
         return self._get('accounts', True)
 
+    def account_book(self):
+        """AccountBook shared by every client of the same API key"""
+        with _caches_lock:
+            key = (self.API_URL, self.API_KEY)
+            if key not in _account_books:
+                _account_books[key] = AccountBook(self)
+            return _account_books[key]
+
+    def get_account_snapshot(self, max_age=None):
+        """Get the accounts from the snapshot shared by all the clients of this API key
+        Bots sharing a key make one get_accounts call between them, and the
+        snapshot is refreshed after each of our orders.
+        :param max_age: (optional) Max age of the snapshot in seconds (default 2)
+        :type max_age: float
+        .. code:: python
+            accounts = client.get_account_snapshot()
+            balance = accounts.balance('BTC', 'margin')
+        :returns: AccountSnapshot
+        :raises:  KucoinResponseException, KucoinAPIException
+        """
+        return self.account_book().get(max_age)
+
 
     # Order Endpoints
 
@@ -521,6 +1450,73 @@ class Client(object):
 
         return self._post('orders', True, data=data)
 
+    def get_order(self, order_id):
+        """Get order details
+        https://docs.kucoin.com/#get-an-order
+        :param order_id: orderId returned by create_market_order or create_limit_order
+        :type order_id: string
+        .. code:: python
+            order = client.get_order('5c35c02703aa673ceec2a168')
+        :returns: ApiResponse, same format as an item of get_orders
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+
+        return self._get('orders/{}'.format(order_id), True)
+
+    def get_order_by_client_oid(self, client_oid):
+        """Get order details by the clientOid it was placed with
+        https://docs.kucoin.com/#get-single-active-order-by-clientoid
+        :param client_oid: clientOid given to create_market_order or create_limit_order
+        :type client_oid: string
+        .. code:: python
+            order = client.get_order_by_client_oid('5c52e11203aa677f33e493fb')
+        :returns: ApiResponse, same format as get_order, None if no order has this clientOid
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+
+        try:
+            return self._get('order/client-order/{}'.format(client_oid), True)
+        except KucoinAPIException as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def wait_for_fill(self, order_id, timeout=30, first_delay=0.05, max_delay=1.0):
+        """Poll an order until it is done (filled or cancelled)
+        Polling starts right away and slows down while the order stays
+        active, so a market order is usually confirmed in a few tens of ms.
+        :param order_id: orderId returned by create_market_order or create_limit_order
+        :type order_id: string
+        :param timeout: (optional) Max seconds to wait (default 30)
+        :type timeout: float
+        .. code:: python
+            order = client.create_market_order('KCS-BTC', Client.SIDE_BUY, size=20)
+            fill = client.wait_for_fill(order['orderId'])
+            print(fill.dealSize, fill.dealFunds, fill.fee)
+        :returns: OrderFill
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+
+        deadline = time.time() + timeout
+        delay = first_delay
+        while True:
+            time.sleep(delay)
+            try:
+                order = self.get_order(order_id)
+            except KucoinAPIException:
+                # un ordre tout juste passe peut ne pas etre encore visible
+                order = None
+            if order is not None and not order['isActive']:
+                # nos soldes ont change
+                self.account_book().invalidate()
+                deal_size, deal_funds = float(order['dealSize']), float(order['dealFunds'])
+                return OrderFill(order['id'], order['symbol'], order['side'], deal_size, deal_funds,
+                                 float(order['fee']), order['feeCurrency'],
+                                 deal_funds/deal_size if deal_size else 0.0, bool(order['cancelExist']))
+            if time.time() + delay > deadline:
+                raise KucoinRequestException('Order {} still active after {}s'.format(order_id, timeout))
+            delay = min(max_delay, delay*1.5)
+
     def cancel_all_orders(self, symbol=None):
         """Cancel all orders
         https://docs.kucoin.com/#cancel-all-orders
@@ -659,6 +1655,38 @@ class Client(object):
             }
         return self._get(tick_path, False, data=data)
 
+    def ticker_cache(self, ttl=5):
+        """TickerCache shared by every client of the same API url
+        :param ttl: default max age of the cache, set by the first call ;
+            pass a max age to TickerCache.get to change it for a lookup
+        """
+        with _caches_lock:
+            if self.API_URL not in _ticker_caches:
+                _ticker_caches[self.API_URL] = TickerCache(self, ttl)
+            return _ticker_caches[self.API_URL]
+
+    def get_cached_ticker(self, symbol, ttl=5):
+        """Get symbol tick from the shared all-tickers cache
+        One market/allTickers request refreshes every symbol at once, at most
+        every `ttl` seconds, whatever the number of bots asking.
+        :param symbol: Name of symbol e.g. KCS-BTC
+        :type symbol: string
+        :param ttl: (optional) Max age of the cached tickers in seconds (default 5)
+        :type ttl: float
+        .. code:: python
+            price = client.get_cached_ticker('ETH-BTC')['price']
+        :returns: dict, prices already converted to float
+        .. code:: python
+            {
+                "price": 3494.367783,             # last trade price
+                "bestBid": 3494.367783,           # best bid price
+                "bestAsk": 3499.12,               # best ask price
+                "time": 1602832092060             # time of the snapshot
+            }
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+        return self.ticker_cache(ttl).get(symbol, ttl)
+
     #Kline Endpoints : get close prices of kandles
     def get_kline_data(self, symbol, kline_type='5min', start=None, end=None):
         """Get kline data
@@ -714,8 +1742,295 @@ class Client(object):
         if end is not None:
             data['endAt'] = end
         else:
-            data['endAt'] = int(time.time())
+            data['endAt'] = int(self.server_time())
 
         return self._get('market/candles', False, data=data)
 
+    def iter_kline_pages(self, symbol, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """Get kline data over any time range, page by page
+        The range is split into pages of KLINE_PAGE_SIZE candles fetched
+        concurrently ; pages are yielded in time order, oldest first, without
+        the candles already yielded by the previous page.
+        :param symbol: Name of symbol e.g. KCS-BTC
+        :type symbol: string
+        :param kline_type: type of candlestick patterns, see KLINE_INTERVALS
+        :type kline_type: string
+        :param start: Start time as unix timestamp
+        :type start: int
+        :param end: (optional) End time as unix timestamp (default now)
+        :type end: int
+        :param workers: (optional) Number of pages fetched at the same time (default 4)
+        :type workers: int
+        :param max_rate: (optional) Max number of page requests per second (default 8)
+        :type max_rate: float
+        .. code:: python
+            for page in client.iter_kline_pages('KCS-BTC', '5min', 1507479171, 1510278278):
+                closes = [float(k[2]) for k in page]
+        :returns: generator of kline lists, oldest first, in get_kline_data format
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+
+        interval = KLINE_INTERVALS[kline_type]
+        if end is None:
+            end = int(self.server_time())
+        if start is None:
+            start = end - KLINE_PAGE_SIZE*interval
+        # startAt and endAt are both included : a page spans KLINE_PAGE_SIZE
+        # candles, one more would push out the one at startAt
+        page = KLINE_PAGE_SIZE*interval
+        windows = [(t, min(t+page-interval, end)) for t in range(int(start), int(end), page)]
+        last = None
+        pending = []
+        next_request = time.time()
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            while windows or pending:
+                # keep at most `workers` pages in flight, spaced by max_rate
+                while windows and len(pending) < max(1, workers):
+                    time.sleep(max(0.0, next_request - time.time()))
+                    next_request = time.time() + 1.0/max_rate
+                    page_start, page_end = windows.pop(0)
+                    pending.append(pool.submit(self.get_kline_data, symbol, kline_type, page_start, page_end))
+                klines = pending.pop(0).result()
+                # Kucoin returns newest first ; skip what a previous page already gave
+                klines = sorted(klines, key=lambda k: int(k[0]))
+                if last is not None:
+                    klines = [k for k in klines if int(k[0]) > last]
+                if klines:
+                    last = int(klines[-1][0])
+                    yield klines
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def iter_kline_data(self, symbol, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """Same as iter_kline_pages, candle by candle
+        :returns: generator of klines, oldest first
+        """
+        for page in self.iter_kline_pages(symbol, kline_type, start, end, workers, max_rate):
+            for kline in page:
+                yield kline
+
+    def backfill_klines(self, store, symbols, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """Fill a local kline store with the closed candles of several symbols
+        The store is append-only : for a symbol already stored, only the
+        candles after the last stored one are fetched.
+        :param store: kline_store.KlineStore
+        :param symbols: Names of symbols e.g. ['KCS-BTC', 'ETH-BTC']
+        :type symbols: list
+        :param kline_type: type of candlestick patterns, see KLINE_INTERVALS
+        :type kline_type: string
+        :param start: Start time as unix timestamp
+        :type start: int
+        :param end: (optional) End time as unix timestamp (default now)
+        :type end: int
+        .. code:: python
+            year_ago = int(self.server_time()) - 365*86400
+            client.backfill_klines(KlineStore('klines'), ['KCS-BTC', 'ETH-BTC'], '5min', year_ago)
+        :returns: dict of the number of candles stored by symbol
+        :raises: KucoinResponseException, KucoinAPIException
+        """
+
+        interval = KLINE_INTERVALS[kline_type]
+        now = int(self.server_time())
+        if end is None or end > now:
+            end = now
+        stored = {}
+        for symbol in symbols:
+            series = store.series(symbol, kline_type)
+            begin = start
+            if series.last_time():
+                begin = max(begin or 0, series.last_time() + interval)
+            stored[symbol] = 0
+            if begin is not None and begin >= end:
+                continue
+            for page in self.iter_kline_pages(symbol, kline_type, begin, end, workers, max_rate):
+                stored[symbol] += series.append([k for k in page if int(k[0]) + interval <= now])
+        return stored
+
+    def sync_klines(self, store, symbol, kline_type='2hour', start=None):
+        """Fill a local kline store with the candles closed since its last stored candle
+        Only the missing candles are requested, so a warm store costs one small
+        request per closed candle instead of the full history.
+        :param store: kline_store.KlineStore
+        :param symbol: Name of symbol e.g. KCS-BTC
+        :type symbol: string
+        :param kline_type: type of candlestick patterns, see KLINE_INTERVALS
+        :type kline_type: string
+        :param start: (optional) Start time as unix timestamp when the store is empty
+            (default the last 1500 candles)
+        :type start: int
+        .. code:: python
+            series = client.sync_klines(KlineStore('klines'), 'KCS-BTC', '2hour')
+            closes = series.mmap_column('close')
+        :returns: kline_store.KlineSeries
+        :raises: KucoinResponseException, KucoinAPIException
+        """
 
+        series = store.series(symbol, kline_type)
+        interval = KLINE_INTERVALS[kline_type]
+        now = int(self.server_time())
+        last = series.last_time()
+        if last:
+            start = last + interval
+        elif start is None:
+            start = now - 1500*interval
+        # only closed candles are stored
+        if start + interval > now:
+            return series
+        for page in self.iter_kline_pages(symbol, kline_type, start=int(start), end=now, workers=1):
+            series.append([k for k in page if int(k[0]) + interval <= now])
+        return series
+
+
+class AsyncClient(Client):
+    """Asyncio Kucoin API Client
+
+    Same methods as Client, but every API call is a coroutine :
+
+    .. code:: python
+        client = AsyncClient(api_key, api_secret, api_passphrase)
+        accounts, ticker = await asyncio.gather(client.get_accounts(), client.get_ticker('ETH-BTC'))
+
+    All the AsyncClient instances of the process share one requests session,
+    whose connection pool keeps `pool_size` keep-alive connections per host,
+    and one pool of `pool_size` threads doing the blocking I/O : hundreds of
+    accounts can be driven from a single event loop with a bounded number
+    of threads and sockets.
+    """
+
+    POOL_SIZE = 32
+
+    _shared_session = None
+    _shared_executor = None
+    _shared_lock = RLock()
+
+    def __init__(self, api_key, api_secret, passphrase, sandbox=False, requests_params=None, pool_size=None, api_url=None):
+        """AsyncClient constructor, see Client
+        :param pool_size: (optional) Size of the shared connection and thread pools,
+            only used by the first AsyncClient created (default POOL_SIZE)
+        :type pool_size: int
+        """
+        self._pool_size = pool_size or self.POOL_SIZE
+        Client.__init__(self, api_key, api_secret, passphrase, sandbox, requests_params, api_url)
+        self._sync_client = None
+
+    def _init_session(self):
+        with AsyncClient._shared_lock:
+            if AsyncClient._shared_session is None:
+                session = requests.session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept': 'application/json',
+                                        'User-Agent': 'python-kucoin',
+                                        'Content-Type': 'application/json'})
+                AsyncClient._shared_session = session
+                AsyncClient._shared_executor = ThreadPoolExecutor(max_workers=self._pool_size)
+            return AsyncClient._shared_session
+
+    def _prepare_request(self, method, path, signed, **kwargs):
+        uri, kwargs = Client._prepare_request(self, method, path, signed, **kwargs)
+        # the session is shared : credentials go with each request
+        kwargs['headers']['KC-API-KEY'] = self.API_KEY
+        kwargs['headers']['KC-API-PASSPHRASE'] = self.API_PASSPHRASE
+        return uri, kwargs
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Run a blocking function in the shared thread pool"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(AsyncClient._shared_executor, partial(func, *args, **kwargs))
+
+    async def _request(self, method, path, signed, **kwargs):
+        # the priority is read here, the request is sent from the pool
+        kwargs['priority'] = current_priority(method, path)
+        return await self.run_sync(Client._request, self, method, path, signed, **kwargs)
+
+    @property
+    def sync_client(self):
+        """Blocking Client with the same credentials and the shared session,
+        for the helpers that chain several calls
+        """
+        if self._sync_client is None:
+            client = Client.__new__(Client)
+            client.__dict__.update(self.__dict__)
+            client._prepare_request = self._prepare_request
+            self._sync_client = client
+        return self._sync_client
+
+    # the shared caches call the API from their own thread : blocking client
+    def ticker_cache(self, ttl=5):
+        return self.sync_client.ticker_cache(ttl)
+
+    def reference_data(self, ttl=3600):
+        return self.sync_client.reference_data(ttl)
+
+    def account_book(self):
+        return self.sync_client.account_book()
+
+    def exchange_clock(self):
+        return self.sync_client.exchange_clock()
+
+    async def get_cached_ticker(self, symbol, ttl=5):
+        """See Client.get_cached_ticker"""
+        return await self.run_sync(self.sync_client.get_cached_ticker, symbol, ttl)
+
+    async def get_account_snapshot(self, max_age=None):
+        """See Client.get_account_snapshot"""
+        return await self.run_sync(self.sync_client.get_account_snapshot, max_age)
+
+    async def get_order_by_client_oid(self, client_oid):
+        """See Client.get_order_by_client_oid"""
+        return await self.run_sync(self.sync_client.get_order_by_client_oid, client_oid)
+
+    async def wait_for_fill(self, order_id, timeout=30, first_delay=0.05, max_delay=1.0):
+        """See Client.wait_for_fill"""
+        return await self.run_sync(self.sync_client.wait_for_fill, order_id, timeout, first_delay, max_delay)
+
+    async def get_symbol_info(self, symbol):
+        """See Client.get_symbol_info"""
+        return await self.run_sync(self.sync_client.get_symbol_info, symbol)
+
+    async def get_currency_info(self, currency):
+        """See Client.get_currency_info"""
+        return await self.run_sync(self.sync_client.get_currency_info, currency)
+
+    async def sync_klines(self, store, symbol, kline_type='2hour', start=None):
+        """See Client.sync_klines"""
+        return await self.run_sync(self.sync_client.sync_klines, store, symbol, kline_type, start)
+
+    async def backfill_klines(self, store, symbols, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """See Client.backfill_klines"""
+        return await self.run_sync(self.sync_client.backfill_klines, store, symbols, kline_type, start, end, workers, max_rate)
+
+    async def get_kline_data(self, symbol, kline_type='5min', start=None, end=None):
+        """See Client.get_kline_data"""
+        if end is None:
+            # the first call syncs the exchange clock : not in the event loop
+            end = int(await self.run_sync(self.server_time))
+        return await Client.get_kline_data(self, symbol, kline_type, start, end)
+
+    async def iter_kline_pages(self, symbol, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """Async generator version of Client.iter_kline_pages : the blocking
+        generator runs in the shared thread pool, one page at a time
+        .. code:: python
+            async for page in client.iter_kline_pages('KCS-BTC', '5min', 1507479171, 1510278278):
+                closes = [float(k[2]) for k in page]
+        """
+        pages = self.sync_client.iter_kline_pages(symbol, kline_type, start, end, workers, max_rate)
+        done = object()
+        try:
+            while True:
+                page = await self.run_sync(next, pages, done)
+                if page is done:
+                    return
+                yield page
+        finally:
+            pages.close()
+
+    async def iter_kline_data(self, symbol, kline_type='5min', start=None, end=None, workers=4, max_rate=8):
+        """Same as iter_kline_pages, candle by candle"""
+        async for page in self.iter_kline_pages(symbol, kline_type, start, end, workers, max_rate):
+            for kline in page:
+                yield kline
@@ -0,0 +1,512 @@
+# coding=utf-8
+
+import base64
+import hashlib
+import hmac
+import json
+import math
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, RLock
+from urllib.parse import urlsplit, parse_qsl
+
+# Fake Kucoin Server
+# Serveur HTTP local qui parle l'API REST de Kucoin, pour faire tourner les
+# clients et les bots sans cles ni reseau : tests deterministes et benchmarks.
+#
+# - signature verifiee comme Kucoin (KC-API-KEY, KC-API-SIGN, KC-API-TIMESTAMP, KC-API-PASSPHRASE)
+# - prix scriptes : price_at(symbol, t) donne ticker, bougies et prix d'execution
+# - ordres au marche executes immediatement, soldes margin mis a jour
+# - latence et erreurs injectables (error_rate, fail_next)
+#
+# .. code:: python
+#     server = FakeKucoinServer()
+#     server.add_key('key', 'secret', 'passphrase', balances={'USDT': 1000})
+#     server.start()
+#     client = Client('key', 'secret', 'passphrase', api_url=server.url)
+
+KLINE_SECONDS = {'1min': 60, '3min': 180, '5min': 300, '15min': 900, '30min': 1800,
+                 '1hour': 3600, '2hour': 7200, '4hour': 14400, '6hour': 21600,
+                 '8hour': 28800, '12hour': 43200, '1day': 86400, '1week': 604800}
+
+DEFAULT_SYMBOLS = {'BTC-USDT': 9000.0, 'ETH-USDT': 200.0, 'KCS-USDT': 1.0}
+
+
+def wave_price(base, amplitude=0.05, period=86400.0):
+    """Deterministic price script : a sine wave around `base`"""
+    def price_at(t):
+        return base*(1 + amplitude*math.sin(2*math.pi*t/period))
+    return price_at
+
+
+def _format(value):
+    """Kucoin sends numbers as strings"""
+    return '{:.8f}'.format(value).rstrip('0').rstrip('.')
+
+
+class FakeApiError(Exception):
+    def __init__(self, status, code, message):
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return 'FakeApiError {} {}: {}'.format(self.status, self.code, self.message)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        status, payload = self.server.fake.handle(method, self.path, self.headers, body)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FakeKucoinServer(Thread):
+    """Local stand-in for Kucoin's REST API
+
+    Implements the endpoints used by kucoin_client.Client : timestamp,
+    symbols, currencies, accounts, orders, market/candles,
+    market/orderbook/level1, market/allTickers and bullet-public.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, symbols=None, latency=0.0, error_rate=0.0,
+                 fee_rate=0.001, ws_url=None, seed=None):
+        """
+        :param symbols: (optional) {symbol: price or price_at(t) function}
+        :param latency: seconds added to every response, or (min, max)
+        :param error_rate: share of the requests answered by a 500
+        :param fee_rate: fee of the market orders, in quote currency
+        :param ws_url: (optional) url returned by bullet-public, e.g. FakeWsServer.url
+        :param seed: (optional) seed of the latency and error draws
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.host, self.port = self.httpd.server_address[:2]
+        self.url = 'http://{}:{}'.format(self.host, self.port)
+        self.lock = RLock()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fee_rate = fee_rate
+        self.ws_url = ws_url
+        self.random = random.Random(seed)
+        # decalage de l'horloge du serveur, pour simuler une derive
+        self.clock_offset = 0.0
+        self.failures = []
+        self.keys = {}
+        self.balances = {}
+        self.orders = {}
+        self.client_oids = {}
+        self.prices = {}
+        self.counts = {}
+        for symbol, price in (symbols or DEFAULT_SYMBOLS).items():
+            self.set_price(symbol, price)
+
+    ### Configuration ###
+
+    def add_key(self, api_key, api_secret, passphrase, balances=None):
+        """Register an API key, with its margin balances {currency: amount}"""
+        with self.lock:
+            self.keys[api_key] = (api_secret, passphrase)
+            self.balances[api_key] = {}
+            for currency, amount in (balances or {}).items():
+                self.balances[api_key][(currency, 'margin')] = float(amount)
+
+    def set_price(self, symbol, price):
+        """Script the price of `symbol` : a constant or a price_at(t) function"""
+        with self.lock:
+            if callable(price):
+                self.prices[symbol] = price
+            else:
+                self.prices[symbol] = lambda t, p=float(price): p
+
+    def price_at(self, symbol, t=None):
+        if t is None:
+            t = self.now()
+        return self.prices[symbol](t)
+
+    def fail_next(self, count=1, status=500, code='500000', message='Internal Server Error'):
+        """Answer the next `count` requests with an error, e.g. status=429"""
+        with self.lock:
+            self.failures.extend([(status, code, message)]*count)
+
+    def now(self):
+        return time.time() + self.clock_offset
+
+    ### Thread ###
+
+    def run(self):
+        self.httpd.serve_forever(poll_interval=0.1)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    ### Requests ###
+
+    def _delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _injected_error(self):
+        with self.lock:
+            if self.failures:
+                return self.failures.pop(0)
+            if self.error_rate and self.random.random() < self.error_rate:
+                return (500, '500000', 'Internal Server Error')
+        return None
+
+    def handle(self, method, raw_path, headers, body):
+        """Answer one request
+        :return: (http status, json payload)
+        """
+        self._delay()
+        url = urlsplit(raw_path)
+        path = url.path
+        if path.startswith('/api/v1/'):
+            path = path[len('/api/v1/'):]
+        query = dict(parse_qsl(url.query))
+        with self.lock:
+            key = '{} {}'.format(method, path.split('/')[0])
+            self.counts[key] = self.counts.get(key, 0) + 1
+        error = self._injected_error()
+        if error is not None:
+            return error[0], {'code': error[1], 'msg': error[2]}
+        try:
+            data = json.loads(body) if body else {}
+            data.update(query)
+            route, private = self._route(method, path)
+            api_key = None
+            if private:
+                api_key = self._authenticate(method, raw_path, headers, body)
+            return 200, {'code': '200000', 'data': route(data, api_key)}
+        except FakeApiError as e:
+            return e.status, {'code': e.code, 'msg': e.message}
+        except (KeyError, ValueError) as e:
+            return 400, {'code': '400100', 'msg': 'Parameter Error {}'.format(e)}
+
+    def _route(self, method, path):
+        """(handler, signed) of an endpoint"""
+        parts = path.split('/')
+        if method == 'GET':
+            if path == 'timestamp':
+                return self.timestamp, False
+            if path == 'symbols':
+                return self.symbols, False
+            if path == 'currencies':
+                return self.currencies, False
+            if parts[0] == 'currencies' and len(parts) == 2:
+                return lambda data, key: self.currency(parts[1]), False
+            if path == 'market/allTickers':
+                return self.all_tickers, False
+            if path == 'market/orderbook/level1':
+                return self.level1, False
+            if path == 'market/candles':
+                return self.candles, False
+            if path == 'accounts':
+                return self.accounts, True
+            if path == 'orders':
+                return self.list_orders, True
+            if parts[0] == 'orders' and len(parts) == 2:
+                return lambda data, key: self.order(key, parts[1]), True
+            if parts[:2] == ['order', 'client-order'] and len(parts) == 3:
+                return lambda data, key: self.order(key, self.client_oids.get((key, parts[2]))), True
+        elif method == 'POST':
+            if path == 'orders':
+                return self.create_order, True
+            if path == 'bullet-public':
+                return self.bullet, False
+        elif method == 'DELETE':
+            if path == 'orders':
+                return self.cancel_orders, True
+            if parts[0] == 'orders' and len(parts) == 2:
+                return lambda data, key: self.cancel_orders({'orderId': parts[1]}, key), True
+        raise FakeApiError(404, '404000', 'Url Not Found')
+
+    def _authenticate(self, method, raw_path, headers, body):
+        """Check the headers of a signed request like Kucoin does
+        :return: the api key
+        """
+        api_key = headers.get('KC-API-KEY')
+        sign = headers.get('KC-API-SIGN')
+        timestamp = headers.get('KC-API-TIMESTAMP')
+        passphrase = headers.get('KC-API-PASSPHRASE')
+        if not (api_key and sign and timestamp and passphrase):
+            raise FakeApiError(401, '400001', 'Please check the header of your request')
+        if abs(int(timestamp)/1000.0 - self.now()) > 5:
+            raise FakeApiError(401, '400002', 'Invalid KC-API-TIMESTAMP')
+        if api_key not in self.keys:
+            raise FakeApiError(401, '400003', 'KC-API-KEY not exists')
+        secret, expected_passphrase = self.keys[api_key]
+        if passphrase != expected_passphrase:
+            raise FakeApiError(401, '400004', 'Invalid KC-API-PASSPHRASE')
+        sig_str = '{}{}{}{}'.format(timestamp, method, raw_path, body).encode('utf-8')
+        m = hmac.new(secret.encode('utf-8'), sig_str, hashlib.sha256)
+        if not hmac.compare_digest(base64.b64encode(m.digest()).decode('utf-8'), sign):
+            raise FakeApiError(401, '400005', 'Invalid KC-API-SIGN')
+        return api_key
+
+    ### Endpoints ###
+
+    def timestamp(self, data, api_key):
+        return int(self.now()*1000)
+
+    def bullet(self, data, api_key):
+        return {'token': 'fake',
+                'instanceServers': [{'endpoint': self.ws_url or 'ws://127.0.0.1:0/endpoint',
+                                     'protocol': 'websocket', 'encrypt': False,
+                                     'pingInterval': 18000, 'pingTimeout': 10000}]}
+
+    def symbols(self, data, api_key):
+        result = []
+        for symbol in sorted(self.prices):
+            base, quote = symbol.split('-')
+            result.append({'symbol': symbol, 'name': symbol, 'baseCurrency': base, 'quoteCurrency': quote,
+                           'baseMinSize': '0.0001', 'quoteMinSize': '0.01', 'baseMaxSize': '10000000000',
+                           'quoteMaxSize': '99999999', 'baseIncrement': '0.0001', 'quoteIncrement': '0.01',
+                           'priceIncrement': '0.01', 'feeCurrency': quote, 'enableTrading': True,
+                           'isMarginEnabled': True})
+        return result
+
+    def _currency_names(self):
+        names = set()
+        for symbol in self.prices:
+            names.update(symbol.split('-'))
+        return sorted(names)
+
+    def currencies(self, data, api_key):
+        return [self.currency(c) for c in self._currency_names()]
+
+    def currency(self, currency):
+        if currency not in self._currency_names():
+            raise FakeApiError(400, '900003', 'Currency not exists')
+        return {'currency': currency, 'name': currency, 'fullName': currency, 'precision': 8,
+                'withdrawalMinSize': '0.0001', 'withdrawalMinFee': '0.0001',
+                'isWithdrawEnabled': True, 'isDepositEnabled': True}
+
+    def _ticker(self, symbol):
+        price = self.price_at(symbol)
+        # fourchette de 0.1% autour du prix
+        return price, price*0.9995, price*1.0005
+
+    def level1(self, data, api_key):
+        symbol = data['symbol']
+        if symbol not in self.prices:
+            raise FakeApiError(400, '900001', 'Symbol not exists')
+        price, bid, ask = self._ticker(symbol)
+        return {'sequence': '1', 'time': int(self.now()*1000), 'price': _format(price), 'size': '1',
+                'bestBid': _format(bid), 'bestBidSize': '1', 'bestAsk': _format(ask), 'bestAskSize': '1'}
+
+    def all_tickers(self, data, api_key):
+        ticker = []
+        for symbol in sorted(self.prices):
+            price, bid, ask = self._ticker(symbol)
+            ticker.append({'symbol': symbol, 'symbolName': symbol, 'last': _format(price),
+                           'buy': _format(bid), 'sell': _format(ask), 'vol': '1000'})
+        return {'time': int(self.now()*1000), 'ticker': ticker}
+
+    def candles(self, data, api_key):
+        """Candles between startAt and endAt included, newest first, at most 1500 like Kucoin"""
+        symbol = data['symbol']
+        if symbol not in self.prices:
+            raise FakeApiError(400, '900001', 'Symbol not exists')
+        step = KLINE_SECONDS[data['type']]
+        now = int(self.now())
+        end = min(int(data.get('endAt') or now), now)
+        start = int(data.get('startAt') or end - 1500*step)
+        first = start//step*step
+        times = list(range(first, end + 1, step))[-1500:]
+        result = []
+        for t in reversed(times):
+            close_time = min(t + step, now)
+            o, c = self.price_at(symbol, t), self.price_at(symbol, close_time)
+            mid = self.price_at(symbol, (t + close_time)/2.0)
+            high, low = max(o, c, mid), min(o, c, mid)
+            result.append([str(t), _format(o), _format(c), _format(high), _format(low), '10', _format(10*c)])
+        return result
+
+    def accounts(self, data, api_key):
+        with self.lock:
+            result = []
+            for (currency, account_type), amount in sorted(self.balances[api_key].items()):
+                if data.get('currency') and data['currency'] != currency:
+                    continue
+                if data.get('type') and data['type'] != account_type:
+                    continue
+                result.append({'id': '{}-{}'.format(currency, account_type), 'currency': currency,
+                               'type': account_type, 'balance': _format(amount),
+                               'available': _format(amount), 'holds': '0'})
+            return result
+
+    def _credit(self, api_key, currency, amount):
+        book = self.balances[api_key]
+        book[(currency, 'margin')] = book.get((currency, 'margin'), 0.0) + amount
+
+    def create_order(self, data, api_key):
+        symbol = data['symbol']
+        if symbol not in self.prices:
+            raise FakeApiError(400, '900001', 'Symbol not exists')
+        side = data['side']
+        order_type = data.get('type', 'limit')
+        base, quote = symbol.split('-')
+        with self.lock:
+            client_oid = data.get('clientOid')
+            if client_oid and (api_key, client_oid) in self.client_oids:
+                raise FakeApiError(400, '400100', 'clientOid duplicated')
+            order = {'id': uuid.uuid4().hex[:24], 'symbol': symbol, 'opType': 'DEAL', 'type': order_type,
+                     'side': side, 'price': data.get('price', '0'), 'size': data.get('size', '0'),
+                     'funds': data.get('funds', '0'), 'dealFunds': '0', 'dealSize': '0', 'fee': '0',
+                     'feeCurrency': quote, 'stp': data.get('stp', ''), 'timeInForce': 'GTC',
+                     'cancelAfter': 0, 'postOnly': False, 'hidden': False, 'iceberge': False,
+                     'clientOid': client_oid or '', 'remark': data.get('remark'),
+                     'tradeType': data.get('tradeType', 'TRADE'), 'isActive': True, 'cancelExist': False,
+                     'createdAt': int(self.now()*1000), 'api_key': api_key}
+            if order_type == 'market':
+                self._fill(order, side, base, quote, api_key)
+            self.orders[order['id']] = order
+            if client_oid:
+                self.client_oids[(api_key, client_oid)] = order['id']
+            return {'orderId': order['id']}
+
+    def _fill(self, order, side, base, quote, api_key):
+        """Fill a market order at the ask (buy) or bid (sell)"""
+        price, bid, ask = self._ticker(order['symbol'])
+        price = ask if side == 'buy' else bid
+        if float(order['size']):
+            size = float(order['size'])
+            funds = size*price
+        else:
+            funds = float(order['funds'])
+            size = funds/price
+        fee = funds*self.fee_rate
+        if side == 'buy':
+            if self.balances[api_key].get((quote, 'margin'), 0.0) < funds + fee:
+                raise FakeApiError(400, '200004', 'Balance insufficient')
+            self._credit(api_key, base, size)
+            self._credit(api_key, quote, -funds - fee)
+        else:
+            if self.balances[api_key].get((base, 'margin'), 0.0) < size:
+                raise FakeApiError(400, '200004', 'Balance insufficient')
+            self._credit(api_key, base, -size)
+            self._credit(api_key, quote, funds - fee)
+        order.update({'dealSize': _format(size), 'dealFunds': _format(funds), 'fee': _format(fee),
+                      'isActive': False})
+
+    def _public(self, order):
+        return dict((k, v) for k, v in order.items() if k != 'api_key')
+
+    def order(self, api_key, order_id):
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None or order['api_key'] != api_key:
+                raise FakeApiError(404, '400100', 'order not exist')
+            return self._public(order)
+
+    def list_orders(self, data, api_key):
+        with self.lock:
+            items = [self._public(o) for o in self.orders.values() if o['api_key'] == api_key
+                     and (not data.get('symbol') or o['symbol'] == data['symbol'])
+                     and (data.get('status') != 'active' or o['isActive'])
+                     and (data.get('status') != 'done' or not o['isActive'])]
+        items.sort(key=lambda o: o['createdAt'], reverse=True)
+        return {'currentPage': 1, 'pageSize': len(items), 'totalNum': len(items), 'totalPage': 1, 'items': items}
+
+    def cancel_orders(self, data, api_key):
+        with self.lock:
+            cancelled = []
+            for order in self.orders.values():
+                if order['api_key'] != api_key or not order['isActive']:
+                    continue
+                if data.get('orderId') and order['id'] != data['orderId']:
+                    continue
+                if data.get('symbol') and order['symbol'] != data['symbol']:
+                    continue
+                order.update({'isActive': False, 'cancelExist': True})
+                cancelled.append(order['id'])
+            return {'cancelledOrderIds': cancelled}
+
+
+### Benchmark ###
+
+def benchmark(threads=8, calls=100, latency=0.0, error_rate=0.0):
+    """Run `threads` clients doing `calls` ticker/accounts/order calls each
+    against a local fake server
+    :return: dict with calls, errors, seconds, calls_per_second
+    """
+    import kucoin_client as kc
+    server = FakeKucoinServer(latency=latency, error_rate=error_rate, seed=1)
+    server.start()
+    # les limites de Kucoin ne s'appliquent pas au serveur local
+    limits = (kc.rate_limiter.IP_LIMIT, kc.rate_limiter.KEY_LIMIT, kc.rate_limiter.ORDER_LIMIT)
+    kc.rate_limiter.IP_LIMIT = kc.rate_limiter.KEY_LIMIT = kc.rate_limiter.ORDER_LIMIT = (1e6, 1e6)
+    counts = {'calls': 0, 'errors': 0}
+    lock = RLock()
+
+    def worker(n):
+        api_key = 'key{}'.format(n)
+        server.add_key(api_key, 'secret', 'passphrase', balances={'USDT': 1e9, 'BTC': 1e3})
+        client = kc.Client(api_key, 'secret', 'passphrase', api_url=server.url)
+        for i in range(calls):
+            try:
+                if i % 3 == 0:
+                    client.get_ticker('BTC-USDT')
+                elif i % 3 == 1:
+                    client.get_accounts()
+                else:
+                    client.create_market_order('BTC-USDT', 'buy', size='0.001')
+                ok = 1
+            except Exception:
+                ok = 0
+            with lock:
+                counts['calls'] += 1
+                counts['errors'] += 1 - ok
+
+    start = time.time()
+    workers = [Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.time() - start
+    server.stop()
+    kc.rate_limiter.IP_LIMIT, kc.rate_limiter.KEY_LIMIT, kc.rate_limiter.ORDER_LIMIT = limits
+    counts['seconds'] = seconds
+    counts['calls_per_second'] = counts['calls']/seconds if seconds else 0.0
+    return counts
+
+
+if __name__ == '__main__':
+    import sys
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    result = benchmark(threads, calls, latency)
+    print('{calls} calls, {errors} errors in {seconds:.2f}s : {calls_per_second:.0f} calls/s'.format(**result))
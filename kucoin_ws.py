@@ -0,0 +1,496 @@
+# coding=utf-8
+
+import base64
+import hashlib
+import json
+import fast_json
+import os
+import random
+import socket
+import ssl
+import struct
+import time
+from threading import Thread, RLock, Event
+from urllib.parse import urlparse
+
+from kucoin_client import KLINE_INTERVALS
+
+# Kucoin Streaming
+# Public WebSocket channels (ticker, klines) pushed into memory, with
+# automatic reconnect and resubscribe. The WebSocket protocol (RFC 6455) is
+# implemented on plain sockets, so that no extra module is needed.
+#
+# KucoinStream : client side, fed by Kucoin's /market/ticker and /market/candles topics
+# FakeWsServer : local stand-in server speaking the same protocol, for tests
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return 'WebSocketException: {}'.format(self.message)
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode('utf-8')).digest()).decode('utf-8')
+
+
+def _recv_exact(sock, n, allow_timeout=False):
+    """Read exactly n bytes. A timeout is only raised before the first byte
+    when `allow_timeout` is set : once a frame has started, it is read to the end.
+    """
+    buf = b''
+    while len(buf) < n:
+        try:
+            chunk = sock.recv(n - len(buf))
+        except socket.timeout:
+            if allow_timeout and not buf:
+                raise
+            continue
+        if not chunk:
+            raise WebSocketException('Connection closed')
+        buf += chunk
+    return buf
+
+
+def _read_http_head(sock):
+    """Read an HTTP head byte by byte, so that no frame following it is consumed"""
+    head = b''
+    while not head.endswith(b'\r\n\r\n'):
+        chunk = sock.recv(1)
+        if not chunk:
+            raise WebSocketException('Handshake failed : connection closed')
+        head += chunk
+    lines = head[:-4].decode('utf-8', 'replace').split('\r\n')
+    headers = dict((l.split(':', 1)[0].strip().lower(), l.split(':', 1)[1].strip()) for l in lines[1:] if ':' in l)
+    return lines[0], headers
+
+
+def encode_frame(payload, opcode=OP_TEXT, mask=True):
+    """Build a single final frame ; clients must mask, servers must not"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 65536:
+        header += bytes([mask_bit | 126]) + struct.pack('>H', length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack('>Q', length)
+    if mask:
+        key = os.urandom(4)
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        header += key
+    return header + payload
+
+
+def read_frame(sock, allow_timeout=False):
+    """Read one frame
+    :return: (fin, opcode, payload)
+    """
+    b1, b2 = _recv_exact(sock, 2, allow_timeout)
+    fin, opcode = b1 & 0x80, b1 & 0x0F
+    length = b2 & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', _recv_exact(sock, 8))[0]
+    key = _recv_exact(sock, 4) if b2 & 0x80 else None
+    payload = _recv_exact(sock, length) if length else b''
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bool(fin), opcode, payload
+
+
+class WebSocket(object):
+    """Minimal blocking WebSocket connection"""
+
+    def __init__(self, sock, mask=True):
+        self.sock = sock
+        self.mask = mask
+        self.lock = RLock()
+        self.closed = False
+
+    @classmethod
+    def connect(cls, url, timeout=10):
+        """Open a client connection to a ws:// or wss:// url"""
+        u = urlparse(url)
+        secure = u.scheme == 'wss'
+        port = u.port or (443 if secure else 80)
+        sock = socket.create_connection((u.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=u.hostname)
+        path = u.path or '/'
+        if u.query:
+            path += '?' + u.query
+        key = base64.b64encode(os.urandom(16)).decode('utf-8')
+        request = ('GET {} HTTP/1.1\r\n'
+                   'Host: {}:{}\r\n'
+                   'Upgrade: websocket\r\n'
+                   'Connection: Upgrade\r\n'
+                   'Sec-WebSocket-Key: {}\r\n'
+                   'Sec-WebSocket-Version: 13\r\n\r\n').format(path, u.hostname, port, key)
+        sock.sendall(request.encode('utf-8'))
+        status, headers = _read_http_head(sock)
+        if ' 101 ' not in status + ' ':
+            raise WebSocketException('Handshake failed : {}'.format(status))
+        if headers.get('sec-websocket-accept') != _accept_key(key):
+            raise WebSocketException('Handshake failed : bad Sec-WebSocket-Accept')
+        return cls(sock, mask=True)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def send(self, payload, opcode=OP_TEXT):
+        with self.lock:
+            self.sock.sendall(encode_frame(payload, opcode, self.mask))
+
+    def send_json(self, data):
+        self.send(json.dumps(data, separators=(',', ':')))
+
+    def recv(self):
+        """Next text message, None once the connection is closed.
+        Raises socket.timeout if nothing arrives within the socket timeout.
+        """
+        message, first = b'', True
+        while True:
+            fin, opcode, payload = read_frame(self.sock, allow_timeout=first)
+            first = False
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+            elif opcode == OP_PONG:
+                pass
+            elif opcode == OP_CLOSE:
+                self.close()
+                return None
+            else:
+                message += payload
+                if fin:
+                    return message.decode('utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.sock.sendall(encode_frame(b'', OP_CLOSE, self.mask))
+            except (OSError, socket.error):
+                pass
+            try:
+                self.sock.close()
+            except (OSError, socket.error):
+                pass
+
+
+class KucoinStream(Thread):
+    """Live tickers and candles from Kucoin's public WebSocket channels
+
+    .. code:: python
+        stream = KucoinStream(client)
+        stream.subscribe_ticker('BTC-USDT', lambda symbol, ticker: print(ticker['price']))
+        stream.subscribe_klines('BTC-USDT', '2hour', on_candle_closed)
+        stream.start()
+    """
+
+    def __init__(self, client=None, url=None, reconnect_delay=1, max_reconnect_delay=60):
+        """
+        :param client: kucoin_client.Client used to get a connection token
+        :param url: (optional) WebSocket url to use instead of asking Kucoin for one,
+            e.g. the url of a FakeWsServer
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.client = client
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = 20
+        self.continuer = True
+        self.connected = Event()
+        self.lock = RLock()
+        self.ws = None
+        self.last_message = 0.0
+        # Etat en memoire
+        self.tickers = {}
+        self.candles = {}
+        self.ticker_listeners = {}
+        self.kline_listeners = {}
+        self.gap_listeners = {}
+        self.connections = 0
+
+    # Subscriptions
+
+    def subscribe_ticker(self, symbol, callback=None):
+        """Follow the ticker of `symbol` ; callback(symbol, ticker) on every push"""
+        with self.lock:
+            new = symbol not in self.ticker_listeners
+            self.ticker_listeners.setdefault(symbol, [])
+            if callback is not None:
+                self.ticker_listeners[symbol].append(callback)
+        if new:
+            self._send_subscribe('/market/ticker:{}'.format(symbol))
+
+    def subscribe_klines(self, symbol, kline_type, callback=None, on_gap=None):
+        """Follow the candles of `symbol` ; callback(symbol, kline_type, kline) with each
+        closed candle, kline being in get_kline_data format
+        :param on_gap: (optional) on_gap(symbol, kline_type) when closed candles
+            may have been missed (reconnection, candles skipped) : they are not
+            pushed, fetch them over REST
+        """
+        key = (symbol, kline_type)
+        with self.lock:
+            new = key not in self.kline_listeners
+            self.kline_listeners.setdefault(key, [])
+            self.gap_listeners.setdefault(key, [])
+            if callback is not None:
+                self.kline_listeners[key].append(callback)
+            if on_gap is not None:
+                self.gap_listeners[key].append(on_gap)
+        if new:
+            self._send_subscribe('/market/candles:{}_{}'.format(symbol, kline_type))
+
+    def topics(self):
+        with self.lock:
+            topics = ['/market/ticker:{}'.format(s) for s in self.ticker_listeners]
+            topics += ['/market/candles:{}_{}'.format(s, t) for s, t in self.kline_listeners]
+        return topics
+
+    def get_ticker(self, symbol):
+        """Last pushed ticker of `symbol`, None if nothing received yet"""
+        return self.tickers.get(symbol)
+
+    def is_live(self, max_age=30):
+        """Connected and fed with messages recently"""
+        return self.connected.is_set() and time.time() - self.last_message < max_age
+
+    def _send_subscribe(self, topic):
+        ws = self.ws
+        if ws is None or not self.connected.is_set():
+            # envoye a la (re)connexion
+            return
+        try:
+            ws.send_json({'id': str(int(time.time()*1000)) + str(random.randint(0, 999)), 'type': 'subscribe',
+                          'topic': topic, 'privateChannel': False, 'response': True})
+        except (OSError, socket.error, WebSocketException):
+            pass
+
+    # Connection
+
+    def _endpoint(self):
+        if self.url is not None:
+            return self.url
+        res = self.client.get_ws_token()
+        server = res['instanceServers'][0]
+        self.ping_interval = server.get('pingInterval', 20000)/1000.0/2
+        return '{}?token={}&connectId={}'.format(server['endpoint'], res['token'], int(time.time()*1000))
+
+    def _connect(self):
+        ws = WebSocket.connect(self._endpoint())
+        ws.settimeout(10)
+        welcome = fast_json.loads(ws.recv())
+        if welcome.get('type') != 'welcome':
+            ws.close()
+            raise WebSocketException('Unexpected first message : {}'.format(welcome))
+        with self.lock:
+            # bougies en cours vues avant la coupure : peut-etre plus les dernieres
+            self.candles = {}
+            self.connections += 1
+            keys = list(self.kline_listeners) if self.connections > 1 else []
+        self.ws = ws
+        self.connected.set()
+        self.last_message = time.time()
+        for topic in self.topics():
+            self._send_subscribe(topic)
+        for symbol, kline_type in keys:
+            self._gap(symbol, kline_type)
+
+    def _gap(self, symbol, kline_type):
+        for callback in list(self.gap_listeners.get((symbol, kline_type), [])):
+            callback(symbol, kline_type)
+
+    def _dispatch(self, msg):
+        if msg.get('type') != 'message':
+            return
+        topic, data = msg.get('topic', ''), msg.get('data', {})
+        if topic.startswith('/market/ticker:'):
+            symbol = topic.split(':', 1)[1]
+            self.tickers[symbol] = data
+            for callback in list(self.ticker_listeners.get(symbol, [])):
+                callback(symbol, data)
+        elif topic.startswith('/market/candles:'):
+            symbol, kline_type = topic.split(':', 1)[1].rsplit('_', 1)
+            key = (symbol, kline_type)
+            kline = data['candles']
+            previous = self.candles.get(key)
+            self.candles[key] = kline
+            if previous is None or int(kline[0]) <= int(previous[0]):
+                return
+            if int(previous[0]) + KLINE_INTERVALS[kline_type] == int(kline[0]):
+                # La bougie suivante commence : la precedente est cloturee
+                for callback in list(self.kline_listeners.get(key, [])):
+                    callback(symbol, kline_type, previous)
+            else:
+                # Bougies sautees : la precedente n'a peut-etre pas vu sa fin
+                self._gap(symbol, kline_type)
+
+    def run(self):
+        delay = self.reconnect_delay
+        while self.continuer:
+            try:
+                self._connect()
+                delay = self.reconnect_delay
+                last_ping = time.time()
+                while self.continuer:
+                    # ping a intervalle fixe, meme quand les messages arrivent
+                    # sans arret (sinon Kucoin coupe apres pingTimeout)
+                    if time.time() - last_ping >= self.ping_interval:
+                        self.ws.send_json({'id': str(int(time.time()*1000)), 'type': 'ping'})
+                        last_ping = time.time()
+                    self.ws.settimeout(max(0.05, last_ping + self.ping_interval - time.time()))
+                    try:
+                        raw = self.ws.recv()
+                    except socket.timeout:
+                        continue
+                    if raw is None:
+                        break
+                    self.last_message = time.time()
+                    self._dispatch(fast_json.loads(raw))
+            except Exception:
+                pass
+            self.connected.clear()
+            if self.ws is not None:
+                self.ws.close()
+                self.ws = None
+            if self.continuer:
+                # reconnexion avec backoff exponentiel
+                time.sleep(delay + random.random()*delay/2)
+                delay = min(delay*2, self.max_reconnect_delay)
+
+    def stop(self):
+        self.continuer = False
+        if self.ws is not None:
+            self.ws.close()
+
+
+class FakeWsServer(Thread):
+    """Local stand-in for Kucoin's WebSocket server
+
+    Sends the welcome message, acknowledges subscriptions, answers pings and
+    pushes whatever is published to the clients subscribed to the topic.
+
+    .. code:: python
+        server = FakeWsServer()
+        server.start()
+        stream = KucoinStream(url=server.url)
+        ...
+        server.publish('/market/ticker:BTC-USDT', 'trade.ticker', {'price': '9000', ...})
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        Thread.__init__(self)
+        self.daemon = True
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(16)
+        self.host, self.port = self.listener.getsockname()
+        self.url = 'ws://{}:{}/endpoint'.format(self.host, self.port)
+        self.lock = RLock()
+        self.clients = {}
+        self.pings = 0
+        self.continuer = True
+
+    def run(self):
+        while self.continuer:
+            try:
+                sock, addr = self.listener.accept()
+            except (OSError, socket.error):
+                break
+            Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock):
+        request, headers = _read_http_head(sock)
+        response = ('HTTP/1.1 101 Switching Protocols\r\n'
+                    'Upgrade: websocket\r\n'
+                    'Connection: Upgrade\r\n'
+                    'Sec-WebSocket-Accept: {}\r\n\r\n').format(_accept_key(headers['sec-websocket-key']))
+        sock.sendall(response.encode('utf-8'))
+
+    def _serve(self, sock):
+        ws = None
+        try:
+            self._handshake(sock)
+            ws = WebSocket(sock, mask=False)
+            with self.lock:
+                self.clients[ws] = set()
+            ws.send_json({'id': str(int(time.time()*1000)), 'type': 'welcome'})
+            while self.continuer:
+                raw = ws.recv()
+                if raw is None:
+                    break
+                msg = json.loads(raw)
+                if msg.get('type') == 'ping':
+                    self.pings += 1
+                    ws.send_json({'id': msg.get('id'), 'type': 'pong'})
+                elif msg.get('type') in ('subscribe', 'unsubscribe'):
+                    prefix, symbols = msg['topic'].split(':', 1)
+                    topics = set('{}:{}'.format(prefix, s) for s in symbols.split(','))
+                    with self.lock:
+                        if msg['type'] == 'subscribe':
+                            self.clients[ws] |= topics
+                        else:
+                            self.clients[ws] -= topics
+                    if msg.get('response'):
+                        ws.send_json({'id': msg.get('id'), 'type': 'ack'})
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.clients.pop(ws, None)
+            if ws is not None:
+                ws.close()
+            else:
+                sock.close()
+
+    def subscribers(self, topic):
+        with self.lock:
+            return [ws for ws, topics in self.clients.items() if topic in topics]
+
+    def publish(self, topic, subject, data):
+        """Push a message to the clients subscribed to `topic`
+        :return: number of clients reached
+        """
+        msg = {'type': 'message', 'topic': topic, 'subject': subject, 'data': data}
+        sent = 0
+        for ws in self.subscribers(topic):
+            try:
+                ws.send_json(msg)
+                sent += 1
+            except (OSError, socket.error):
+                pass
+        return sent
+
+    def drop_clients(self):
+        """Close every client connection, e.g. to exercise reconnects"""
+        with self.lock:
+            clients = list(self.clients)
+        for ws in clients:
+            ws.close()
+
+    def stop(self):
+        self.continuer = False
+        self.drop_clients()
+        self.listener.close()
@@ -0,0 +1,109 @@
+# coding=utf-8
+
+### Indicateurs incrementaux ###
+# Les EMA sont amorcees une seule fois depuis l'historique, puis mises a jour
+# en O(1) a chaque cloture de bougie, au lieu d'etre recalculees a chaque tour.
+
+class EMA(object):
+    """Exponential moving average updated one closed candle at a time"""
+
+    def __init__(self, period):
+        self.period = int(period)
+        self.multiplier = 2/(self.period+1)
+        self.value = 0.0
+        self.ready = False
+
+    def seed(self, closes):
+        """Seed the EMA from closed candles, oldest first.
+        The SMA of the first `period` closes is the first EMA value, the
+        following closes are then applied one by one.
+        :param closes: list of close prices, oldest first
+        :return: the seeded value
+        """
+        if len(closes) < self.period:
+            raise ValueError('EMA{} needs at least {} closes, got {}'.format(self.period, self.period, len(closes)))
+        self.value = sum(closes[:self.period])/self.period
+        for close in closes[self.period:]:
+            self.value = (close-self.value)*self.multiplier + self.value
+        self.ready = True
+        return self.value
+
+    def update(self, close):
+        """Apply a newly closed candle
+        :return: the new value
+        """
+        self.value = (float(close)-self.value)*self.multiplier + self.value
+        return self.value
+
+    def peek(self, price):
+        """Provisional value if the in-progress candle closed at `price`,
+        without changing the state
+        """
+        return (float(price)-self.value)*self.multiplier + self.value
+
+
+class EmaEngine(object):
+    """Set of EMAs on one symbol, fed with closed candles
+
+    Kucoin returns klines newest first, the first one being the candle still
+    in progress : closed_candles() turns them into (time, close) tuples.
+    Each closed candle is applied exactly once.
+    """
+
+    def __init__(self, periods=(20, 45, 130)):
+        self.periods = tuple(periods)
+        self.emas = {p: EMA(p) for p in self.periods}
+        self.last_close_time = 0
+        self.ready = False
+
+    @staticmethod
+    def closed_candles(klines):
+        """Closed candles of a Kucoin kline list, oldest first, as (time, close)"""
+        return [(int(x[0]), float(x[2])) for x in reversed(klines[1:])]
+
+    def seed(self, candles):
+        """Seed every EMA from closed candles, over the same window as the
+        former full recompute : the SMA of the closes `period`-1 to
+        2*`period`-2 candles back, then the closes from `period`-1 candles
+        back to the last one (the SMA's newest close is applied twice, as it
+        was). The seeded values are those the full recompute gave.
+
+        The following candles are applied to the current value by update(),
+        where the full recompute seeded again on a sliding window : the two
+        differ by a term that shrinks at each candle.
+        :param candles: (time, close) list, oldest first, at least
+            2*period-2 candles for the longest period
+        """
+        closes = [c for t, c in candles]
+        for p, ema in self.emas.items():
+            start = len(closes) - 2*p + 2
+            if start < 0:
+                raise ValueError('EMA{} needs at least {} closes, got {}'.format(p, 2*p-2, len(closes)))
+            ema.seed(closes[start:start+p] + closes[start+p-1:])
+        self.last_close_time = candles[-1][0]
+        self.ready = True
+
+    def update(self, candles):
+        """Apply the candles closed since the last update
+        :param candles: recent (time, close) list, oldest first
+        :return: number of candles applied
+        """
+        applied = 0
+        for t, close in candles:
+            if t <= self.last_close_time:
+                continue
+            for ema in self.emas.values():
+                ema.update(close)
+            self.last_close_time = t
+            applied += 1
+        return applied
+
+    def value(self, period):
+        return self.emas[period].value
+
+    def values(self):
+        return {p: ema.value for p, ema in self.emas.items()}
+
+    def provisional(self, price):
+        """EMAs including the in-progress candle at `price`"""
+        return {p: ema.peek(price) for p, ema in self.emas.items()}
@@ -0,0 +1,176 @@
+# coding=utf-8
+
+### Importations ###
+import json
+import os
+from threading import RLock
+
+# Modules persos
+from ok_tradingbot_functions import crypter, decrypter
+
+### Journal d'etat ###
+# Etat des bots sur disque, pour reprendre apres un arret ou un crash sans
+# retaper le package ni redemander a l'exchange ce qu'on sait deja :
+#
+# state/
+#     snapshot.json   etat complet au dernier compactage
+#     journal.log     une ligne JSON par changement depuis ce compactage
+#
+# Chaque ligne est ecrite et synchronisee (fsync) avant de continuer ; une
+# derniere ligne incomplete (crash pendant l'ecriture) est ignoree a la
+# relecture. Les cles API sont gardees chiffrees avec le mot de passe maitre,
+# comme dans le package de quick_launch : au redemarrage, seul le mot de
+# passe est demande.
+
+ADD = 'a'
+UPDATE = 'u'
+REMOVE = 'r'
+
+
+class StateJournal(object):
+    """Write-ahead journal of the bots' state, compacted into a snapshot"""
+
+    def __init__(self, path='state', mdp=None, snapshot_every=1000):
+        """
+        :param mdp: master password protecting the saved API keys
+        :param snapshot_every: journal lines before a compaction
+        """
+        self.path = path
+        self.mdp = mdp
+        self.snapshot_every = snapshot_every
+        self.lock = RLock()
+        self.states = {}
+        os.makedirs(self.path, exist_ok=True)
+        self.lines = self.replay()
+        self.file = open(self._file('journal.log'), 'a')
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    ### Relecture ###
+
+    def replay(self):
+        """Load the snapshot, then apply the journal
+        :return: number of journal lines applied
+        """
+        try :
+            with open(self._file('snapshot.json'), 'r') as f:
+                self.states = json.load(f)['bots']
+        except (OSError, ValueError):
+            self.states = {}
+        lines, valid = 0, 0
+        try :
+            with open(self._file('journal.log'), 'rb') as f:
+                for line in f:
+                    try :
+                        if not line.endswith(b'\n'):
+                            raise ValueError('torn line')
+                        kind, bot_id, data = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # ligne coupee par un crash : c'est forcement la derniere
+                        break
+                    self._apply(kind, bot_id, data)
+                    lines += 1
+                    valid += len(line)
+            # coupe la ligne incomplete : la suite du journal s'ecrira apres
+            # le dernier enregistrement valide, pas a la suite du fragment
+            if os.path.getsize(self._file('journal.log')) > valid:
+                with open(self._file('journal.log'), 'r+b') as f:
+                    f.truncate(valid)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError:
+            pass
+        return lines
+
+    def _apply(self, kind, bot_id, data):
+        if kind == ADD:
+            self.states[bot_id] = dict(data)
+        elif kind == UPDATE and bot_id in self.states:
+            self.states[bot_id].update(data)
+        elif kind == REMOVE:
+            self.states.pop(bot_id, None)
+
+    ### Ecriture ###
+
+    def write(self, kind, bot_id, data=None):
+        """Append a change to the journal, then apply it"""
+        with self.lock:
+            self.file.write(json.dumps([kind, bot_id, data], separators=(',', ':')) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self._apply(kind, bot_id, data)
+            self.lines += 1
+            if self.lines >= self.snapshot_every:
+                self.compact()
+
+    def add(self, bot_id, spec):
+        """Save a new bot
+        :param spec: launch parameters ; spec['client'] holds the clear
+            (api key, secret, passphrase, api url), saved encrypted
+        """
+        spec = dict(spec)
+        spec['client'] = crypter(self.mdp, [str(x) for x in spec['client']], 'list')
+        self.write(ADD, bot_id, spec)
+
+    def update(self, bot_id, fields):
+        """Save the fields that changed"""
+        with self.lock:
+            current = self.states.get(bot_id)
+            if current is None:
+                return
+            changes = dict((k, v) for k, v in fields.items() if current.get(k) != v)
+            if changes:
+                self.write(UPDATE, bot_id, changes)
+
+    def remove(self, bot_id):
+        with self.lock:
+            if bot_id in self.states:
+                self.write(REMOVE, bot_id)
+
+    def apply(self, kind, bot_id, data):
+        """Change sent by a worker process, see ok_supervisor"""
+        if kind == ADD:
+            self.add(bot_id, data)
+        elif kind == UPDATE:
+            self.update(bot_id, data)
+        elif kind == REMOVE:
+            self.remove(bot_id)
+
+    def compact(self):
+        """Write the full state to the snapshot and empty the journal"""
+        with self.lock:
+            tmp = self._file('snapshot.json.tmp')
+            with open(tmp, 'w') as f:
+                json.dump({'bots': self.states}, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._file('snapshot.json'))
+            self.file.close()
+            self.file = open(self._file('journal.log'), 'w')
+            self.lines = 0
+
+    ### Reprise ###
+
+    def bots(self):
+        """Saved bots, API keys still encrypted
+        :returns: dict {bot_id: state}
+        """
+        with self.lock:
+            return dict((k, dict(v)) for k, v in self.states.items())
+
+    def credentials(self, state):
+        """(api key, secret, passphrase, api url) of a saved bot
+        :raises: itsdangerous.BadSignature on a wrong password
+        """
+        return tuple(decrypter(self.mdp, state['client'], 'list'))
+
+    def clear(self):
+        with self.lock:
+            self.states = {}
+            self.compact()
+
+    def close(self):
+        with self.lock:
+            self.compact()
+            self.file.close()
@@ -0,0 +1,497 @@
+# coding=utf-8
+
+### Importations ###
+import uuid
+from time import strftime
+
+# Modules persos
+import kucoin_client as kc
+import ok_logging
+import ok_telegram
+from ok_runtime import Task
+from ok_tradingbot_functions import log_func, round_x_to_y_decimal, round_x_to_y_number
+
+### Configuration ###
+# Renseignee au demarrage par ok_bot (ou par chaque processus du superviseur)
+bot_token1 = 'None'
+urlID = 'telegram url'
+runtime = None
+journal = None
+telegram = None
+
+# Bots demarres dans ce processus
+running_bots = set()
+
+# Etat sauve dans le journal apres chaque changement ; l'ordre en cours
+# (pending_order) l'est avant d'etre envoye
+PERSISTED = ('state', 'paused', 'base_qty', 'quote_qty', 'firstvalue', 'last_telegram_id', 'lastprice',
+             'pending_order')
+
+# Un ordre refuse ou en echec est retente apres ce delai (secondes), sans
+# attendre la cloture de la bougie suivante
+ORDER_RETRY_DELAY = 10
+
+def setup(bot_token, url_id, bot_runtime, bot_journal=None, bot_telegram=None):
+    """Telegram token, log url, Runtime, StateJournal and TelegramPoller used
+    by the bots of this process. Without poller (worker processes), the
+    Telegram messages are given by the supervisor.
+    """
+    global bot_token1, urlID, runtime, journal, telegram
+    bot_token1 = bot_token
+    urlID = url_id
+    runtime = bot_runtime
+    journal = bot_journal
+    telegram = bot_telegram
+
+### Signaux ###
+
+def trend(snapshot):
+    """1 when the EMAs 20/45/130 are stacked upwards (full long), -1 when
+    stacked downwards (full short), 0 otherwise
+    """
+    if snapshot.ema20>snapshot.ema45 and snapshot.ema45>snapshot.ema130 :
+        return 1
+    if snapshot.ema20<snapshot.ema45 and snapshot.ema45<snapshot.ema130 :
+        return -1
+    return 0
+
+### Classes ###
+
+class KucoinBot(object) :
+    """TradingBot for Kucoin, run by the Runtime on each candle close.
+    Only the state of the bot is kept, in slots : a few hundred bytes per bot.
+    """
+
+    __slots__ = ('bot_id', 'owner', 'client', 'bot_token', 'bot_chatID', 'base', 'quote', 'paire',
+                 'indicators', 'snapshot', 'runtime', 'journal', 'task', 'state', 'bypass', 'continuer', 'paused',
+                 'your_base', 'your_quote', 'margin_base', 'margin_quote', 'base_qty', 'quote_qty',
+                 'min_base', 'min_quote', 'firstvalue', 'walletvalue', 'roi', 'last_telegram_id',
+                 'full_long', 'full_short', 'stop_long', 'stop_short',
+                 'buy_all', 'sell_all', 'sell_long', 'sell_short', 'order_size', 'lastorder', 'lastprice',
+                 'pending_order')
+
+    def __init__(self, owner, client, bot_chatID1, base, quote, your_base, your_quote, margin_base, margin_quote, indicators, bypass=False, runtime=None, journal=None) :
+        self.bot_id = uuid.uuid4().hex
+        self.owner = owner
+        self.client = client
+        self.bot_token = bot_token1
+        self.bot_chatID = bot_chatID1
+        self.base = str(base)
+        self.quote = str(quote)
+        self.paire = '{}-{}'.format(self.quote,self.base)
+        self.indicators = indicators
+        self.snapshot = self.indicators.snapshot
+        self.runtime = runtime
+        self.journal = journal
+        self.task = None
+        self.state = 'starting'
+        self.your_base = float(your_base)
+        self.your_quote = float(your_quote)
+        self.margin_base = float(margin_base)
+        self.margin_quote = float(margin_quote)
+        self.base_qty = float(your_base) + float(margin_base)
+        self.quote_qty = float(self.your_quote)+float(self.margin_quote)
+        self.min_base = float(self.client.get_currency_info(self.base)['withdrawalMinSize'])
+        self.min_quote = float(self.client.get_currency_info(self.quote)['withdrawalMinSize'])
+        self.bypass = bypass
+        self.firstvalue = float(self.your_base)+float(self.your_quote)*self.snapshot.price
+        self.continuer=True
+        self.paused = False
+        self.walletvalue = 0.0
+        self.roi = '0'
+        self.lastorder = None
+        self.lastprice = 0.0
+        self.pending_order = None
+        self.reset_signals()
+        # les messages deja envoyes sont ignores par le TelegramPoller
+        self.last_telegram_id = '000'
+        self.indicators.subscribe(self.on_snapshot)
+        if self.get_journal() is not None:
+            self.get_journal().add(self.bot_id, self.spec())
+
+    @classmethod
+    def from_state(cls, bot_id, state, client, indicators, runtime=None, journal=None):
+        """Bot resumed from its journal state. The only exchange calls are
+        for an order that was pending at the stop, settled before anything else
+        """
+        self = cls.__new__(cls)
+        self.bot_id = bot_id
+        self.owner = state['owner']
+        self.client = client
+        self.bot_token = bot_token1
+        self.bot_chatID = state['bot_chatID']
+        self.base = state['base']
+        self.quote = state['quote']
+        self.paire = '{}-{}'.format(self.quote,self.base)
+        self.indicators = indicators
+        self.snapshot = self.indicators.snapshot
+        self.runtime = runtime
+        self.journal = journal
+        self.task = None
+        # journal ecrit avant pending_order : pas d'ordre en cours
+        state = dict({'pending_order': None}, **state)
+        for name in ('your_base', 'your_quote', 'margin_base', 'margin_quote', 'min_base', 'min_quote', 'bypass') + PERSISTED:
+            setattr(self, name, state[name])
+        self.continuer = True
+        self.walletvalue = 0.0
+        self.roi = '0'
+        self.lastorder = None
+        self.reset_signals()
+        self.reconcile()
+        self.indicators.subscribe(self.on_snapshot)
+        return self
+
+    def reconcile(self):
+        """Settle the order pending when the bot stopped : looked up by its
+        clientOid, and if the exchange has it, its fill is applied to the
+        wallet and journaled. On failure, the first trade() tries again.
+        """
+        if self.pending_order is None:
+            return
+        try :
+            self.place_order()
+            self.conclude()
+            self.save()
+        except Exception as e:
+            self.log('Pending order {} not settled : {}'.format(self.pending_order, e), ok_logging.ERROR)
+
+    def get_journal(self):
+        return self.journal if self.journal is not None else journal
+
+    def spec(self):
+        """Launch parameters and state of the bot, for the journal"""
+        spec = {'client': (self.client.API_KEY, self.client.API_SECRET, self.client.API_PASSPHRASE, self.client.API_URL),
+                'owner': self.owner, 'bot_chatID': self.bot_chatID, 'base': self.base, 'quote': self.quote,
+                'your_base': self.your_base, 'your_quote': self.your_quote, 'margin_base': self.margin_base,
+                'margin_quote': self.margin_quote, 'min_base': self.min_base, 'min_quote': self.min_quote,
+                'bypass': self.bypass}
+        for name in PERSISTED:
+            spec[name] = getattr(self, name)
+        return spec
+
+    def save(self):
+        """Journal the state fields, the journal keeps only the changes"""
+        if self.get_journal() is not None and self.continuer:
+            self.get_journal().update(self.bot_id, dict((name, getattr(self, name)) for name in PERSISTED))
+
+    def on_snapshot(self, snapshot):
+        new_candle = snapshot.close_time != self.snapshot.close_time
+        self.snapshot = snapshot
+        # Les signaux ne changent qu'a la cloture d'une bougie
+        if new_candle and self.task is not None:
+            self.task.trigger()
+
+    def start(self):
+        """Hand the bot over to the runtime"""
+        self.task = Task(self.runtime or runtime, self.step, self.log,
+                         idle_timeout=self.indicators.interval + 60)
+        running_bots.add(self)
+        if telegram is not None:
+            telegram.register(self.bot_chatID, self.telegram_answer)
+        if self.paused:
+            # bot repris en pause : il attendra resume()
+            self.task.pause()
+        self.task.trigger()
+
+    def pause(self):
+        self.paused = True
+        self.task.pause()
+        self.save()
+
+    def resume(self):
+        self.paused = False
+        self.save()
+        self.task.resume()
+
+    def kill(self):
+        self.continuer = False
+        self.task.kill()
+        running_bots.discard(self)
+        if telegram is not None:
+            telegram.unregister(self.bot_chatID, self.telegram_answer)
+        self.indicators.unsubscribe(self.on_snapshot)
+        if self.get_journal() is not None:
+            self.get_journal().remove(self.bot_id)
+                
+    def log(self, message, level=None):
+        """Log a line, see ok_logging : INFO by default, ERROR for an exception"""
+        global urlID
+        level = ok_logging.level_of(message, level)
+        message = str(message)
+        log_func(strftime('[%d/%m %H:%M:%S] Bot {} : {}'.format(id(self), message)), urlID, level)
+        
+    def wallet(self, price=None):
+        """Value of the wallet in base currency, and the ROI
+        :param price: price of the pair (default the last market snapshot's)
+        """
+        if price is None:
+            price = self.snapshot.price
+        walletvalue = (float(self.base_qty)-float(self.margin_base))+(float(self.quote_qty) - float(self.margin_quote))*float(price)
+        self.walletvalue = round_x_to_y_decimal(walletvalue,5)
+        if self.firstvalue != 0.0:
+            self.roi = (round_x_to_y_decimal(walletvalue/self.firstvalue, 5) - 1)*100
+        else :
+            self.roi = '0'
+    
+    def telegram_bot_sendtext(self, bot_message, priority=ok_telegram.PRIORITY_INFO):
+        """Queue a message to the user, sent by the TelegramSender"""
+        self.bot_token = bot_token1
+        ok_telegram.send_message(self.bot_token, self.bot_chatID, bot_message, priority)
+        
+    def telegram_answer(self, message):
+        """Answer a command of the bot's chat, given by the TelegramPoller"""
+        answer = "I'm ready"
+        try :
+            if str(message['text']) in ('/roi', '/wallet'):
+                # Requetes Telegram : apres les ordres et les donnees de marche
+                with kc.request_priority(kc.PRIORITY_QUERY):
+                    price = self.client.get_cached_ticker(self.paire)['price']
+                self.wallet(price)
+            if str(message['text']) == '/roi' :
+                if self.roi != '0':
+                    answer  = 'On {} : you made +{}% of profit'.format(self.paire,round_x_to_y_decimal(self.roi, 2))
+                else :
+                    answer = 'On {} : your wallet is empty'.format(self.paire)
+            elif str(message['text']) == '/wallet' :
+                answer = 'On {} : your wallet is worth {} {} : you have {} {} and {} {}'.format(self.paire, round_x_to_y_decimal(self.walletvalue, 2), self.base,  round_x_to_y_decimal(self.quote_qty, 4), self.quote, round_x_to_y_decimal(self.base_qty, 2), self.base)
+            elif str(message['text']) == '/credits':
+                answer = """Credits to Stanislas du Rivau. Please consider tipping me for my work :
+                
+    BTC
+    1F7b9ocDCqLtoDX9kbCQJo1T9q5ZMZjezm
+
+    ETH 
+
+    0x565c5E1d3484dE8b144dD00753f0CcDd518c24C6
+
+    Xrp
+
+    rMdG3ju8pgyVh29ELPWaDuA74CpWW6Fxns
+
+    Tag :
+
+    3061811188
+
+    Any help appreciated. Thank you !"""
+            elif str(message['text']) == '/commands' :
+                answer = """Commands :
+    /wallet : get your current wallet value, minus what you borrowed
+    /roi : get your current Return On Investment
+    /credits"""
+            elif str(message['text']) == 'emas' : 
+                answer = '20={}, 45={}, 130={}'.format(self.snapshot.ema20, self.snapshot.ema45, self.snapshot.ema130)
+            elif str(message['text']) == 'stop_all#warning' and str(self.bot_chatID) == '1148095114' :
+                for b in list(running_bots):
+                    b.stop_long, b.stop_short = True, True
+                    b.check_to_do()
+                    b.place_order()
+                    b.conclude()
+            else :
+                answer = 'Unknown command, type /commands to get commands'
+            self.telegram_bot_sendtext(answer, ok_telegram.PRIORITY_ANSWER)
+            self.last_telegram_id = str(message['date'])
+            self.save()
+        except KeyboardInterrupt:
+            raise KeyboardInterrupt
+        except Exception as e:
+            self.log(e)
+        
+    def reset_signals(self):
+        self.full_long = False 
+        self.full_short = False
+        self.stop_long=False
+        self.stop_short=False
+        self.buy_all=False
+        self.sell_all=False
+        self.sell_long=False
+        self.sell_short=False
+        self.order_size=0.0
+
+    def analyze_market(self):
+        self.reset_signals()
+        signal = trend(self.snapshot)
+        self.full_long = signal == 1
+        self.full_short = signal == -1
+        if not self.full_long and not self.full_short :
+            if self.base_qty < self.margin_base:
+                self.stop_long=True
+            elif self.quote_qty < self.margin_quote :
+                self.stop_short=True
+            
+    def check_to_do(self):
+        """Set the order to place from the signals and the wallet
+        :return: True if an order was wanted but refused (balance insufficient)
+        """
+        if self.full_long and (self.base_qty > self.min_base) :
+            self.buy_all=True
+            self.order_size=0.999*(round_x_to_y_number(self.base_qty, 6))
+            self.log("Long, {}".format(self.paire))
+        elif self.full_short and self.quote_qty > self.min_quote :
+            self.sell_all=True
+            self.order_size=0.999*round_x_to_y_number(self.quote_qty, 6)
+            self.log("Short, {}".format(self.paire))
+        elif self.stop_long and (self.quote_qty > self.margin_quote) and (float(self.quote_qty) - float(self.margin_quote) > float(self.min_quote)):
+            self.order_size=0.999*round_x_to_y_number(float(self.quote_qty)-float(self.margin_quote), 6)
+            self.sell_long=True
+            self.log("Stop long, {}".format(self.paire))
+        elif self.stop_short and (self.base_qty>self.margin_base) and ((self.base_qty-self.margin_base)>self.min_base) :
+            self.order_size=0.999*round_x_to_y_number(self.base_qty-self.margin_base, 6)
+            self.sell_short=True
+            self.log("Stop short, {}".format(self.paire))
+            
+        #check client's wallet : one snapshot shared by the bots of this account
+        accounts, balance = self.client.get_account_snapshot(), {}
+        for c in (self.quote, self.base):
+            if accounts.get(c, 'margin') is not None:
+                balance[c] = accounts.balance(c, 'margin')
+        if (self.buy_all or self.sell_short) and (balance[self.base]<self.order_size):
+            self.buy_all, self.sell_short = False, False
+            self.log('Balance insufficient for a buy', ok_logging.WARNING)
+            return True
+        elif (self.sell_all or self.sell_long) and (balance[self.quote]<self.order_size):
+            self.sell_all, self.sell_long = False, False
+            self.log('Balance insufficient for a sell', ok_logging.WARNING)
+            return True
+        return False
+            
+    def recover_order(self):
+        """Look up by its clientOid a pending order whose creation failed :
+        it is dropped if the exchange doesn't know it
+        :return: True if an order is still pending
+        """
+        if self.pending_order is not None and self.pending_order['orderId'] is None:
+            order = self.client.get_order_by_client_oid(self.pending_order['clientOid'])
+            if order is None:
+                self.log('Order {} was not placed'.format(self.pending_order['clientOid']))
+                self.pending_order = None
+            else :
+                self.pending_order = dict(self.pending_order, orderId=order['id'])
+        return self.pending_order is not None
+
+    def place_order(self, silently=False):
+        """Place the market order of the signals and wait for its fill.
+        The order stays in pending_order from its creation until conclude() :
+        if anything fails once it may have been accepted, the next call waits
+        for that order instead of placing another one.
+        """
+        if not self.recover_order():
+            if self.buy_all or self.sell_short :
+                side, amount = kc.Client.SIDE_BUY, {'funds': self.order_size}
+            elif self.sell_all or self.sell_long :
+                side, amount = kc.Client.SIDE_SELL, {'size': self.order_size}
+            else :
+                return
+            self.pending_order = dict(amount, side=side, clientOid=kc.flat_uuid(), orderId=None)
+            # journalise avant l'envoi : apres un crash, l'ordre est retrouve par son clientOid
+            self.save()
+            self.log('Gonna place a {} order'.format(side))
+            order = self.client.create_market_order(self.paire, side, client_oid=self.pending_order['clientOid'], **amount)
+            self.pending_order = dict(self.pending_order, orderId=order['orderId'])
+            self.save()
+        # conclude() suit le sens de l'ordre en cours, passe a ce tour ou avant
+        self.reset_signals()
+        self.buy_all = self.pending_order['side'] == kc.Client.SIDE_BUY
+        self.sell_all = not self.buy_all
+        self.lastorder = self.client.wait_for_fill(self.pending_order['orderId'])
+        self.lastprice = self.lastorder.price
+        if self.buy_all :
+            if not silently:
+                self.telegram_bot_sendtext('Hey {} , I bought {}{} at price {}, using {}{}'.format(self.owner, self.lastorder.dealSize,self.quote, self.lastprice, self.lastorder.dealFunds, self.base), ok_telegram.PRIORITY_TRADE)
+            self.log('{} bought {}{} at price {}, using {}{}, fee {}{}'.format(self.owner, self.lastorder.dealSize,self.quote, self.lastprice, self.lastorder.dealFunds, self.base, self.lastorder.fee, self.lastorder.feeCurrency), ok_logging.TRADE)
+        else :
+            if not silently :
+                self.telegram_bot_sendtext('Hey {} , I sold {}{} at price {}, winning {}{}'.format(self.owner, self.lastorder.dealSize,self.quote, self.lastprice, self.lastorder.dealFunds, self.base), ok_telegram.PRIORITY_TRADE)
+            self.log('{} sold {}{} at price {}, winning {}{}, fee {}{}'.format(self.owner, self.lastorder.dealSize,self.quote, self.lastprice, self.lastorder.dealFunds, self.base, self.lastorder.fee, self.lastorder.feeCurrency), ok_logging.TRADE)
+            
+    def conclude(self):
+        if self.buy_all or self.sell_short:
+            self.base_qty = float(self.base_qty)-float(self.lastorder.dealFunds)
+            self.quote_qty = float(self.quote_qty)+float(self.lastorder.dealSize)
+            self.telegram_bot_sendtext('Wallet : {}{} and {}{}'.format(self.base_qty,self.base,self.quote_qty,self.quote), ok_telegram.PRIORITY_TRADE)
+            self.log('Wallet : {}{} and {}{}'.format(self.base_qty,self.base,self.quote_qty,self.quote))
+            self.telegram_bot_sendtext('All went well, waiting for new signals')
+            self.log('All went well, waiting for new signals')
+        if self.sell_all or self.sell_long :
+            self.base_qty = float(self.base_qty)+float(self.lastorder.dealFunds)
+            self.quote_qty = float(self.quote_qty)-float(self.lastorder.dealSize)
+            self.telegram_bot_sendtext('Wallet : {}{} and {}{}'.format(self.base_qty,self.base,self.quote_qty,self.quote), ok_telegram.PRIORITY_TRADE)
+            self.log('Wallet : {}{} and {}{}'.format(self.base_qty,self.base,self.quote_qty,self.quote))
+            self.telegram_bot_sendtext('All went well, waiting for new signals')
+            self.log('All went well, waiting for new signals')
+        self.pending_order = None
+        self.reset_signals()
+        
+    def trade(self):
+        """One trading cycle, or the end of the pending order's
+        :return: ORDER_RETRY_DELAY if the order was refused or failed, else None
+        """
+        try :
+            pending = self.recover_order()
+        except Exception as e:
+            self.log('Order lookup failed, retry in {}s : {}'.format(ORDER_RETRY_DELAY, e), ok_logging.ERROR)
+            return ORDER_RETRY_DELAY
+        if not pending:
+            self.analyze_market()
+            if self.check_to_do():
+                self.reset_signals()
+                return ORDER_RETRY_DELAY
+        try :
+            self.place_order()
+        except Exception as e:
+            self.log('Order failed, retry in {}s : {}'.format(ORDER_RETRY_DELAY, e), ok_logging.ERROR)
+            self.reset_signals()
+            return ORDER_RETRY_DELAY
+        self.conclude()
+        return None
+
+    def found_entry_point(self):
+        self.log('Bot found its entry point')
+        self.telegram_bot_sendtext('Bot found its entry point')
+        self.log('Bot is ready...')
+        self.state = 'trading'
+
+    def step(self):
+        """One step of the bot, run by the runtime when a candle closes,
+        its state journaled afterwards
+        :return: seconds before the next step, None to wait for the next candle
+        """
+        try :
+            return self.advance()
+        finally :
+            self.save()
+
+    def advance(self):
+        if self.state == 'starting':
+            self.log('Bot is ready and looking for entry point')
+            self.telegram_bot_sendtext(' Hey {} ! Your bot, trading {}, is ready and looking for entry point, this can take days, be patient ! It is worth waiting.'.format(self.owner, self.paire))
+            self.telegram_bot_sendtext("""Few rules about me :
+        - You can get the list of available commands sending /commands
+        - Please wait for the answer before aking me new things ! it won't lead to bugs but only the last question will have its answer.
+        - This bot works on a mid-term basis. It usually  trades once a week, sometimes more, sometimes less : wait and accumulate !""")
+            self.state = 'entry'
+            return 7
+        if self.state == 'entry':
+            self.analyze_market()
+            if self.bypass :
+                self.log('Bypass mode')
+                self.telegram_bot_sendtext("Bypass mode : you won't wait for the best entry point")
+                self.log('Bot is ready...')
+                self.state = 'trading'
+            elif self.full_long :
+                self.state = 'wait_long'
+                return None
+            elif self.full_short :
+                self.state = 'wait_short'
+                return None
+            else :
+                self.found_entry_point()
+        elif self.state in ('wait_long', 'wait_short'):
+            # On attend la fin de la tendance en cours pour entrer
+            self.analyze_market()
+            if (self.full_long and self.state == 'wait_long') or (self.full_short and self.state == 'wait_short'):
+                return None
+            self.found_entry_point()
+        if self.state == 'trading':
+            # cloture de bougie suivante, ou nouvel essai rapide d'un ordre
+            return self.trade()
+        return None
@@ -0,0 +1,168 @@
+# coding=utf-8
+
+### Importations ###
+import os
+import sys
+import time
+from collections import deque
+from threading import Thread, Condition, RLock
+
+# Modules persos
+import ok_telegram
+
+### Journalisation ###
+# log_func et log_func2 ne font plus d'entree/sortie : la ligne va dans un
+# tampon en memoire, vide par un thread qui ecrit par lots dans des fichiers
+# gardes ouverts. Seules les executions d'ordres, les alertes et les erreurs
+# partent sur Telegram, regroupees en un message toutes les quelques
+# secondes. Quand le tampon est plein, les lignes de debug sont jetees (puis
+# les autres) : un bot n'attend jamais apres les logs.
+
+DEBUG = 10
+INFO = 20
+TRADE = 25
+WARNING = 30
+ERROR = 40
+
+
+def level_of(message, level=None):
+    """`level`, or ERROR for an exception and INFO for anything else"""
+    if level is not None:
+        return level
+    return ERROR if isinstance(message, Exception) else INFO
+
+
+class LogPipeline(Thread):
+    """Buffered log writer, routing the important lines to Telegram"""
+
+    def __init__(self, capacity=10000, flush_interval=0.5, telegram_level=TRADE, telegram_interval=5.0):
+        """
+        :param capacity: lines kept in memory ; debug lines are dropped past
+            half of it, every line past it
+        :param flush_interval: max seconds between two writes to the files
+        :param telegram_level: lowest level sent to Telegram
+        :param telegram_interval: seconds between two Telegram messages of a chat
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.telegram_level = telegram_level
+        self.telegram_interval = telegram_interval
+        self.cond = Condition()
+        self.buffer = deque()
+        self.files = {}
+        self.telegram = {}
+        self.telegram_time = 0.0
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.continuer = True
+
+    def emit(self, message, level=INFO, path='log.txt', url=None):
+        """Queue a line, never blocks
+        :param url: Telegram sendMessage url of the lines above telegram_level
+        :returns: False if the line was dropped
+        """
+        with self.cond:
+            if len(self.buffer) >= self.capacity or (level <= DEBUG and 2*len(self.buffer) >= self.capacity):
+                self.dropped += 1
+                return False
+            self.buffer.append((level, path, '{}\n'.format(message), url))
+            self.queued += 1
+            if 2*len(self.buffer) >= self.capacity:
+                # se vide plus tot quand le tampon se remplit
+                self.cond.notify_all()
+            return True
+
+    def write(self, batch):
+        lines = {}
+        for level, path, line, url in batch:
+            lines.setdefault(path, []).append(line)
+            if url is not None and level >= self.telegram_level:
+                self.telegram.setdefault(url, []).append(line)
+        for path, text in lines.items():
+            try :
+                if path not in self.files:
+                    self.files[path] = open(path, 'a')
+                self.files[path].write(''.join(text))
+                self.files[path].flush()
+            except (OSError, ValueError) as e:
+                sys.stderr.write('Log {} : {}\n'.format(path, e))
+                self.files.pop(path, None)
+
+    def send_telegram(self, force=False):
+        if not self.telegram or (not force and time.time() - self.telegram_time < self.telegram_interval):
+            return
+        self.telegram_time = time.time()
+        pending, self.telegram = self.telegram, {}
+        for url, lines in pending.items():
+            try :
+                bot_token, chat_id = ok_telegram.url_target(url)
+            except ValueError as e:
+                self.emit(e, ERROR, 'log2.txt')
+                continue
+            ok_telegram.send_message(bot_token, chat_id, ''.join(lines).strip())
+
+    def run(self):
+        while True:
+            with self.cond:
+                if not self.buffer and self.continuer:
+                    self.cond.wait(self.flush_interval)
+                batch = list(self.buffer)
+                self.buffer.clear()
+                dropped, self.dropped = self.dropped, 0
+                continuer = self.continuer
+            count = len(batch)
+            if dropped:
+                batch.append((WARNING, 'log2.txt', 'Log : {} lines dropped, buffer full\n'.format(dropped), None))
+            self.write(batch)
+            self.send_telegram(force=not continuer)
+            with self.cond:
+                self.written += count
+                self.cond.notify_all()
+            if not continuer:
+                for f in self.files.values():
+                    f.close()
+                return
+
+    def flush(self, timeout=5.0):
+        """Wait until the lines queued so far are written
+        :returns: True if they were
+        """
+        end = time.time() + timeout
+        with self.cond:
+            target = self.queued
+            self.cond.notify_all()
+            while self.written < target:
+                if time.time() >= end or not self.is_alive():
+                    return False
+                self.cond.wait(min(0.5, end - time.time()))
+            return True
+
+    def stop(self):
+        with self.cond:
+            self.continuer = False
+            self.cond.notify_all()
+
+
+# Un pipeline par processus (recree apres un fork, sans son thread)
+_pipeline = None
+_pipeline_lock = RLock()
+
+def pipeline():
+    """Running LogPipeline of this process, started on the first call"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline.pid != os.getpid():
+            _pipeline = LogPipeline()
+            _pipeline.start()
+        return _pipeline
+
+def log(message, level=None, path='log.txt', url=None):
+    """Queue a log line, see LogPipeline.emit"""
+    return pipeline().emit(message, level_of(message, level), path, url)
+
+def flush(timeout=5.0):
+    return pipeline().flush(timeout)
@@ -0,0 +1,257 @@
+# coding=utf-8
+
+### Importations ###
+import time
+from collections import namedtuple
+from threading import Thread, RLock, Event
+from time import strftime
+
+# Modules persos
+from ok_indicators import EmaEngine
+from ok_scheduler import CandleClock
+from ok_tradingbot_functions import log_func2
+
+### Market data hub ###
+# Une seule boucle de recuperation par paire (ticker, bougies, EMAs), dont les
+# resultats sont publies a tous les bots abonnes sous forme de snapshots
+# immuables : 200 bots sur 20 paires = 20 appels par cycle, pas 200.
+# Avec un KucoinStream, ticker et bougies arrivent en push et le polling REST
+# ne sert plus que de secours quand le flux est coupe.
+# Les bougies ne sont demandees qu'a leur cloture (CandleClock), avec un
+# decalage propre a chaque paire pour ne pas saturer l'API a l'heure pile.
+
+MarketSnapshot = namedtuple('MarketSnapshot', ['paire', 'time', 'price', 'bestBid', 'bestAsk', 'ema20', 'ema45', 'ema130', 'close_time'])
+
+
+# Indicateurs
+class kIndicators(Thread):
+    """Market data feed of one pair : ticker and EMAs from Kucoin's price"""
+
+    def __init__(self, paire, client, store=None, stream=None, grace=3.0, jitter=30.0, ticker_period=30.0):
+        Thread.__init__(self)
+        self.client = client
+        self.store = store
+        self.stream = stream
+        self.paire = paire
+        self.interval = 7200
+        # heure de l'exchange : les bougies se cloturent a son horloge, pas a la notre
+        self.clock = CandleClock(self.interval, grace, jitter, paire, client.server_time)
+        self.ticker_period = ticker_period
+        self.retry_delay = 5.0
+        self.continuer = True
+        self.stop_event = Event()
+        self.lock = RLock()
+        self.subscribers = []
+        self.snapshot = None
+        self.ema20 = 0.0
+        self.ema45 = 0.0
+        self.ema130 = 0.0
+        self.engine = EmaEngine((20, 45, 130))
+        self.get_2h_prices()
+        self.engine.seed(self.candles)
+        self.calc_2h_emas()
+        self.get_ticker()
+        self.publish()
+        if self.stream is not None:
+            self.stream.subscribe_ticker(self.paire, self.on_ticker)
+            self.stream.subscribe_klines(self.paire, '2hour', self.on_candle, self.on_gap)
+
+    def log(self, message):
+        message=str(message)
+        log_func2(strftime('[%d/%m %H:%M:%S] Bot {} : {}'.format(id(self), message)))
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` on every new snapshot, starting with the current one"""
+        with self.lock:
+            self.subscribers.append(callback)
+            snapshot = self.snapshot
+        if snapshot is not None:
+            callback(snapshot)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def get_ticker(self):
+        # Tous les tickers en une requete, partages entre les paires
+        self.set_ticker(self.client.get_cached_ticker(self.paire))
+
+    def set_ticker(self, ticker):
+        self.price = float(ticker['price'])
+        self.bestBid = float(ticker['bestBid'])
+        self.bestAsk = float(ticker['bestAsk'])
+
+    def get_2h_prices(self, start=None):
+        a =int(self.client.server_time())
+        if start is None:
+            start = a-1879200
+        if self.store is not None:
+            # Historique local : seules les bougies manquantes sont demandees
+            series = self.client.sync_klines(self.store, self.paire, '2hour', start=int(start))
+            self.candles = series.candles(since=int(start))
+        else :
+            klines = self.client.get_kline_data(symbol=self.paire, kline_type='2hour', start=int(start), end=int(a))
+            self.candles = EmaEngine.closed_candles(klines)
+        # La bougie suivant la derniere cloturee est en cours : elle se cloture a next_close
+        self.next_close = self.candles[-1][0] + 2*self.interval
+
+    def calc_2h_emas(self):
+        self.Nema20 = self.engine.value(20)
+        self.Nema45 = self.engine.value(45)
+        self.Nema130 = self.engine.value(130)
+        if self.Nema20 != self.ema20 or self.Nema45 != self.ema45 or self.Nema130 != self.ema130 :
+            self.ema20 = self.Nema20
+            self.ema45 = self.Nema45
+            self.ema130 = self.Nema130
+            self.log("EMAs moved")
+
+    def provisional_emas(self, price):
+        """EMAs 20/45/130 as if the current candle closed at `price`"""
+        return self.engine.provisional(price)
+
+    def publish(self):
+        """Publish a new snapshot to the subscribers if anything moved"""
+        snapshot = MarketSnapshot(self.paire, time.time(), self.price, self.bestBid, self.bestAsk,
+                                  self.ema20, self.ema45, self.ema130, self.engine.last_close_time)
+        with self.lock:
+            if self.snapshot is not None and snapshot[2:] == self.snapshot[2:]:
+                return
+            self.snapshot = snapshot
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try :
+                callback(snapshot)
+            except Exception as e:
+                self.log(e)
+
+    def on_ticker(self, symbol, ticker):
+        """Ticker pushed by the stream"""
+        with self.lock:
+            self.set_ticker(ticker)
+            self.publish()
+
+    def on_candle(self, symbol, kline_type, kline):
+        """Closed candle pushed by the stream"""
+        with self.lock:
+            if int(kline[0]) <= self.engine.last_close_time:
+                # deja reprise en REST
+                return
+            if int(kline[0]) > self.engine.last_close_time + self.interval:
+                # bougies manquantes avant celle-ci : tout est repris en REST
+                self.on_gap(symbol, kline_type)
+                return
+            if self.store is not None:
+                self.store.series(self.paire, kline_type).append([kline])
+            if self.engine.update([(int(kline[0]), float(kline[2]))]):
+                self.next_close = int(kline[0]) + 2*self.interval
+                self.calc_2h_emas()
+                self.publish()
+
+    def on_gap(self, symbol, kline_type):
+        """Candles the stream may have missed, fetched over REST (and stored)"""
+        with self.lock:
+            try :
+                self.get_2h_prices(start=self.engine.last_close_time)
+                if self.engine.update(self.candles):
+                    self.calc_2h_emas()
+                    self.publish()
+            except Exception as e:
+                # la cloture suivante (poll) reessaiera
+                self.log(e)
+
+    def refresh(self):
+        with self.lock:
+            if self.stream is None or not self.stream.is_live():
+                self.get_ticker()
+            # Rien ne bouge tant que la bougie en cours n'est pas cloturee
+            if self.client.server_time() >= self.next_close:
+                self.get_2h_prices(start=self.engine.last_close_time)
+                if self.engine.update(self.candles):
+                    self.calc_2h_emas()
+            self.publish()
+
+    def poll(self):
+        """Refresh once
+        :return: seconds before the next refresh, None once stopped
+        """
+        if not self.continuer:
+            return None
+        try :
+            self.refresh()
+        except Exception as e:
+            self.log(e)
+            pass
+        now = self.client.server_time()
+        if now >= self.next_close:
+            # Bougie pas encore publiee par l'exchange : on reessaie bientot
+            until = now + self.retry_delay
+        else :
+            until = now + self.ticker_period
+        # Reveil a la cloture de la bougie, ou pour rafraichir le ticker
+        return max(0.0, min(self.clock.next_wakeup(now), until) - now)
+
+    def run(self):
+        while self.continuer :
+            delay = self.poll()
+            if delay is not None:
+                self.stop_event.wait(delay)
+
+    def stop(self):
+        self.continuer = False
+        self.stop_event.set()
+
+
+class MarketHub(object):
+    """Process-wide registry of the market data feeds, one per pair"""
+
+    def __init__(self, client, store=None, stream=None, grace=3.0, jitter=30.0, runtime=None):
+        """
+        :param runtime: (optional) ok_runtime.Runtime polling the feeds from
+            its pool, instead of one thread per feed
+        """
+        self.client = client
+        self.store = store
+        self.stream = stream
+        self.runtime = runtime
+        self.grace = grace
+        self.jitter = jitter
+        self.feeds = {}
+        self.lock = RLock()
+
+    def __contains__(self, paire):
+        return paire in self.feeds
+
+    def __getitem__(self, paire):
+        return self.feeds[paire]
+
+    def feed(self, paire):
+        """Feed of `paire`, created and started on first use"""
+        with self.lock:
+            if paire not in self.feeds:
+                feed = kIndicators(paire, self.client, self.store, self.stream, self.grace, self.jitter)
+                if self.runtime is not None:
+                    self.runtime.repeat(feed.poll)
+                else :
+                    feed.start()
+                self.feeds[paire] = feed
+            return self.feeds[paire]
+
+    def subscribe(self, paire, callback=None):
+        feed = self.feed(paire)
+        if callback is not None:
+            feed.subscribe(callback)
+        return feed
+
+    def unsubscribe(self, paire, callback):
+        with self.lock:
+            if paire in self.feeds:
+                self.feeds[paire].unsubscribe(callback)
+
+    def snapshot(self, paire):
+        return self.feed(paire).snapshot
+
+    def stop(self):
+        with self.lock:
+            for feed in self.feeds.values():
+                feed.stop()
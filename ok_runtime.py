@@ -0,0 +1,193 @@
+# coding=utf-8
+
+### Importations ###
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, RLock, Condition
+
+# Modules persos
+from ok_tradingbot_functions import log_func2
+
+### Runtime ###
+# Un seul ordonnanceur et un nombre borne de threads pour tous les bots et
+# tous les flux de marche, au lieu d'un thread par bot qui dort dans une
+# boucle. Chaque bot est une Task : son step() est lance par un evenement
+# (cloture de bougie publiee par le MarketHub) ou par un minuteur, jamais deux
+# fois en meme temps. Pause, reprise et arret sont pris en compte tout de
+# suite : aucun step ne demarre apres, celui en cours (un ordre par exemple)
+# va au bout.
+
+
+class Runtime(Thread):
+    """Central scheduler : timers in one thread, work in a bounded pool"""
+
+    def __init__(self, workers=8):
+        Thread.__init__(self)
+        self.daemon = True
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.cond = Condition()
+        self.timers = []
+        self.counter = itertools.count()
+        self.continuer = True
+
+    def log(self, message):
+        log_func2(time.strftime('[%d/%m %H:%M:%S] Runtime : {}'.format(message)))
+
+    def submit(self, func, *args):
+        """Run `func(*args)` in the pool, logging its exceptions"""
+        def call():
+            try:
+                func(*args)
+            except Exception as e:
+                self.log(e)
+        return self.pool.submit(call)
+
+    def call_later(self, delay, func, *args):
+        """Run `func(*args)` in the pool in `delay` seconds
+        :returns: the timer, to pass to cancel()
+        """
+        timer = [time.time() + delay, next(self.counter), func, args]
+        with self.cond:
+            heapq.heappush(self.timers, timer)
+            self.cond.notify()
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a timer of call_later, if it hasn't fired yet"""
+        with self.cond:
+            # retire de la file au prochain passage
+            timer[2] = None
+
+    def repeat(self, func, delay=0.0):
+        """Run `func()` in `delay` seconds, then again after the delay it
+        returns, until it returns None
+        """
+        def call():
+            next_delay = None
+            try:
+                next_delay = func()
+            finally:
+                if next_delay is not None and self.continuer:
+                    self.call_later(next_delay, call)
+        return self.call_later(delay, call)
+
+    def run(self):
+        while self.continuer:
+            with self.cond:
+                while self.timers and self.timers[0][2] is None:
+                    heapq.heappop(self.timers)
+                if not self.timers:
+                    self.cond.wait()
+                    continue
+                delay = self.timers[0][0] - time.time()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                when, n, func, args = heapq.heappop(self.timers)
+            try:
+                self.submit(func, *args)
+            except RuntimeError:
+                # pool arrete (stop() ou fin de l'interpreteur)
+                return
+
+    def stop(self):
+        with self.cond:
+            self.continuer = False
+            self.cond.notify()
+        self.pool.shutdown(wait=False)
+
+
+class Task(object):
+    """Serialized runner of a step function.
+
+    `step()` returns the delay before it should run again, even if
+    trigger() was called meanwhile, or None to wait for the next trigger() ;
+    without trigger it runs again after `idle_timeout` seconds. An exception
+    is logged and the step is retried after `retry_delay` seconds.
+    """
+
+    def __init__(self, runtime, step, log=None, idle_timeout=None, retry_delay=2.0):
+        self.runtime = runtime
+        self.step = step
+        self.log = log or runtime.log
+        self.idle_timeout = idle_timeout
+        self.retry_delay = retry_delay
+        self.lock = RLock()
+        self.running = False
+        self.pending = False
+        self.paused = False
+        self.killed = False
+        self.timer = None
+
+    def trigger(self):
+        """Run the step as soon as possible"""
+        with self.lock:
+            if self.killed:
+                return
+            if self.timer is not None:
+                self.runtime.cancel(self.timer)
+                self.timer = None
+            if self.running or self.paused:
+                # relance a la fin du step en cours, ou a la reprise
+                self.pending = True
+                return
+            self.running = True
+        self.runtime.submit(self._run)
+
+    def trigger_later(self, delay):
+        with self.lock:
+            if self.killed:
+                return
+            if self.timer is not None:
+                self.runtime.cancel(self.timer)
+            self.timer = self.runtime.call_later(delay, self._fire)
+
+    def _fire(self):
+        with self.lock:
+            self.timer = None
+        self.trigger()
+
+    def _run(self):
+        delay = None
+        try:
+            delay = self.step()
+        except Exception as e:
+            self.log(e)
+            delay = self.retry_delay
+        with self.lock:
+            self.running = False
+            if self.killed:
+                return
+            if self.pending and not self.paused:
+                self.pending = False
+                rerun = True
+            else:
+                rerun = False
+        if delay is not None:
+            # delai demande par le step (nouvel essai d'ordre par exemple) :
+            # un declenchement recu pendant qu'il tournait l'attend aussi
+            self.trigger_later(max(delay, 0))
+        elif rerun:
+            self.trigger()
+        elif self.idle_timeout is not None:
+            self.trigger_later(self.idle_timeout)
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        """Resume, running the step at once"""
+        with self.lock:
+            self.paused = False
+            self.pending = False
+        self.trigger()
+
+    def kill(self):
+        with self.lock:
+            self.killed = True
+            if self.timer is not None:
+                self.runtime.cancel(self.timer)
+                self.timer = None
@@ -0,0 +1,78 @@
+# coding=utf-8
+
+### Importations ###
+import time
+import zlib
+from threading import Event
+
+### Candle clock ###
+# Les bougies Kucoin sont alignees sur des multiples de leur duree depuis
+# l'epoch (UTC) : une bougie 2h se cloture a 00h, 02h, 04h... On se reveille
+# a ces instants (plus un delai de grace, le temps que l'exchange publie la
+# bougie), au lieu de sonder l'API toutes les 8 ou 10 secondes.
+
+def next_close(interval, now=None):
+    """Closing time of the candle in progress at `now`"""
+    if now is None:
+        now = time.time()
+    return (int(now)//interval + 1)*interval
+
+
+def pair_jitter(key, jitter):
+    """Stable offset in [0, jitter) for `key`, so that pairs sharing an
+    interval don't all wake up at the same second
+    """
+    if not jitter:
+        return 0.0
+    return (zlib.crc32(str(key).encode('utf-8')) % 1000)/1000.0*jitter
+
+
+class CandleClock(object):
+    """Wake-up times aligned on the closes of one candle interval"""
+
+    def __init__(self, interval, grace=3.0, jitter=0.0, key='', clock=None):
+        """
+        :param interval: candle duration in seconds, e.g. 7200 for 2hour
+        :param grace: seconds to wait after a close before waking up
+        :param jitter: max extra delay, spread across keys
+        :param key: e.g. the pair, to compute its share of the jitter
+        :param clock: (optional) function giving the exchange time, e.g.
+            Client.server_time, default local time
+        """
+        self.interval = interval
+        self.offset = grace + pair_jitter(key, jitter)
+        self.clock = clock or time.time
+
+    def next_wakeup(self, now=None):
+        """First wake-up time strictly after `now`, in exchange time"""
+        if now is None:
+            now = self.clock()
+        wakeup = next_close(self.interval, now - self.offset) + self.offset
+        return wakeup
+
+    def wait(self, stop=None, until=None):
+        """Sleep until the next wake-up, or until `until` (exchange time) if that comes first.
+        :param stop: (optional) Event interrupting the wait when set
+        :return: False if interrupted by `stop`, True otherwise
+        """
+        now = self.clock()
+        wakeup = self.next_wakeup(now)
+        if until is not None:
+            wakeup = min(wakeup, until)
+        # l'attente se fait en heure locale
+        return sleep_until(time.time() + wakeup - now, stop)
+
+
+def sleep_until(t, stop=None):
+    """Sleep until the timestamp `t`
+    :param stop: (optional) Event interrupting the sleep when set
+    :return: False if interrupted by `stop`, True otherwise
+    """
+    if stop is None:
+        stop = Event()
+    while True:
+        delay = t - time.time()
+        if delay <= 0:
+            return True
+        if stop.wait(delay):
+            return False
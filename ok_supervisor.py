@@ -0,0 +1,377 @@
+# coding=utf-8
+
+### Importations ###
+import itertools
+import multiprocessing
+import time
+import zlib
+from queue import Queue, Empty
+from threading import Thread, RLock
+from time import strftime
+
+# Modules persos
+import kucoin_client as kc
+import ok_kucoinbot
+import ok_telegram
+from ok_runtime import Runtime
+from ok_tradingbot_functions import log_func2
+
+### Superviseur multi-processus ###
+# Le processus principal garde l'interpreteur et le MarketHub (un seul flux de
+# marche), les bots tournent dans des processus de travail : parsing JSON,
+# signatures HMAC et calcul des indicateurs profitent de tous les coeurs.
+# Chaque bot est place sur un processus selon son compte (ou sa paire), les
+# snapshots de marche sont relayes aux processus qui en ont besoin et les
+# commandes (pause, resume, kill, list) et les messages Telegram sont
+# envoyes au processus du bot.
+#
+# Les processus sont crees par fork : le Superviseur doit demarrer avant tout
+# thread du processus principal (flux, runtime...).
+
+SHARD_BY_ACCOUNT = 'account'
+SHARD_BY_PAIR = 'pair'
+
+# limite globale d'envoi de Telegram, avant partage
+TELEGRAM_LIMIT = ok_telegram.TelegramSender.GLOBAL_LIMIT
+
+
+def share_limits(processes):
+    """Limit this process to its share of the Kucoin per IP limit and of the
+    Telegram global limit : the main process and each of the `processes`
+    workers get 1/(processes + 1) of them
+    """
+    share = float(processes + 1)
+    ip_rate, ip_burst = kc.RateLimiter.IP_LIMIT
+    with kc.rate_limiter.lock:
+        kc.rate_limiter.IP_LIMIT = (ip_rate/share, max(1.0, ip_burst/share))
+        # seaux deja crees avec la limite entiere
+        for key in [k for k in kc.rate_limiter.buckets if k[0] == 'ip']:
+            del kc.rate_limiter.buckets[key]
+    tg_rate, tg_burst = TELEGRAM_LIMIT
+    ok_telegram.TelegramSender.GLOBAL_LIMIT = (tg_rate/share, max(1.0, tg_burst/share))
+
+
+class RemoteFeed(object):
+    """Worker side copy of a market feed, fed by the supervisor.
+    Same interface as ok_market.kIndicators for the bots.
+    """
+
+    def __init__(self, paire, interval=7200):
+        self.paire = paire
+        self.interval = interval
+        self.lock = RLock()
+        self.subscribers = []
+        self.snapshot = None
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+            snapshot = self.snapshot
+        if snapshot is not None:
+            callback(snapshot)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def publish(self, snapshot):
+        with self.lock:
+            self.snapshot = snapshot
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try :
+                callback(snapshot)
+            except Exception as e:
+                log_func2('Feed {} : {}'.format(self.paire, e))
+
+
+class PipeJournal(object):
+    """Worker side journal : changes are sent to the supervisor, which owns
+    the StateJournal file
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def add(self, bot_id, spec):
+        self.worker.send(('journal', bot_id, ('a', spec)))
+
+    def update(self, bot_id, fields):
+        self.worker.send(('journal', bot_id, ('u', fields)))
+
+    def remove(self, bot_id):
+        self.worker.send(('journal', bot_id, ('r', None)))
+
+
+class BotWorker(object):
+    """Bots of one worker process"""
+
+    def __init__(self, conn, index, count, bot_token, urlID, threads=8):
+        self.conn = conn
+        self.index = index
+        self.bots = {}
+        self.feeds = {}
+        self.continuer = True
+        self.send_lock = RLock()
+        # les limites par IP sont partagees avec les autres processus
+        share_limits(count)
+        self.runtime = Runtime(threads)
+        self.runtime.start()
+        ok_kucoinbot.setup(bot_token, urlID, self.runtime, PipeJournal(self))
+
+    def log(self, message):
+        log_func2(strftime('[%d/%m %H:%M:%S] Worker {} : {}'.format(self.index, message)))
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def feed(self, paire):
+        if paire not in self.feeds:
+            self.feeds[paire] = RemoteFeed(paire)
+        return self.feeds[paire]
+
+    def start_bot(self, bot_id, spec):
+        key, secret, passphrase, api_url = spec['client']
+        client = kc.Client(key, secret, passphrase, api_url=api_url)
+        if spec.get('state') is not None:
+            # reprise depuis le journal
+            bot = ok_kucoinbot.KucoinBot.from_state(spec['state_id'], spec['state'], client, self.feed(spec['paire']))
+        else :
+            bot = ok_kucoinbot.KucoinBot(spec['owner'], client, spec['bot_chatID1'], spec['base'], spec['quote'],
+                                         spec['your_base'], spec['your_quote'], spec['margin_base'], spec['margin_quote'],
+                                         self.feed(spec['paire']), bypass=spec['bypass'])
+        bot.start()
+        self.bots[bot_id] = bot
+
+    def status(self):
+        return [{'id': bot_id, 'owner': b.owner, 'paire': b.paire, 'paused': b.paused, 'bot_chatID': b.bot_chatID}
+                for bot_id, b in self.bots.items()]
+
+    def handle(self, command, bot_id, args):
+        if command == 'snapshot':
+            self.feed(args.paire).publish(args)
+        elif command == 'start':
+            self.start_bot(bot_id, args)
+        elif command == 'list':
+            # l'id de la demande revient avec la reponse
+            self.send(('list', args, self.status()))
+        elif command == 'setup':
+            ok_kucoinbot.setup(args[0], args[1], self.runtime, PipeJournal(self))
+        elif command == 'stop':
+            self.continuer = False
+        elif bot_id in self.bots:
+            bot = self.bots[bot_id]
+            if command == 'kill':
+                bot.kill()
+                del self.bots[bot_id]
+            elif command in ('pause', 'resume'):
+                getattr(bot, command)()
+            elif command in ('telegram_bot_sendtext', 'log', 'telegram_answer'):
+                # hors de la boucle des commandes : appels reseau
+                self.runtime.submit(getattr(bot, command), *args)
+
+    def run(self):
+        while self.continuer:
+            try :
+                command, bot_id, args = self.conn.recv()
+            except EOFError:
+                break
+            try :
+                self.handle(command, bot_id, args)
+            except Exception as e:
+                self.log('{} {} : {}'.format(command, bot_id, e))
+        for b in list(self.bots.values()):
+            b.kill()
+        self.runtime.stop()
+
+
+def worker_main(conn, index, count, bot_token, urlID, threads):
+    BotWorker(conn, index, count, bot_token, urlID, threads).run()
+
+
+class BotHandle(object):
+    """Supervisor side stand-in of a bot running in a worker process,
+    with the attributes and commands used by the interpreter
+    """
+
+    def __init__(self, supervisor, worker, owner, paire, bot_chatID):
+        self.supervisor = supervisor
+        self.worker = worker
+        self.owner = owner
+        self.paire = paire
+        self.bot_chatID = bot_chatID
+        self.paused = False
+        self.continuer = True
+        self.id = str(id(self))
+
+    def command(self, command, *args):
+        self.supervisor.send(self.worker, (command, self.id, args))
+
+    def pause(self):
+        self.paused = True
+        self.command('pause')
+
+    def resume(self):
+        self.paused = False
+        self.command('resume')
+
+    def kill(self):
+        self.continuer = False
+        self.command('kill')
+        self.supervisor.forget(self)
+
+    def telegram_bot_sendtext(self, bot_message):
+        self.command('telegram_bot_sendtext', bot_message)
+
+    def log(self, message):
+        self.command('log', message)
+
+    def telegram_answer(self, message):
+        self.command('telegram_answer', message)
+
+
+class Supervisor(object):
+    """Pool of worker processes running the bots"""
+
+    def __init__(self, processes=2, bot_token='None', urlID='telegram url', shard_by=SHARD_BY_ACCOUNT, threads=8, journal=None):
+        """
+        :param processes: number of worker processes
+        :param shard_by: SHARD_BY_ACCOUNT keeps the bots of an API key together
+            (shared account snapshots and key rate limit), SHARD_BY_PAIR the
+            bots of a pair
+        :param threads: Runtime workers of each process
+        :param journal: (optional) ok_journal.StateJournal saving the state of the workers' bots
+        """
+        self.processes = processes
+        self.bot_token = bot_token
+        self.urlID = urlID
+        self.shard_by = shard_by
+        self.threads = threads
+        self.journal = journal
+        self.lock = RLock()
+        self.conns = []
+        self.send_locks = []
+        self.replies = []
+        self.workers = []
+        self.handles = {}
+        self.forwarded = set()
+        self.requests = itertools.count()
+        self.hub = None
+        self.telegram = None
+
+    def start(self):
+        """Fork the workers : call it before starting any thread"""
+        context = multiprocessing.get_context('fork')
+        # le processus principal (MarketHub, Telegram) garde sa part
+        share_limits(self.processes)
+        for index in range(self.processes):
+            parent, child = context.Pipe()
+            worker = context.Process(target=worker_main, daemon=True,
+                                     args=(child, index, self.processes, self.bot_token, self.urlID, self.threads))
+            worker.start()
+            self.workers.append(worker)
+            self.conns.append(parent)
+            self.send_locks.append(RLock())
+            self.replies.append(Queue())
+        for index in range(self.processes):
+            Thread(target=self._read, args=(index,), daemon=True).start()
+
+    def attach(self, hub, telegram=None):
+        """MarketHub whose snapshots are relayed to the workers, and
+        ok_telegram.TelegramPoller whose messages are relayed to the bots
+        """
+        self.hub = hub
+        self.telegram = telegram
+
+    def _read(self, index):
+        while True:
+            try :
+                message = self.conns[index].recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == 'journal':
+                if self.journal is not None:
+                    kind, data = message[2]
+                    self.journal.apply(kind, message[1], data)
+                continue
+            self.replies[index].put(message)
+
+    def send(self, index, message):
+        with self.send_locks[index]:
+            self.conns[index].send(message)
+
+    def shard(self, api_key, paire):
+        """Worker owning the bots of this account (or pair)"""
+        key = api_key if self.shard_by == SHARD_BY_ACCOUNT else paire
+        return zlib.crc32(str(key).encode('utf-8')) % self.processes
+
+    def _forward(self, index, snapshot):
+        self.send(index, ('snapshot', None, snapshot))
+
+    def start_bot(self, owner, client, bot_chatID1, base, quote, your_base, your_quote, margin_base, margin_quote, paire, bypass=False, state=None, state_id=None):
+        """Start a bot in the worker owning its account
+        :param client: kucoin_client.Client, only its credentials are sent
+        :param state: (optional) journal state of a bot to resume, with its id state_id
+        :returns: BotHandle
+        """
+        index = self.shard(client.API_KEY, paire)
+        handle = BotHandle(self, index, owner, paire, bot_chatID1)
+        with self.lock:
+            if (index, paire) not in self.forwarded:
+                # le snapshot courant part avant le bot, qui en a besoin a sa creation
+                self.hub.subscribe(paire, lambda snapshot, i=index: self._forward(i, snapshot))
+                self.forwarded.add((index, paire))
+            self.handles[handle.id] = handle
+        if self.telegram is not None:
+            self.telegram.register(bot_chatID1, handle.telegram_answer)
+        spec = {'owner': owner, 'client': (client.API_KEY, client.API_SECRET, client.API_PASSPHRASE, client.API_URL),
+                'bot_chatID1': bot_chatID1, 'base': base, 'quote': quote, 'paire': paire,
+                'your_base': your_base, 'your_quote': your_quote, 'margin_base': margin_base,
+                'margin_quote': margin_quote, 'bypass': bypass, 'state': state, 'state_id': state_id}
+        self.send(index, ('start', handle.id, spec))
+        return handle
+
+    def forget(self, handle):
+        with self.lock:
+            self.handles.pop(handle.id, None)
+        if self.telegram is not None:
+            self.telegram.unregister(handle.bot_chatID, handle.telegram_answer)
+
+    def setup(self, bot_token, urlID):
+        """New Telegram token and log url for every worker"""
+        self.bot_token, self.urlID = bot_token, urlID
+        for index in range(self.processes):
+            self.send(index, ('setup', None, (bot_token, urlID)))
+
+    def list(self, timeout=5.0):
+        """Status of every bot, asked to the workers
+        :returns: list of dict with id, owner, paire, paused, bot_chatID
+        """
+        with self.lock:
+            request = next(self.requests)
+            for index in range(self.processes):
+                self.send(index, ('list', None, request))
+            result = []
+            end = time.time() + timeout
+            for index in range(self.processes):
+                while True:
+                    try :
+                        kind, reply, status = self.replies[index].get(timeout=max(0.0, end - time.time()))
+                    except Empty:
+                        break
+                    # une reponse en retard a une demande precedente est jetee
+                    if reply == request:
+                        result.extend(status)
+                        break
+            return result
+
+    def stop(self):
+        for index in range(self.processes):
+            try :
+                self.send(index, ('stop', None, None))
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.join(5)
@@ -0,0 +1,357 @@
+# coding=utf-8
+
+### Importations ###
+import heapq
+import itertools
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from threading import Thread, RLock, Condition
+from time import strftime
+from urllib.parse import urlparse, parse_qs
+
+# Modules persos
+import fast_json
+import kucoin_client as kc
+# import du module (pas de ses fonctions) : ok_tradingbot_functions importe ce module
+import ok_tradingbot_functions
+
+### Poller Telegram ###
+# Un seul getUpdates par token, en long polling (le serveur garde la requete
+# jusqu'a ce qu'un message arrive) avec un offset : chaque message est recu
+# une seule fois et remis aux bots de sa conversation, au lieu de faire
+# relire les 100 derniers messages par chaque bot deux fois par seconde.
+#
+# Telegram n'accepte qu'un getUpdates a la fois par token : avec le
+# superviseur, seul le processus principal interroge Telegram et transmet les
+# messages aux processus de travail.
+
+TELEGRAM_API = 'https://api.telegram.org/bot'
+
+def log(message):
+    ok_tradingbot_functions.log_func2(strftime('[%d/%m %H:%M:%S] Telegram : {}'.format(message)))
+
+
+class TelegramPoller(Thread):
+    """Long polling getUpdates loop of one bot token, dispatching each
+    message to the callbacks registered for its chat id
+    """
+
+    def __init__(self, bot_token, timeout=30, retry_delay=5.0, skip_pending=True):
+        """
+        :param timeout: long polling duration of a getUpdates, in seconds
+        :param skip_pending: ignore the messages sent before the start, as the
+            bots did when they read the last message of their chat
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.bot_token = bot_token
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.skip_pending = skip_pending
+        self.session = requests.Session()
+        self.lock = RLock()
+        self.routes = {}
+        self.offset = None
+        self.continuer = True
+
+    def log(self, message):
+        log(message)
+
+    def register(self, chat_id, callback):
+        """Call `callback(message)` for each message of this chat"""
+        with self.lock:
+            self.routes.setdefault(str(chat_id), []).append(callback)
+
+    def unregister(self, chat_id, callback):
+        with self.lock:
+            callbacks = self.routes.get(str(chat_id), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.routes.pop(str(chat_id), None)
+
+    def set_token(self, bot_token):
+        """Poll another token, keeping the registered chats"""
+        with self.lock:
+            self.bot_token = bot_token
+            self.offset = None
+        # la requete en cours (ancien token) est abandonnee par Telegram
+
+    def get_updates(self, offset=None, timeout=0):
+        params = {'timeout': timeout}
+        if offset is not None:
+            params['offset'] = offset
+        response = self.session.get(TELEGRAM_API + self.bot_token + '/getUpdates', params=params,
+                                    timeout=timeout + 10)
+        data = fast_json.response_json(response)
+        if not data.get('ok'):
+            raise ValueError('getUpdates : {} {}'.format(data.get('error_code'), data.get('description')))
+        return data['result']
+
+    def dispatch(self, update):
+        message = update.get('message')
+        if not message or 'text' not in message:
+            return
+        with self.lock:
+            callbacks = list(self.routes.get(str(message['chat']['id']), []))
+        for callback in callbacks:
+            try :
+                callback(message)
+            except Exception as e:
+                self.log(e)
+
+    def poll(self):
+        """One getUpdates, every message received is dispatched"""
+        if self.offset is None and self.skip_pending:
+            # offset -1 : seulement la derniere mise a jour, pour repartir apres
+            updates = self.get_updates(-1)
+            self.offset = updates[-1]['update_id'] + 1 if updates else 0
+            return
+        updates = self.get_updates(self.offset, self.timeout)
+        for update in updates:
+            # confirme a Telegram au prochain appel
+            self.offset = update['update_id'] + 1
+            self.dispatch(update)
+
+    def run(self):
+        while self.continuer:
+            try :
+                self.poll()
+            except Exception as e:
+                self.log(e)
+                time.sleep(self.retry_delay)
+
+    def stop(self):
+        self.continuer = False
+
+
+# Un poller par token, partage par tous les bots du processus
+_pollers = {}
+_pollers_lock = RLock()
+
+def poller(bot_token):
+    """Running TelegramPoller of this token, started on the first call"""
+    with _pollers_lock:
+        if bot_token not in _pollers:
+            _pollers[bot_token] = TelegramPoller(bot_token)
+            _pollers[bot_token].start()
+        return _pollers[bot_token]
+
+def change_token(old_token, new_token):
+    """Move the poller of old_token, and its chats, to new_token
+    :returns: the poller
+    """
+    with _pollers_lock:
+        telegram = _pollers.pop(old_token, None)
+        if telegram is None:
+            return poller(new_token)
+        telegram.set_token(new_token)
+        _pollers[new_token] = telegram
+        return telegram
+
+
+### Envoi ###
+# Les messages ne sont plus envoyes dans le chemin des ordres : ils vont dans
+# une file, envoyee par quelques threads avec une session HTTP commune, en
+# respectant les limites de Telegram (environ 30 messages par seconde au
+# total, 1 par seconde par conversation). Les messages qui attendent dans une
+# meme conversation partent ensemble, en un seul message, et les executions
+# d'ordres passent avant le reste.
+
+PRIORITY_TRADE = 0
+PRIORITY_ANSWER = 1
+PRIORITY_INFO = 2
+
+MAX_LENGTH = 4096
+
+
+def url_target(url):
+    """(bot token, chat id) of a sendMessage url such as ok_bot's urlID
+    :raises: ValueError if it is not a sendMessage url
+    """
+    parsed = urlparse(str(url))
+    path = parsed.path.split('/')
+    chat_id = parse_qs(parsed.query).get('chat_id')
+    if len(path) < 3 or not path[1].startswith('bot') or not chat_id:
+        raise ValueError('Not a Telegram sendMessage url : {}'.format(url))
+    return path[1][len('bot'):], chat_id[0]
+
+
+class _Chat(object):
+    """Pending messages of one conversation"""
+
+    def __init__(self, bot_token, chat_id):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.messages = []
+        self.next_time = 0.0
+        self.busy = False
+
+
+class TelegramSender(object):
+    """Outbound Telegram queue : rate limited by chat and globally, bursts
+    of a chat coalesced into one message, trade messages first
+    """
+
+    # messages par seconde, rafale
+    GLOBAL_LIMIT = (30, 30)
+    CHAT_INTERVAL = 1.0
+
+    def __init__(self, workers=4, coalesce_delay=0.5, max_retries=3):
+        """
+        :param workers: sending threads
+        :param coalesce_delay: seconds a message waits for the next ones of its
+            chat before leaving, except PRIORITY_TRADE messages
+        :param max_retries: sending attempts of a message before it is dropped
+        """
+        self.workers = workers
+        self.coalesce_delay = coalesce_delay
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self.bucket = kc.TokenBucket(*self.GLOBAL_LIMIT)
+        self.cond = Condition()
+        self.chats = {}
+        self.counter = itertools.count()
+        self.continuer = True
+        self.sent = 0
+        self.dropped = 0
+        self.pid = os.getpid()
+
+    def start(self):
+        for _ in range(self.workers):
+            Thread(target=self.run, daemon=True).start()
+
+    def send(self, bot_token, chat_id, text, priority=PRIORITY_INFO):
+        """Queue a message, returns at once"""
+        text = str(text)
+        with self.cond:
+            key = (bot_token, str(chat_id))
+            if key not in self.chats:
+                self.chats[key] = _Chat(bot_token, str(chat_id))
+            chat = self.chats[key]
+            for start in range(0, max(len(text), 1), MAX_LENGTH):
+                # (priorite, ordre d'arrivee, heure, texte, essais)
+                heapq.heappush(chat.messages, (priority, next(self.counter), time.time(), text[start:start + MAX_LENGTH], 0))
+            self.cond.notify_all()
+
+    def _ready_time(self, chat):
+        priority, n, queued, text, tries = chat.messages[0]
+        if priority == PRIORITY_TRADE:
+            return chat.next_time
+        oldest = min(m[2] for m in chat.messages)
+        return max(chat.next_time, oldest + self.coalesce_delay)
+
+    def _take(self):
+        """Wait for a chat ready to send, and take its batch
+        :returns: (chat, batch) or None when stopped
+        """
+        with self.cond:
+            while self.continuer:
+                now = time.time()
+                best, wait = None, None
+                for chat in self.chats.values():
+                    if chat.busy or not chat.messages:
+                        continue
+                    ready = self._ready_time(chat)
+                    if ready <= now:
+                        if best is None or chat.messages[0][:2] < best.messages[0][:2]:
+                            best = chat
+                    elif wait is None or ready - now < wait:
+                        wait = ready - now
+                if best is not None:
+                    best.busy = True
+                    batch, length = [], 0
+                    while best.messages and (not batch or length + len(best.messages[0][3]) <= MAX_LENGTH):
+                        message = heapq.heappop(best.messages)
+                        batch.append(message)
+                        length += len(message[3]) + 2
+                    return best, batch
+                self.cond.wait(wait)
+        return None
+
+    def post(self, bot_token, chat_id, text):
+        """Send one message
+        :returns: decoded Telegram response
+        """
+        data = {'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'}
+        url = TELEGRAM_API + bot_token + '/sendMessage'
+        result = fast_json.response_json(self.session.post(url, data=data, timeout=10))
+        if not result.get('ok') and result.get('error_code') == 400 and 'parse' in str(result.get('description')):
+            # Markdown invalide (souvent apres regroupement) : envoye en texte brut
+            del data['parse_mode']
+            result = fast_json.response_json(self.session.post(url, data=data, timeout=10))
+        return result
+
+    def run(self):
+        while self.continuer:
+            taken = self._take()
+            if taken is None:
+                return
+            chat, batch = taken
+            self.bucket.acquire(batch[0][0])
+            # essai compte sauf refus pour debit (429)
+            delay, retry, tries = self.CHAT_INTERVAL, False, 1
+            try :
+                result = self.post(chat.bot_token, chat.chat_id, '\n\n'.join(m[3] for m in batch))
+                if result.get('ok'):
+                    self.sent += 1
+                elif result.get('error_code') == 429:
+                    delay = float(result.get('parameters', {}).get('retry_after', 5))
+                    retry, tries = True, 0
+                else :
+                    log('sendMessage {} : {}'.format(chat.chat_id, result.get('description')))
+            except Exception as e:
+                log('sendMessage {} : {}'.format(chat.chat_id, e))
+                retry = True
+            with self.cond:
+                chat.busy = False
+                chat.next_time = time.time() + delay
+                if retry:
+                    for m in batch:
+                        if m[4] + tries < self.max_retries:
+                            heapq.heappush(chat.messages, m[:4] + (m[4] + tries,))
+                        else :
+                            self.dropped += 1
+                self.cond.notify_all()
+
+    def pending(self):
+        with self.cond:
+            return sum(len(chat.messages) + chat.busy for chat in self.chats.values())
+
+    def flush(self, timeout=10.0):
+        """Wait until the queue is sent, at most `timeout` seconds
+        :returns: True if everything was sent
+        """
+        end = time.time() + timeout
+        with self.cond:
+            while self.pending():
+                if time.time() >= end:
+                    return False
+                self.cond.wait(min(0.5, end - time.time()))
+            return True
+
+    def stop(self):
+        with self.cond:
+            self.continuer = False
+            self.cond.notify_all()
+
+
+# Une file d'envoi par processus (recreee apres un fork : les threads
+# d'envoi ne sont pas copies, et la limite globale a pu etre partagee)
+_sender = None
+
+def sender():
+    """Running TelegramSender of this process, started on the first call"""
+    global _sender
+    with _pollers_lock:
+        if _sender is None or _sender.pid != os.getpid():
+            _sender = TelegramSender()
+            _sender.start()
+        return _sender
+
+def send_message(bot_token, chat_id, text, priority=PRIORITY_INFO):
+    """Queue a message for the chat, see TelegramSender"""
+    sender().send(bot_token, chat_id, text, priority)
@@ -9,6 +9,8 @@ import json
 
 # Modules persos
 import kucoin_client as kc
+import ok_telegram
+import ok_logging
 
 urlID = 'telegram url'
 
@@ -37,6 +39,8 @@ def init_of_tradingbots():
     token['stan_chatID'] = stan_chatID
     urlID = 'https://api.telegram.org/bot' + api2[1] + '/sendMessage?chat_id=' + stan_chatID
     token['urlID'] = urlID
+    # mot de passe maitre, pour le journal d'etat (ok_journal)
+    token['mdp'] = mdp
     del crypt, api2, urlID
     print('Telegram tokens loaded')
     return token
@@ -44,25 +48,32 @@ def init_of_tradingbots():
 
 
 def stansendlog(urlID, bot_message):
-    send_text = urlID + '&parse_mode=Markdown&text=' + bot_message
-    response = requests.get(send_text)
-    return response.json()
+    # file d'envoi : ne bloque pas l'appelant
+    try :
+        bot_token, chat_id = ok_telegram.url_target(urlID)
+    except ValueError as e:
+        log_func2(e)
+        return
+    ok_telegram.send_message(bot_token, chat_id, str(bot_message))
 
-def log_func(msg, urlID):
-    with open('log.txt','a') as f:
-        f.write('{}\n'.format(msg))
-    stansendlog(urlID, msg)
+def log_func(msg, urlID, level=None):
+    # ecrit par ok_logging, sur Telegram a partir du niveau TRADE
+    ok_logging.log(msg, level, 'log.txt', urlID)
   
 def read_log():
+    ok_logging.flush()
     with open('log.txt','r') as f:
         txt=f.read()
     return txt
 
-def log_func2(msg):
-    with open('log2.txt','a') as g:
-        g.write('{}\n'.format(msg))
+def log_func2(msg, level=None):
+    # fichier seulement, en DEBUG par defaut ; une exception est loguee en ERROR
+    if level is None and not isinstance(msg, Exception):
+        level = ok_logging.DEBUG
+    ok_logging.log(msg, level, 'log2.txt')
         
 def read_log2():
+    ok_logging.flush()
     with open('log2.txt','r') as g:
         txt=g.read()
     return txt
@@ -82,14 +93,12 @@ def round_x_to_y_number(x,y):
 
 def get_precision(paire, type='base or quote', client='client kucoin'):
     side = "null"
-    z = client.get_symbols()
+    z = client.get_symbol_info(paire)
     if type  == 'base':
         side = "quoteIncrement"
     elif type == 'quote' :
         side = "baseIncrement"
-    for i in range(len(z)):
-        if z[i]['symbol'] == paire:
-            precision = int(len(str(z[i][side])))
+    precision = int(len(str(z[side])))
     if not precision > 0:
         log_func('Error in getting precision')
         precision = 0
@@ -119,7 +128,7 @@ def decrypter(mdp, crypted, typed="(optionnal) None, list or dict"): #Can be lis
 def is_client(client): #checke que le compte n'est pas vide
     import kucoin_client as kc
     if isinstance(client, kc.Client):
-        if client.get_accounts() != {}:
+        if len(client.get_account_snapshot().accounts) > 0:
             return True  
         else :
             return False
@@ -128,22 +137,11 @@ def is_client(client): #checke que le compte n'est pas vide
     
 
 def get_margin_account(client):
-    a={}
-    b={}
+    last = {}
     if (is_client(client)) == True:
-        for i in range(len(client.get_accounts())+1):
-            b[str(i)] = {}
-        for i in range(len(client.get_accounts())):
-            if client.get_accounts()[i]['type']=='margin':
-                z = client.get_accounts()[i]
-                b[str(i)]['currency'] = z['currency']
-                b[str(i)]['available'] = z['available']
-        last ={}
-        a=0
-        for i in range(1,6):
-            if b[str(i)] != {}:
-                last[str(a)] = b[str(i)]
-                a = a+1
+        # un seul appel : is_client vient de remplir le snapshot
+        for z in client.get_account_snapshot().of_type('margin'):
+            last[str(len(last))] = {'currency': z['currency'], 'available': z['available']}
         return last
     else :
         return {}
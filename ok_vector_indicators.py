@@ -0,0 +1,112 @@
+# coding=utf-8
+
+### Importations ###
+import numpy as np
+
+### Indicateurs vectorises ###
+# Chaque indicateur prend des tableaux NumPy dont le dernier axe est le temps
+# (le plus ancien en premier). Un tableau 2-D (paires x temps) est calcule en
+# un seul appel : les boucles restantes portent sur le temps, jamais sur les paires.
+# Les valeurs non encore definies (periode de chauffe) valent NaN.
+
+def as_matrix(series):
+    """Stack price series of different lengths into a (symbols x time) matrix,
+    keeping the most recent common part
+    """
+    length = min(len(s) for s in series)
+    return np.array([np.asarray(s, dtype=np.float64)[len(s)-length:] for s in series])
+
+
+def from_klines(klines):
+    """Columns of Kucoin klines (newest first) as float arrays, oldest first
+    :return: dict with time, open, close, high, low, volume, turnover
+    """
+    a = np.array(klines, dtype=np.float64)[::-1]
+    return dict(zip(('time', 'open', 'close', 'high', 'low', 'volume', 'turnover'), a.T))
+
+
+def sma(x, period):
+    """Simple moving average"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] < period:
+        return out
+    c = np.cumsum(x, axis=-1)
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), c], axis=-1)
+    out[..., period-1:] = (c[..., period:] - c[..., :-period]) / period
+    return out
+
+
+def _smooth(x, period, alpha):
+    """Recursive smoothing seeded with the SMA of the first `period` values,
+    out[t] = out[t-1] + alpha*(x[t]-out[t-1])
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] < period:
+        return out
+    value = x[..., :period].mean(axis=-1)
+    out[..., period-1] = value
+    for t in range(period, x.shape[-1]):
+        value = value + alpha*(x[..., t] - value)
+        out[..., t] = value
+    return out
+
+
+def ema(x, period):
+    """Exponential moving average seeded with the SMA of the first `period`
+    values, like ok_indicators.EMA.seed. ok_indicators.EmaEngine seeds over
+    a window of the last closes instead : both agree once the seed has faded,
+    a few times `period` values later.
+    """
+    return _smooth(x, period, 2/(period+1))
+
+
+def rsi(close, period=14):
+    """Relative Strength Index (Wilder)"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, axis=-1)
+    gain = _smooth(np.clip(delta, 0, None), period, 1/period)
+    loss = _smooth(np.clip(-delta, 0, None), period, 1/period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(loss == 0, 100.0, 100 - 100/(1 + gain/loss))
+    out = np.where(np.isnan(gain), np.nan, out)
+    # delta a un element de moins que close
+    return np.concatenate([np.full(close.shape[:-1] + (1,), np.nan), out], axis=-1)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Moving Average Convergence Divergence
+    :return: (macd, signal, histogram)
+    """
+    line = ema(close, fast) - ema(close, slow)
+    sig = np.full(line.shape, np.nan)
+    start = slow - 1
+    if line.shape[-1] > start:
+        sig[..., start:] = ema(line[..., start:], signal)
+    return line, sig, line - sig
+
+
+def atr(high, low, close, period=14):
+    """Average True Range (Wilder)"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    prev = close[..., :-1]
+    tr = np.maximum(high[..., 1:] - low[..., 1:],
+                    np.maximum(np.abs(high[..., 1:] - prev), np.abs(low[..., 1:] - prev)))
+    out = _smooth(tr, period, 1/period)
+    return np.concatenate([np.full(close.shape[:-1] + (1,), np.nan), out], axis=-1)
+
+
+def ema_trend(close, periods=(20, 45, 130)):
+    """Trend of an EMA ribbon on the last candle, with the rule of
+    ok_kucoinbot.trend : 1 when the EMAs are in increasing period order
+    downwards (full long), -1 when fully inverted (full short), 0 otherwise.
+    The EMAs are those of ema() : the bots' signal once the series is a few
+    times longer than the longest period.
+    """
+    last = np.stack([ema(close, p)[..., -1] for p in periods])
+    up = np.all(last[:-1] > last[1:], axis=0)
+    down = np.all(last[:-1] < last[1:], axis=0)
+    return up.astype(np.int8) - down.astype(np.int8)
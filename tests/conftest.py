@@ -0,0 +1,7 @@
+# coding=utf-8
+
+import os
+import sys
+
+# les modules du bot sont a la racine du depot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+# coding=utf-8
+
+import asyncio
+
+import pytest
+
+import kucoin_client as kc
+from kucoin_fake_server import FakeKucoinServer, wave_price
+
+
+@pytest.fixture
+def server():
+    server = FakeKucoinServer(symbols={'BTC-USDT': wave_price(9000)})
+    server.add_key('key', 'secret', 'passphrase', {'USDT': 1000, 'BTC': 1})
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_iter_kline_pages(server):
+    client = kc.AsyncClient('key', 'secret', 'passphrase', api_url=server.url)
+    interval = kc.KLINE_INTERVALS['5min']
+    end = int(client.sync_client.server_time()) // interval * interval
+    start = end - 4000*interval
+
+    async def collect():
+        pages = []
+        async for page in client.iter_kline_pages('BTC-USDT', '5min', start, end):
+            pages.append(page)
+        klines = [k async for k in client.iter_kline_data('BTC-USDT', '5min', start, end)]
+        return pages, klines
+
+    pages, klines = asyncio.run(collect())
+    assert len(pages) == 3
+    times = [int(k[0]) for page in pages for k in page]
+    assert times == sorted(set(times))
+    assert [int(k[0]) for k in klines] == times
+
+
+def test_get_kline_data_without_end(server):
+    client = kc.AsyncClient('key', 'secret', 'passphrase', api_url=server.url)
+    klines = asyncio.run(client.get_kline_data('BTC-USDT', '5min', int(server.now()) - 3600))
+    assert 11 <= len(klines) <= 13
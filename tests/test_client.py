@@ -0,0 +1,88 @@
+# coding=utf-8
+
+import threading
+import time
+
+import pytest
+import requests
+
+import kucoin_client as kc
+from kline_store import KlineStore
+from kucoin_fake_server import FakeKucoinServer, wave_price
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(kc.Client, 'BACKOFF_BASE', 0.01)
+    server = FakeKucoinServer(symbols={'BTC-USDT': wave_price(9000)})
+    server.add_key('key', 'secret', 'passphrase', {'USDT': 1000, 'BTC': 1})
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_order_lost_reply_is_found_by_client_oid(server, monkeypatch):
+    client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    send = kc.Client._send
+    lost = []
+
+    def send_then_lose_reply(self, method, path, signed, **kwargs):
+        response = send(self, method, path, signed, **kwargs)
+        if method == 'post' and path == 'orders' and not lost:
+            # l'ordre est passe, mais la reponse n'arrive pas
+            lost.append(response.json()['data']['orderId'])
+            raise requests.ReadTimeout('read timed out')
+        return response
+
+    monkeypatch.setattr(kc.Client, '_send', send_then_lose_reply)
+    order = client.create_market_order('BTC-USDT', kc.Client.SIDE_BUY, funds=100, client_oid='oid1')
+    assert order['orderId'] == lost[0]
+    assert len(server.orders) == 1
+    assert server.counts['POST orders'] == 1
+
+
+def test_order_refused_by_server_error_is_sent_again(server):
+    client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    # horloge synchronisee avant : l'erreur tombe sur l'ordre
+    client.get_accounts()
+    server.fail_next(1, status=503, code='503000', message='Service Unavailable')
+    order = client.create_market_order('BTC-USDT', kc.Client.SIDE_BUY, funds=100, client_oid='oid2')
+    # recherche par clientOid sans resultat, puis nouvel envoi
+    assert server.counts['GET order'] == 1
+    assert server.counts['POST orders'] == 2
+    assert list(server.orders) == [order['orderId']]
+
+
+def test_bucket_serves_waiters_by_priority():
+    bucket = kc.TokenBucket(10, 1)
+    bucket.acquire()
+    served = []
+
+    def take(priority):
+        bucket.acquire(priority)
+        served.append(priority)
+
+    threads = []
+    for priority in (kc.PRIORITY_QUERY, kc.PRIORITY_MARKET, kc.PRIORITY_ORDER):
+        threads.append(threading.Thread(target=take, args=(priority,)))
+        threads[-1].start()
+        # en attente avant le suivant
+        while len(bucket.waiters) < len(threads):
+            time.sleep(0.001)
+    for t in threads:
+        t.join(5)
+    assert served == [kc.PRIORITY_ORDER, kc.PRIORITY_MARKET, kc.PRIORITY_QUERY]
+
+
+def test_backfill_keeps_the_candle_at_start(server, tmp_path):
+    client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    interval = kc.KLINE_INTERVALS['5min']
+    end = int(client.server_time()) // interval * interval
+    t0 = end - 2000*interval
+    store = KlineStore(str(tmp_path))
+    stored = client.backfill_klines(store, ['BTC-USDT'], '5min', start=t0, end=end)
+    times = [t for t, close in store.series('BTC-USDT', '5min').candles()]
+    # bornes incluses des deux cotes : aucune page ne perd sa premiere bougie
+    assert times[0] == t0
+    assert times == list(range(t0, t0 + len(times)*interval, interval))
+    assert stored['BTC-USDT'] == len(times) >= 2000
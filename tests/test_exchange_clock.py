@@ -0,0 +1,83 @@
+# coding=utf-8
+
+import asyncio
+import time
+
+import pytest
+
+import kucoin_client as kc
+from kucoin_fake_server import FakeKucoinServer, wave_price
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(kc.Client, 'BACKOFF_BASE', 0.01)
+    server = FakeKucoinServer(symbols={'BTC-USDT': wave_price(9000)})
+    server.add_key('key', 'secret', 'passphrase', {'USDT': 1000, 'BTC': 1})
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+
+
+def test_offset_follows_the_exchange(server, client):
+    server.clock_offset = 100.0
+    assert client.server_time() == pytest.approx(time.time() + 100, abs=0.5)
+    clock = client.exchange_clock()
+    server.clock_offset = 200.0
+    # moyenne glissante, puis remise a zero
+    clock.sync()
+    assert clock.offset == pytest.approx(100 + clock.alpha*100, abs=0.5)
+    clock.sync(reset=True)
+    assert clock.offset == pytest.approx(200, abs=0.5)
+
+
+def test_stale_offset_is_resynced_on_400002(server, client):
+    client.get_accounts()
+    assert client.exchange_clock().offset == pytest.approx(0, abs=0.5)
+    # l'exchange derive : la signature est refusee une fois, puis renvoyee
+    server.clock_offset = 60.0
+    client.account_book().invalidate()
+    assert client.get_accounts()
+    assert client.exchange_clock().offset == pytest.approx(60, abs=0.5)
+    assert server.counts['GET accounts'] == 3
+
+
+def test_failed_first_sync_falls_back_to_local_time(server, client):
+    clock = client.exchange_clock()
+    clock.retry_delay = 0.1
+    server.clock_offset = 50.0
+    # le premier get_timestamp echoue, ses nouveaux essais aussi
+    server.fail_next(kc.Client.MAX_RETRIES + 1)
+    assert client.server_time() == pytest.approx(time.time(), abs=0.5)
+    assert clock.rtt is None
+    time.sleep(0.15)
+    client.server_time()
+    assert wait_until(lambda: clock.rtt is not None)
+    assert client.server_time() == pytest.approx(time.time() + 50, abs=0.5)
+
+
+def test_first_sync_does_not_block_the_event_loop(server, client):
+    server.latency = 0.2
+    clock = client.exchange_clock()
+
+    async def read():
+        start = time.time()
+        client.server_time()
+        return time.time() - start
+
+    assert asyncio.run(read()) < 0.1
+    assert wait_until(lambda: clock.rtt is not None)
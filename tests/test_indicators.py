@@ -0,0 +1,79 @@
+# coding=utf-8
+
+import random
+
+import pytest
+
+from ok_indicators import EmaEngine
+
+
+def baseline_emas(prices):
+    """Former full recompute of kIndicators.calc_2h_emas,
+    prices newest first, prices[0] being the candle in progress
+    """
+    emas = {}
+    for period in (20, 45, 130):
+        m = 2/(period+1)
+        ema = sum(prices[period-1:2*period-1])/period
+        for i in range(1, period):
+            ema = (prices[period-i]-ema)*m + ema
+        emas[period] = ema
+    return emas
+
+
+def history(count, seed=1):
+    rng = random.Random(seed)
+    price, candles = 100.0, []
+    for i in range(count):
+        price *= 1 + rng.uniform(-0.02, 0.02)
+        candles.append((7200*i, price))
+    return candles
+
+
+def prices_of(candles, in_progress=0.0):
+    return [in_progress] + [c for t, c in reversed(candles)]
+
+
+def test_seed_matches_full_recompute():
+    candles = history(260)
+    engine = EmaEngine((20, 45, 130))
+    engine.seed(candles)
+    expected = baseline_emas(prices_of(candles))
+    for period in (20, 45, 130):
+        assert engine.value(period) == pytest.approx(expected[period], rel=1e-12)
+    assert engine.last_close_time == candles[-1][0]
+
+
+def test_seed_needs_the_window():
+    with pytest.raises(ValueError):
+        EmaEngine((20, 45, 130)).seed(history(257))
+
+
+def test_update_applies_each_candle_once():
+    candles = history(270)
+    engine = EmaEngine((20, 45, 130))
+    engine.seed(candles[:260])
+    assert engine.update(candles[255:265]) == 5
+    assert engine.update(candles[255:265]) == 0
+    assert engine.update(candles[265:]) == 5
+    for period in (20, 45, 130):
+        ema = EmaEngine((period,))
+        ema.seed(candles[:260])
+        m, value = 2/(period+1), ema.value(period)
+        for t, close in candles[260:]:
+            value = (close-value)*m + value
+        assert engine.value(period) == pytest.approx(value, rel=1e-12)
+    # au plus pres du recalcul complet sur la fenetre glissante
+    recompute = baseline_emas(prices_of(candles))
+    for period in (20, 45, 130):
+        assert engine.value(period) == pytest.approx(recompute[period], rel=1e-3)
+
+
+def test_provisional_leaves_state():
+    candles = history(260)
+    engine = EmaEngine((20, 45, 130))
+    engine.seed(candles)
+    before = engine.values()
+    provisional = engine.provisional(150.0)
+    assert engine.values() == before
+    assert all(provisional[p] > before[p] for p in (20, 45, 130))
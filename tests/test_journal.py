@@ -0,0 +1,70 @@
+# coding=utf-8
+
+from ok_journal import StateJournal
+
+
+def spec(**fields):
+    spec = {'client': ('key', 'secret', 'passphrase', 'http://127.0.0.1'), 'state': 'starting', 'base_qty': 1.0}
+    spec.update(fields)
+    return spec
+
+
+def test_replay_after_restart(tmp_path):
+    journal = StateJournal(str(tmp_path), 'pw')
+    journal.add('b1', spec())
+    journal.update('b1', {'state': 'trading', 'base_qty': 2.0})
+    journal.add('b2', spec())
+    journal.remove('b2')
+    journal.file.close()
+    states = StateJournal(str(tmp_path), 'pw').bots()
+    assert list(states) == ['b1']
+    assert states['b1']['state'] == 'trading'
+    assert states['b1']['base_qty'] == 2.0
+
+
+def test_update_writes_changes_only(tmp_path):
+    journal = StateJournal(str(tmp_path), 'pw')
+    journal.add('b1', spec())
+    lines = journal.lines
+    journal.update('b1', {'state': 'starting', 'base_qty': 1.0})
+    assert journal.lines == lines
+
+
+def test_credentials_are_encrypted(tmp_path):
+    journal = StateJournal(str(tmp_path), 'pw')
+    journal.add('b1', spec())
+    journal.file.close()
+    assert 'secret' not in (tmp_path / 'journal.log').read_text()
+    journal = StateJournal(str(tmp_path), 'pw')
+    assert journal.credentials(journal.bots()['b1']) == ('key', 'secret', 'passphrase', 'http://127.0.0.1')
+
+
+def test_torn_line_survives_two_restarts(tmp_path):
+    journal = StateJournal(str(tmp_path), 'pw')
+    journal.add('b1', spec())
+    journal.update('b1', {'base_qty': 2.0})
+    # crash pendant l'ecriture d'une ligne
+    journal.file.write('["u","b1",{"base_qty":')
+    journal.file.flush()
+    journal.file.close()
+
+    journal = StateJournal(str(tmp_path), 'pw')
+    assert journal.bots()['b1']['base_qty'] == 2.0
+    journal.update('b1', {'base_qty': 3.0})
+    journal.update('b1', {'state': 'trading', 'base_qty': 4.0})
+    journal.file.close()
+
+    journal = StateJournal(str(tmp_path), 'pw')
+    assert journal.bots()['b1']['base_qty'] == 4.0
+    assert journal.bots()['b1']['state'] == 'trading'
+    assert journal.lines == 4
+
+
+def test_compaction(tmp_path):
+    journal = StateJournal(str(tmp_path), 'pw', snapshot_every=3)
+    journal.add('b1', spec())
+    for qty in range(10):
+        journal.update('b1', {'base_qty': float(qty)})
+    journal.file.close()
+    assert (tmp_path / 'snapshot.json').exists()
+    assert StateJournal(str(tmp_path), 'pw').bots()['b1']['base_qty'] == 9.0
@@ -0,0 +1,49 @@
+# coding=utf-8
+
+from kline_store import KlineStore
+
+
+def kline(t, close):
+    return [str(t), '1.0', str(close), '2.0', '0.5', '10', '20']
+
+
+def test_append_keeps_newer_candles_in_order(tmp_path):
+    store = KlineStore(str(tmp_path))
+    series = store.series('BTC-USDT', '1min')
+    assert series.append([kline(180, 3.0), kline(60, 1.0), kline(120, 2.0)]) == 3
+    # deja stockees ou plus anciennes : ignorees
+    assert series.append([kline(120, 9.0), kline(240, 4.0)]) == 1
+    assert len(series) == 4
+    assert series.last_time() == 240
+    assert list(series.read('close')) == [1.0, 2.0, 3.0, 4.0]
+    assert list(series.read('time', 1, 3)) == [120.0, 180.0]
+    assert series.klines(180) == [[240.0, 1.0, 4.0, 2.0, 0.5, 10.0, 20.0], [180.0, 1.0, 3.0, 2.0, 0.5, 10.0, 20.0]]
+    store.close()
+
+
+def test_index_of(tmp_path):
+    store = KlineStore(str(tmp_path))
+    series = store.series('BTC-USDT', '1min')
+    assert series.index_of(100) == 0
+    series.append([kline(60*i, i) for i in range(1, 6)])
+    assert series.index_of(0) == 0
+    assert series.index_of(60) == 0
+    assert series.index_of(61) == 1
+    assert series.index_of(300) == 4
+    assert series.index_of(301) == 5
+    assert series.candles(240) == [(240, 4.0), (300, 5.0)]
+    store.close()
+
+
+def test_reopen_drops_partial_row(tmp_path):
+    store = KlineStore(str(tmp_path))
+    series = store.series('BTC-USDT', '1min')
+    series.append([kline(60, 1.0), kline(120, 2.0)])
+    store.close()
+    # ecriture interrompue : close ecrit, time non
+    with open(str(tmp_path / 'BTC-USDT' / '1min' / 'close.f64'), 'ab') as f:
+        f.write(b'\x00' * 8)
+    series = KlineStore(str(tmp_path)).series('BTC-USDT', '1min')
+    assert len(series) == 2
+    assert series.index_of(120) == 1
+    series.close()
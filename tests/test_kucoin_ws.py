@@ -0,0 +1,122 @@
+# coding=utf-8
+
+import time
+
+import pytest
+
+from kucoin_ws import KucoinStream, FakeWsServer
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def server():
+    server = FakeWsServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_subscribe_and_push(server):
+    received = []
+    stream = KucoinStream(url=server.url)
+    stream.subscribe_ticker('BTC-USDT', lambda symbol, ticker: received.append(ticker['price']))
+    stream.start()
+    try:
+        topic = '/market/ticker:BTC-USDT'
+        assert wait_until(lambda: server.subscribers(topic))
+        server.publish(topic, 'trade.ticker', {'price': '9000'})
+        assert wait_until(lambda: received == ['9000'])
+        assert stream.get_ticker('BTC-USDT') == {'price': '9000'}
+        # abonnement apres la connexion
+        stream.subscribe_ticker('ETH-USDT')
+        assert wait_until(lambda: server.subscribers('/market/ticker:ETH-USDT'))
+    finally:
+        stream.stop()
+
+
+def test_resubscribe_after_reconnect(server):
+    stream = KucoinStream(url=server.url, reconnect_delay=0.05)
+    stream.subscribe_klines('BTC-USDT', '2hour')
+    stream.start()
+    try:
+        topic = '/market/candles:BTC-USDT_2hour'
+        assert wait_until(lambda: server.subscribers(topic))
+        server.drop_clients()
+        assert wait_until(lambda: not server.subscribers(topic))
+        assert wait_until(lambda: server.subscribers(topic))
+    finally:
+        stream.stop()
+
+
+def test_ping_under_steady_traffic(server):
+    stream = KucoinStream(url=server.url)
+    stream.ping_interval = 0.2
+    stream.subscribe_ticker('BTC-USDT')
+    stream.start()
+    try:
+        topic = '/market/ticker:BTC-USDT'
+        assert wait_until(lambda: server.subscribers(topic))
+        # le flux ne laisse jamais la connexion inactive
+        end = time.time() + 1.0
+        while time.time() < end:
+            server.publish(topic, 'trade.ticker', {'price': '9000'})
+            time.sleep(0.02)
+        assert server.pings >= 3
+        assert stream.is_live()
+    finally:
+        stream.stop()
+
+
+def candle(t, close):
+    return {'symbol': 'BTC-USDT', 'candles': [str(t), '1', str(close), '2', '0.5', '10', '20'], 'time': t*10**9}
+
+
+def test_reconnect_drops_the_stale_candle(server):
+    closed, gaps = [], []
+    stream = KucoinStream(url=server.url, reconnect_delay=0.05)
+    stream.subscribe_klines('BTC-USDT', '2hour', lambda s, t, kline: closed.append(kline),
+                            lambda s, t: gaps.append(t))
+    stream.start()
+    try:
+        topic = '/market/candles:BTC-USDT_2hour'
+        assert wait_until(lambda: server.subscribers(topic))
+        server.publish(topic, 'trade.candles.update', candle(7200, 1.0))
+        assert wait_until(lambda: stream.candles)
+        server.drop_clients()
+        assert wait_until(lambda: not server.subscribers(topic))
+        assert wait_until(lambda: server.subscribers(topic))
+        # les bougies manquees pendant la coupure sont a reprendre en REST
+        assert wait_until(lambda: gaps == ['2hour'])
+        # la bougie d'avant la coupure, partielle, n'est pas donnee pour cloturee
+        server.publish(topic, 'trade.candles.update', candle(3*7200, 3.0))
+        server.publish(topic, 'trade.candles.update', candle(4*7200, 4.0))
+        assert wait_until(lambda: closed)
+        assert [int(k[0]) for k in closed] == [3*7200]
+        assert gaps == ['2hour']
+    finally:
+        stream.stop()
+
+
+def test_skipped_candles_are_a_gap(server):
+    closed, gaps = [], []
+    stream = KucoinStream(url=server.url)
+    stream.subscribe_klines('BTC-USDT', '2hour', lambda s, t, kline: closed.append(kline),
+                            lambda s, t: gaps.append(t))
+    stream.start()
+    try:
+        topic = '/market/candles:BTC-USDT_2hour'
+        assert wait_until(lambda: server.subscribers(topic))
+        server.publish(topic, 'trade.candles.update', candle(7200, 1.0))
+        server.publish(topic, 'trade.candles.update', candle(3*7200, 3.0))
+        assert wait_until(lambda: gaps == ['2hour'])
+        assert closed == []
+    finally:
+        stream.stop()
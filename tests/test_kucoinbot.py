@@ -0,0 +1,276 @@
+# coding=utf-8
+
+import pytest
+import requests
+
+import kucoin_client as kc
+import ok_kucoinbot
+from kucoin_fake_server import FakeKucoinServer, wave_price
+from ok_journal import StateJournal
+from ok_kucoinbot import KucoinBot
+from ok_market import MarketSnapshot
+
+
+class Feed(object):
+    interval = 7200
+    snapshot = None
+
+    def subscribe(self, callback):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+
+class Bot(KucoinBot):
+    # sans __slots__ : les methodes peuvent etre remplacees par test
+    pass
+
+
+STATE = {'owner': 'owner', 'bot_chatID': '1', 'base': 'USDT', 'quote': 'BTC',
+         'your_base': 100.0, 'your_quote': 0.0, 'margin_base': 0.0, 'margin_quote': 0.0,
+         'min_base': 0.1, 'min_quote': 0.0001, 'bypass': False,
+         'state': 'trading', 'paused': False, 'base_qty': 100.0, 'quote_qty': 0.0,
+         'firstvalue': 100.0, 'last_telegram_id': '000', 'lastprice': 0.0}
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    monkeypatch.setattr(ok_kucoinbot, 'journal', None)
+    bot = Bot.from_state('b1', dict(STATE), None, Feed())
+    monkeypatch.setattr(bot, 'log', lambda *args: None)
+    monkeypatch.setattr(bot, 'analyze_market', lambda: None)
+    return bot
+
+
+def test_refused_order_is_retried_soon(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'check_to_do', lambda: True)
+    assert bot.step() == ok_kucoinbot.ORDER_RETRY_DELAY
+
+
+def test_failed_order_is_retried_soon(bot, monkeypatch):
+    def fail():
+        raise ValueError('order refused by the exchange')
+    monkeypatch.setattr(bot, 'check_to_do', lambda: False)
+    monkeypatch.setattr(bot, 'place_order', fail)
+    assert bot.step() == ok_kucoinbot.ORDER_RETRY_DELAY
+
+
+def test_normal_cycle_waits_for_next_candle(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'check_to_do', lambda: False)
+    monkeypatch.setattr(bot, 'place_order', lambda: None)
+    assert bot.step() is None
+
+
+class Client(object):
+    """Records the priority of the requests made for the bot"""
+
+    def __init__(self, price):
+        self.price = price
+        self.priorities = []
+
+    def get_cached_ticker(self, symbol, ttl=5):
+        self.priorities.append(('ticker', kc.current_priority('get', 'market/allTickers')))
+        return {'price': self.price}
+
+
+def test_telegram_queries_have_query_priority(bot, monkeypatch):
+    answers = []
+    bot.client = Client(30000.0)
+    bot.quote_qty = 0.01
+    monkeypatch.setattr(bot, 'telegram_bot_sendtext', lambda text, priority: answers.append(text))
+    monkeypatch.setattr(bot, 'save', lambda: None)
+    bot.telegram_answer({'text': '/wallet', 'date': 1})
+    bot.telegram_answer({'text': '/roi', 'date': 2})
+    assert bot.client.priorities == [('ticker', kc.PRIORITY_QUERY)]*2
+    # 100 USDT + 0.01 BTC a 30000
+    assert '400' in answers[0]
+    assert '+300' in answers[1]
+
+
+def test_emergency_stop_keeps_its_priority(bot, monkeypatch):
+    priorities = []
+    monkeypatch.setattr(bot, 'check_to_do', lambda: priorities.append(('balance', kc.current_priority('get', 'accounts'))))
+    monkeypatch.setattr(bot, 'place_order', lambda: priorities.append(('order', kc.current_priority('post', 'orders'))))
+    monkeypatch.setattr(bot, 'conclude', lambda: None)
+    monkeypatch.setattr(bot, 'telegram_bot_sendtext', lambda *args: None)
+    monkeypatch.setattr(bot, 'save', lambda: None)
+    monkeypatch.setattr(ok_kucoinbot, 'running_bots', {bot})
+    bot.bot_chatID = '1148095114'
+    bot.telegram_answer({'text': 'stop_all#warning', 'date': 1})
+    assert priorities == [('balance', kc.PRIORITY_MARKET), ('order', kc.PRIORITY_ORDER)]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(kc.Client, 'BACKOFF_BASE', 0.01)
+    server = FakeKucoinServer(symbols={'BTC-USDT': wave_price(30000)})
+    server.add_key('key', 'secret', 'passphrase', {'USDT': 1000, 'BTC': 1})
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def trader(bot, server, monkeypatch):
+    """Bot on the fake exchange, signaling a buy on every cycle"""
+    bot.client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    def check_to_do():
+        bot.buy_all, bot.order_size = True, 99.9
+        return False
+    monkeypatch.setattr(bot, 'check_to_do', check_to_do)
+    monkeypatch.setattr(bot, 'telegram_bot_sendtext', lambda *args: None)
+    return bot
+
+
+def test_fill_wait_failure_polls_the_same_order(trader, server, monkeypatch):
+    wait_for_fill = kc.Client.wait_for_fill
+    def lost(self, order_id, *args, **kwargs):
+        raise kc.KucoinRequestException('Order {} still active after 30s'.format(order_id))
+    monkeypatch.setattr(kc.Client, 'wait_for_fill', lost)
+    assert trader.trade() == ok_kucoinbot.ORDER_RETRY_DELAY
+    assert trader.pending_order['orderId'] in server.orders
+    assert trader.base_qty == 100.0
+    monkeypatch.setattr(kc.Client, 'wait_for_fill', wait_for_fill)
+    assert trader.trade() is None
+    assert len(server.orders) == 1
+    assert trader.pending_order is None
+    assert trader.base_qty == pytest.approx(0.1)
+    assert trader.quote_qty > 0
+
+
+def test_lost_create_reply_is_found_by_client_oid(trader, server, monkeypatch):
+    create = kc.Client.create_market_order
+    def lost(self, *args, **kwargs):
+        create(self, *args, **kwargs)
+        raise requests.ConnectionError('connection reset')
+    monkeypatch.setattr(kc.Client, 'create_market_order', lost)
+    assert trader.trade() == ok_kucoinbot.ORDER_RETRY_DELAY
+    assert trader.pending_order['orderId'] is None
+    monkeypatch.setattr(kc.Client, 'create_market_order', create)
+    assert trader.trade() is None
+    assert len(server.orders) == 1
+    assert trader.base_qty == pytest.approx(0.1)
+
+
+def test_failed_create_is_placed_again(trader, server, monkeypatch):
+    def refused(self, *args, **kwargs):
+        raise requests.ConnectionError('connection refused')
+    create = kc.Client.create_market_order
+    monkeypatch.setattr(kc.Client, 'create_market_order', refused)
+    assert trader.trade() == ok_kucoinbot.ORDER_RETRY_DELAY
+    monkeypatch.setattr(kc.Client, 'create_market_order', create)
+    assert trader.trade() is None
+    assert server.counts['GET order'] == 1
+    assert len(server.orders) == 1
+    assert trader.base_qty == pytest.approx(0.1)
+
+
+class Crash(BaseException):
+    """Process killed : no except, no finally that saves"""
+
+
+@pytest.fixture
+def journaled(server, tmp_path, monkeypatch):
+    """Bot on the fake exchange with a state journal, signaling a buy"""
+    monkeypatch.setattr(Bot, 'log', lambda self, *args: None)
+    monkeypatch.setattr(Bot, 'telegram_bot_sendtext', lambda self, *args: None)
+    monkeypatch.setattr(Bot, 'analyze_market', lambda self: None)
+    def check_to_do(self):
+        self.buy_all, self.order_size = True, 99.9
+        return False
+    monkeypatch.setattr(Bot, 'check_to_do', check_to_do)
+    journal = StateJournal(str(tmp_path), 'pw')
+    monkeypatch.setattr(ok_kucoinbot, 'journal', journal)
+    journal.add('b1', dict(STATE, client=('key', 'secret', 'passphrase', server.url)))
+    client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    return Bot.from_state('b1', journal.bots()['b1'], client, Feed())
+
+
+def restart(server, tmp_path, monkeypatch):
+    ok_kucoinbot.journal.file.close()
+    journal = StateJournal(str(tmp_path), 'pw')
+    monkeypatch.setattr(ok_kucoinbot, 'journal', journal)
+    client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+    return Bot.from_state('b1', journal.bots()['b1'], client, Feed())
+
+
+def test_crash_after_create_is_settled_on_restart(journaled, server, tmp_path, monkeypatch):
+    create = kc.Client.create_market_order
+    def crash(self, *args, **kwargs):
+        create(self, *args, **kwargs)
+        raise Crash()
+    monkeypatch.setattr(kc.Client, 'create_market_order', crash)
+    with pytest.raises(Crash):
+        journaled.trade()
+    assert ok_kucoinbot.journal.bots()['b1']['pending_order']['orderId'] is None
+    monkeypatch.setattr(kc.Client, 'create_market_order', create)
+    bot = restart(server, tmp_path, monkeypatch)
+    assert bot.pending_order is None
+    assert bot.base_qty == pytest.approx(0.1)
+    assert ok_kucoinbot.journal.bots()['b1']['base_qty'] == pytest.approx(0.1)
+    assert len(server.orders) == 1
+
+
+def test_crash_after_fill_is_settled_on_restart(journaled, server, tmp_path, monkeypatch):
+    def crash(self):
+        raise Crash()
+    monkeypatch.setattr(Bot, 'conclude', crash)
+    with pytest.raises(Crash):
+        journaled.trade()
+    assert ok_kucoinbot.journal.bots()['b1']['pending_order']['orderId'] in server.orders
+    assert ok_kucoinbot.journal.bots()['b1']['base_qty'] == 100.0
+    monkeypatch.setattr(Bot, 'conclude', KucoinBot.conclude)
+    bot = restart(server, tmp_path, monkeypatch)
+    assert bot.pending_order is None
+    assert bot.base_qty == pytest.approx(0.1)
+    assert len(server.orders) == 1
+    # position a jour : le tour suivant ne rachete pas
+    monkeypatch.setattr(Bot, 'check_to_do', lambda self: False)
+    assert bot.trade() is None
+    assert len(server.orders) == 1
+
+
+def test_unsent_order_is_dropped_on_restart(journaled, server, tmp_path, monkeypatch):
+    create = kc.Client.create_market_order
+    def crash(self, *args, **kwargs):
+        raise Crash()
+    monkeypatch.setattr(kc.Client, 'create_market_order', crash)
+    with pytest.raises(Crash):
+        journaled.trade()
+    monkeypatch.undo_later = None
+    monkeypatch.setattr(kc.Client, 'create_market_order', create)
+    bot = restart(server, tmp_path, monkeypatch)
+    assert bot.pending_order is None
+    assert bot.base_qty == 100.0
+    assert len(server.orders) == 0
+
+
+class CurrencyClient(object):
+    API_KEY, API_SECRET, API_PASSPHRASE, API_URL = 'key', 'secret', 'passphrase', 'http://127.0.0.1'
+
+    def get_currency_info(self, currency):
+        return {'withdrawalMinSize': '0.001'}
+
+
+def test_slots_hold_the_journaled_state(tmp_path, monkeypatch):
+    journal = StateJournal(str(tmp_path), 'pw')
+    monkeypatch.setattr(ok_kucoinbot, 'journal', journal)
+    feed = Feed()
+    feed.snapshot = MarketSnapshot('BTC-USDT', 0, 30000.0, 29990.0, 30010.0, 1.0, 2.0, 3.0, 0)
+    # KucoinBot lui-meme : pas de __dict__ ou ranger un attribut oublie
+    bot = KucoinBot('owner', CurrencyClient(), '1', 'USDT', 'BTC', 100, 0, 0, 0, feed)
+    assert not hasattr(bot, '__dict__')
+    bot.base_qty, bot.pending_order = 50.0, {'side': 'buy', 'clientOid': 'c1', 'funds': 50.0, 'orderId': None}
+    bot.save()
+    bot.wallet()
+    bot.reset_signals()
+    state = journal.bots()[bot.bot_id]
+    assert set(ok_kucoinbot.PERSISTED) <= set(state)
+    assert state['base_qty'] == 50.0
+    monkeypatch.setattr(KucoinBot, 'reconcile', lambda self: None)
+    resumed = KucoinBot.from_state(bot.bot_id, state, CurrencyClient(), feed)
+    assert not hasattr(resumed, '__dict__')
+    for name in ok_kucoinbot.PERSISTED:
+        assert getattr(resumed, name) == getattr(bot, name)
+    assert resumed.spec() == dict(state, client=('key', 'secret', 'passphrase', 'http://127.0.0.1'))
@@ -0,0 +1,59 @@
+# coding=utf-8
+
+import ok_logging
+import ok_telegram
+from ok_logging import LogPipeline, DEBUG, INFO, TRADE, WARNING, ERROR
+
+URL = 'https://api.telegram.org/bot123:AB/sendMessage?chat_id=42'
+
+
+def test_level_of():
+    assert ok_logging.level_of('text') == INFO
+    assert ok_logging.level_of(ValueError('error')) == ERROR
+    assert ok_logging.level_of('text', DEBUG) == DEBUG
+
+
+def test_important_lines_go_to_telegram(tmp_path, monkeypatch):
+    sent = []
+    monkeypatch.setattr(ok_telegram, 'send_message', lambda token, chat, text: sent.append((token, chat, text)))
+    log = str(tmp_path / 'log.txt')
+    pipeline = LogPipeline(telegram_interval=0.0)
+    pipeline.write([(DEBUG, log, 'debug\n', URL), (INFO, log, 'info\n', URL),
+                    (TRADE, log, 'bought\n', URL), (ERROR, log, 'error\n', URL), (ERROR, log, 'no url\n', None)])
+    pipeline.send_telegram()
+    # tout dans le fichier, seulement TRADE et plus sur Telegram
+    assert open(log).read() == 'debug\ninfo\nbought\nerror\nno url\n'
+    assert sent == [('123:AB', '42', 'bought\nerror')]
+
+
+def test_full_buffer_drops_debug_first(tmp_path):
+    log, log2 = str(tmp_path / 'log.txt'), str(tmp_path / 'log2.txt')
+    pipeline = LogPipeline(capacity=4)
+    assert pipeline.emit('a', INFO, log)
+    assert pipeline.emit('b', DEBUG, log)
+    # moitie pleine : le debug est jete, le reste passe
+    assert not pipeline.emit('c', DEBUG, log)
+    assert pipeline.emit('d', WARNING, log)
+    assert pipeline.emit('e', INFO, log)
+    # pleine : tout est jete
+    assert not pipeline.emit('f', ERROR, log)
+    assert pipeline.dropped == 2
+    batch = list(pipeline.buffer)
+    assert [line for level, path, line, url in batch] == ['a\n', 'b\n', 'd\n', 'e\n']
+
+
+def test_thread_writes_and_reports_drops(tmp_path, monkeypatch):
+    log = str(tmp_path / 'log.txt')
+    monkeypatch.chdir(tmp_path)
+    pipeline = LogPipeline(capacity=2, flush_interval=0.05)
+    pipeline.emit('a', INFO, log)
+    pipeline.emit('b', INFO, log)
+    assert not pipeline.emit('c', INFO, log)
+    pipeline.start()
+    assert pipeline.flush()
+    pipeline.emit('d', INFO, log)
+    pipeline.stop()
+    pipeline.join(5)
+    assert open(log).read() == 'a\nb\nd\n'
+    assert 'Log : 1 lines dropped, buffer full' in (tmp_path / 'log2.txt').read_text()
+    assert pipeline.written == 3
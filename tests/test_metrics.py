@@ -0,0 +1,64 @@
+# coding=utf-8
+
+import pytest
+
+import kucoin_client as kc
+from kucoin_fake_server import FakeKucoinServer, wave_price
+
+
+def test_counters_and_percentiles():
+    metrics = kc.Metrics()
+    for i in range(1, 101):
+        error = 'HTTP 500' if i % 25 == 0 else None
+        metrics.record('GET accounts', 'key1', i/1000.0, wait=0.002, sent=10, received=100,
+                       error=error, headroom=100 - i)
+    metrics.record('POST orders', 'key2', 0.2, error='ReadTimeout')
+    snapshot = metrics.snapshot()
+    s = snapshot['endpoints']['GET accounts']
+    assert s['calls'] == 100
+    assert s['errors'] == {'HTTP 500': 4}
+    assert s['bytes_sent'] == 1000 and s['bytes_received'] == 10000
+    assert s['latency_avg'] == pytest.approx(0.0505)
+    assert s['latency_max'] == pytest.approx(0.1)
+    assert s['wait_avg'] == pytest.approx(0.002)
+    assert s['min_headroom'] == 0
+    # borne haute du seau de l'histogramme : au plus 25% au-dessus
+    assert 0.050 <= s['p50'] <= 0.050*1.25
+    assert 0.095 <= s['p95'] <= 0.095*1.25
+    assert 0.099 <= s['p99'] <= 0.1
+    assert snapshot['keys']['key1']['calls'] == 100
+    assert snapshot['keys']['key2']['errors'] == {'ReadTimeout': 1}
+    assert snapshot['endpoints']['POST orders']['min_headroom'] is None
+    # le plus sollicite en premier
+    lines = metrics.summary().split('\n')
+    assert lines[1].startswith('GET accounts : 100 calls')
+    assert 'errors : HTTP 500 x4' in lines[1]
+    metrics.reset()
+    assert metrics.snapshot()['endpoints'] == {}
+
+
+def test_empty_stats():
+    stats = kc.EndpointStats()
+    assert stats.percentile(0.5) == 0.0
+    assert stats.as_dict()['latency_avg'] == 0.0
+
+
+def test_client_requests_are_recorded(monkeypatch):
+    monkeypatch.setattr(kc.Client, 'BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(kc, 'metrics', kc.Metrics())
+    server = FakeKucoinServer(symbols={'BTC-USDT': wave_price(9000)})
+    server.add_key('key', 'secret', 'passphrase', {'USDT': 1000})
+    server.start()
+    try:
+        client = kc.Client('key', 'secret', 'passphrase', api_url=server.url)
+        client.get_accounts()
+        server.fail_next(1, status=503, code='503000', message='Service Unavailable')
+        client.get_accounts()
+    finally:
+        server.stop()
+    s = kc.metrics.snapshot()['endpoints']['GET accounts']
+    assert s['calls'] == 3
+    assert s['errors'] == {'HTTP 503': 1}
+    assert s['bytes_received'] > 0
+    assert s['min_headroom'] is not None
+    assert kc.metrics.snapshot()['keys']['key']['calls'] >= 3
@@ -0,0 +1,108 @@
+# coding=utf-8
+
+import threading
+import time
+
+import pytest
+
+from ok_runtime import Runtime, Task
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def runtime():
+    runtime = Runtime(workers=4)
+    runtime.start()
+    yield runtime
+    runtime.stop()
+
+
+def test_repeat_until_none(runtime):
+    calls = []
+    def func():
+        calls.append(time.time())
+        return 0.01 if len(calls) < 4 else None
+    runtime.repeat(func)
+    assert wait_until(lambda: len(calls) == 4)
+    time.sleep(0.1)
+    assert len(calls) == 4
+
+
+def test_triggers_during_a_step_run_it_once_more(runtime):
+    release, runs = threading.Event(), []
+    def step():
+        runs.append(time.time())
+        release.wait(5)
+    task = Task(runtime, step, log=lambda e: None)
+    task.trigger()
+    assert wait_until(lambda: len(runs) == 1)
+    for _ in range(3):
+        task.trigger()
+    release.set()
+    assert wait_until(lambda: len(runs) == 2)
+    time.sleep(0.1)
+    assert len(runs) == 2
+
+
+def test_pending_trigger_waits_for_the_returned_delay(runtime):
+    release, runs = threading.Event(), []
+    def step():
+        runs.append(time.time())
+        if len(runs) == 1:
+            release.wait(5)
+            return 0.3
+    task = Task(runtime, step, log=lambda e: None)
+    task.trigger()
+    assert wait_until(lambda: len(runs) == 1)
+    task.trigger()
+    end = time.time()
+    release.set()
+    assert wait_until(lambda: len(runs) == 2)
+    assert runs[1] - end >= 0.3
+
+
+def test_returned_delay_and_retry_delay(runtime):
+    runs, errors = [], []
+    def step():
+        runs.append(time.time())
+        if len(runs) == 1:
+            return 0.1
+        if len(runs) == 2:
+            raise ValueError('step failed')
+    task = Task(runtime, step, log=errors.append, retry_delay=0.2)
+    task.trigger()
+    assert wait_until(lambda: len(runs) == 3)
+    assert runs[1] - runs[0] >= 0.1
+    assert runs[2] - runs[1] >= 0.2
+    assert len(errors) == 1
+
+
+def test_pause_and_resume(runtime):
+    runs = []
+    task = Task(runtime, lambda: runs.append(time.time()), log=lambda e: None)
+    task.pause()
+    task.trigger()
+    time.sleep(0.1)
+    assert runs == []
+    task.resume()
+    assert wait_until(lambda: len(runs) == 1)
+    task.kill()
+    task.trigger()
+    time.sleep(0.1)
+    assert len(runs) == 1
+
+
+def test_idle_timeout(runtime):
+    runs = []
+    task = Task(runtime, lambda: runs.append(time.time()), log=lambda e: None, idle_timeout=0.1)
+    task.trigger()
+    assert wait_until(lambda: len(runs) == 3)
+    task.kill()
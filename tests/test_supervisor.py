@@ -0,0 +1,33 @@
+# coding=utf-8
+
+import kucoin_client as kc
+import ok_supervisor
+import ok_telegram
+
+
+def test_share_limits(monkeypatch):
+    monkeypatch.setattr(kc.rate_limiter, 'IP_LIMIT', kc.RateLimiter.IP_LIMIT)
+    monkeypatch.setattr(kc.rate_limiter, 'buckets', {})
+    monkeypatch.setattr(ok_telegram.TelegramSender, 'GLOBAL_LIMIT', ok_supervisor.TELEGRAM_LIMIT)
+    ok_supervisor.share_limits(2)
+    ip_rate, ip_burst = kc.RateLimiter.IP_LIMIT
+    assert kc.rate_limiter.IP_LIMIT == (ip_rate/3.0, ip_burst/3.0)
+    # le partage repart toujours des limites entieres
+    ok_supervisor.share_limits(2)
+    tg_rate, tg_burst = ok_supervisor.TELEGRAM_LIMIT
+    assert ok_telegram.TelegramSender.GLOBAL_LIMIT == (tg_rate/3.0, tg_burst/3.0)
+    assert kc.rate_limiter.bucket(('ip', 'host'), kc.rate_limiter.IP_LIMIT).rate == ip_rate/3.0
+
+
+def test_list_drops_late_replies(monkeypatch):
+    supervisor = ok_supervisor.Supervisor(processes=1)
+    supervisor.replies.append(ok_supervisor.Queue())
+    sent = []
+    monkeypatch.setattr(supervisor, 'send', lambda index, message: sent.append(message))
+    # reponse d'une demande precedente, arrivee apres son delai
+    supervisor.replies[0].put(('list', -1, [{'id': 'stale'}]))
+    assert supervisor.list(timeout=0.2) == []
+    request = sent[-1][2]
+    supervisor.replies[0].put(('list', request - 1, [{'id': 'stale'}]))
+    supervisor.replies[0].put(('list', request + 1, [{'id': 'fresh'}]))
+    assert supervisor.list(timeout=0.2) == [{'id': 'fresh'}]
@@ -0,0 +1,82 @@
+# coding=utf-8
+
+import os
+
+import ok_telegram
+
+
+def test_sender_is_rebuilt_after_fork(monkeypatch):
+    monkeypatch.setattr(ok_telegram, '_sender', None)
+    monkeypatch.setattr(ok_telegram.TelegramSender, 'start', lambda self: None)
+    parent = ok_telegram.sender()
+    assert ok_telegram.sender() is parent
+    # copie du processus parent, sans ses threads
+    monkeypatch.setattr(os, 'getpid', lambda: parent.pid + 1)
+    monkeypatch.setattr(ok_telegram.TelegramSender, 'GLOBAL_LIMIT', (10, 10))
+    child = ok_telegram.sender()
+    assert child is not parent
+    assert child.bucket.rate == 10
+
+
+def test_url_target():
+    url = 'https://api.telegram.org/bot123:AB/sendMessage?chat_id=42'
+    assert ok_telegram.url_target(url) == ('123:AB', '42')
+
+
+def update(update_id, chat_id, text='/wallet'):
+    message = {'chat': {'id': chat_id}, 'date': update_id}
+    if text is not None:
+        message['text'] = text
+    return {'update_id': update_id, 'message': message}
+
+
+class Updates(object):
+    """Stub of TelegramPoller.get_updates, recording the offsets asked"""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.calls = []
+
+    def __call__(self, offset=None, timeout=0):
+        self.calls.append((offset, timeout))
+        return self.batches.pop(0) if self.batches else []
+
+
+def test_poller_skips_pending_then_follows_offset(monkeypatch):
+    poller = ok_telegram.TelegramPoller('token', timeout=30)
+    updates = Updates([update(41, 1)], [update(42, 1), update(43, 2)], [])
+    monkeypatch.setattr(poller, 'get_updates', updates)
+    received = []
+    poller.register(1, lambda message: received.append(message['date']))
+    poller.poll()
+    # messages d'avant le demarrage : ignores
+    assert received == [] and poller.offset == 42
+    poller.poll()
+    poller.poll()
+    assert updates.calls == [(-1, 0), (42, 30), (44, 30)]
+    assert received == [42]
+
+
+def test_poller_routes_by_chat(monkeypatch):
+    poller = ok_telegram.TelegramPoller('token', skip_pending=False)
+    monkeypatch.setattr(poller, 'log', lambda message: None)
+    updates = Updates([update(1, 1), update(2, 2), update(3, 1, text=None), update(4, 3)])
+    monkeypatch.setattr(poller, 'get_updates', updates)
+    one, two = [], []
+    def failing(message):
+        raise ValueError('bot error')
+    poller.register(1, lambda message: one.append(message['date']))
+    second = lambda message: two.append(message['date'])
+    poller.register('2', second)
+    poller.register(2, failing)
+    poller.poll()
+    # sans texte : ignore ; erreur d'un bot : les autres sont servis
+    assert one == [1] and two == [2]
+    assert updates.calls == [(None, poller.timeout)]
+    assert poller.offset == 5
+    poller.unregister(2, failing)
+    assert poller.routes['2'] == [second]
+    poller.unregister('2', second)
+    assert '2' not in poller.routes
+    poller.set_token('other')
+    assert poller.offset is None and poller.bot_token == 'other'
@@ -0,0 +1,42 @@
+# coding=utf-8
+
+import time
+
+import kucoin_client as kc
+
+
+class Client(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get_ticker(self):
+        self.calls += 1
+        return {'time': 1, 'ticker': [{'symbol': 'BTC-USDT', 'last': '9000', 'buy': '8999', 'sell': '9001'}]}
+
+
+def test_ttl_per_lookup():
+    client = Client()
+    cache = kc.TickerCache(client, ttl=60)
+    assert cache.get('BTC-USDT') == {'price': 9000.0, 'bestBid': 8999.0, 'bestAsk': 9001.0, 'time': 1}
+    cache.get('BTC-USDT')
+    assert client.calls == 1
+    # un appelant plus exigeant que le ttl du cache
+    cache.updated = time.time() - 2
+    cache.get('BTC-USDT', ttl=1)
+    assert client.calls == 2
+    assert cache.price('BTC-USDT', ttl=60) == 9000.0
+    assert client.calls == 2
+
+
+def test_get_cached_ticker_uses_its_ttl(monkeypatch):
+    monkeypatch.setattr(kc, '_ticker_caches', {})
+    client = kc.Client('key', 'secret', 'passphrase', api_url='http://127.0.0.1:1')
+    requests = []
+    monkeypatch.setattr(client, 'get_ticker', lambda: requests.append(1) or Client().get_ticker())
+    client.get_cached_ticker('BTC-USDT', ttl=60)
+    cache = client.ticker_cache()
+    cache.updated = time.time() - 2
+    client.get_cached_ticker('BTC-USDT', ttl=60)
+    assert len(requests) == 1
+    client.get_cached_ticker('BTC-USDT', ttl=1)
+    assert len(requests) == 2
@@ -0,0 +1,88 @@
+# coding=utf-8
+
+import numpy as np
+import pytest
+
+import ok_vector_indicators as vi
+from ok_indicators import EMA, EmaEngine
+from ok_kucoinbot import trend
+from ok_market import MarketSnapshot
+from test_indicators import baseline_emas, history, prices_of
+
+NAN = float('nan')
+
+
+def same(a, b):
+    np.testing.assert_allclose(a, b, rtol=1e-12, equal_nan=True)
+
+
+def test_sma_and_ema_by_hand():
+    x = [2, 4, 6, 8, 4]
+    same(vi.sma(x, 3), [NAN, NAN, 4, 6, 6])
+    # alpha 0.5, depart a la SMA 4
+    same(vi.ema(x, 3), [NAN, NAN, 4, 6, 5])
+    same(vi.ema(x[:2], 3), [NAN, NAN])
+
+
+def test_rsi_by_hand():
+    # gains 1 1 0 2, pertes 0 0 1 0, lissage de Wilder sur 2
+    same(vi.rsi([1, 2, 3, 2, 4], 2), [NAN, NAN, 100, 50, 100 - 100/6])
+
+
+def test_macd_by_hand():
+    line, signal, histogram = vi.macd([2, 4, 6, 8, 4], fast=2, slow=3, signal=2)
+    same(line, [NAN, NAN, 1, 1, 0])
+    same(signal, [NAN, NAN, NAN, 1, 1/3])
+    same(histogram, [NAN, NAN, NAN, 0, -1/3])
+
+
+def test_atr_by_hand():
+    # true ranges 2 2 4
+    same(vi.atr([3, 4, 5, 6], [1, 2, 3, 2], [2, 3, 4, 3], 2), [NAN, NAN, 2, 3])
+
+
+def test_matrix_rows_match_single_series():
+    a = [c for t, c in history(300, seed=1)]
+    b = [c for t, c in history(280, seed=2)]
+    matrix = vi.as_matrix([a, b])
+    assert matrix.shape == (2, 280)
+    same(vi.ema(matrix, 45)[0], vi.ema(a[20:], 45))
+    same(vi.rsi(matrix)[1], vi.rsi(b))
+
+
+def test_ema_seeded_like_ema_seed():
+    closes = [c for t, c in history(300)]
+    for period in (20, 45, 130):
+        ema = EMA(period)
+        assert vi.ema(closes, period)[-1] == pytest.approx(ema.seed(closes), rel=1e-12)
+
+
+def test_ema_on_the_engine_window_gives_the_baseline():
+    candles = history(260)
+    closes = [c for t, c in candles]
+    expected = baseline_emas(prices_of(candles))
+    engine = EmaEngine((20, 45, 130))
+    engine.seed(candles)
+    for period in (20, 45, 130):
+        # fenetre d'amorce de EmaEngine.seed
+        start = len(closes) - 2*period + 2
+        window = closes[start:start+period] + closes[start+period-1:]
+        assert vi.ema(window, period)[-1] == pytest.approx(expected[period], rel=1e-12)
+        assert engine.value(period) == pytest.approx(expected[period], rel=1e-12)
+
+
+def test_ema_trend_matches_the_engine_on_a_long_series():
+    for seed in range(5):
+        candles = history(2000, seed=seed)
+        closes = [c for t, c in candles]
+        engine = EmaEngine((20, 45, 130))
+        engine.seed(candles[:260])
+        engine.update(candles[260:])
+        for period in (20, 45, 130):
+            # l'amorce s'est effacee : meme valeur malgre des fenetres differentes
+            assert vi.ema(closes, period)[-1] == pytest.approx(engine.value(period), rel=1e-9)
+        snapshot = MarketSnapshot('BTC-USDT', 0, closes[-1], 0, 0, engine.value(20), engine.value(45), engine.value(130), 0)
+        assert int(vi.ema_trend(closes)) == trend(snapshot)
+    # en matrice : une tendance par paire
+    matrix = vi.as_matrix([[c for t, c in history(2000, seed=s)] for s in range(5)])
+    assert vi.ema_trend(matrix).shape == (5,)